@@ -0,0 +1,61 @@
+from typing import Dict
+
+import pandas as pd
+
+from model import GameState
+
+# --- 履歴・分析タブの集計 ---
+# ログを型付きの DataFrame に1回だけ読み込み、書籍とはマージで結合して
+# ジャンル別の集計と読書速度をベクトル演算で求める。
+# 日・週・月の推移と連続記録は timeseries.ReadingSeries の集計を使う。
+
+
+def logs_frame(state: GameState) -> pd.DataFrame:
+    """読書ログを列指向で DataFrame にする"""
+    logs = state.logs
+    frame = pd.DataFrame({
+        "book_id": pd.array([l.book_id for l in logs], dtype="Int64"),
+        "pages": pd.array([l.pages or 0 for l in logs], dtype="int64"),
+        "minutes": pd.array([l.minutes or 0 for l in logs], dtype="int64"),
+        "exp_gained": pd.array([l.exp_gained or 0 for l in logs], dtype="int64"),
+    })
+    return frame
+
+
+def books_frame(state: GameState) -> pd.DataFrame:
+    books = list(state.books.values())
+    return pd.DataFrame({
+        "book_id": pd.array([b.id for b in books], dtype="Int64"),
+        "genre": [b.genre for b in books],
+    })
+
+
+def join_logs(logs: pd.DataFrame, books: pd.DataFrame) -> pd.DataFrame:
+    """ログに書籍のジャンルを結合する（削除済みの本は「不明」）"""
+    joined = logs.merge(books, on="book_id", how="left")
+    joined["genre"] = joined["genre"].fillna("不明").astype("category")
+    return joined
+
+
+def genre_totals(joined: pd.DataFrame) -> pd.DataFrame:
+    totals = joined.groupby("genre", observed=True)[["pages", "minutes", "exp_gained"]].sum()
+    totals["speed"] = reading_speed(totals)
+    return totals.sort_values("pages", ascending=False)
+
+
+def reading_speed(frame: pd.DataFrame) -> pd.Series:
+    """分あたりのページ数（読書時間が記録された分のみ）"""
+    minutes = frame["minutes"].where(frame["minutes"] > 0)
+    return frame["pages"] / minutes
+
+
+def compute_analytics(state: GameState) -> Dict:
+    """履歴・分析タブで使う集計をまとめて計算する"""
+    joined = join_logs(logs_frame(state), books_frame(state))
+    speed_frame = joined[joined["minutes"] > 0]
+    total_minutes = int(speed_frame["minutes"].sum())
+    return {
+        "genres": genre_totals(joined),
+        "total_pages": int(joined["pages"].sum()),
+        "speed": int(speed_frame["pages"].sum()) / total_minutes if total_minutes else None,
+    }
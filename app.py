@@ -1,13 +1,33 @@
 import streamlit as st
+import copy
 import json
 import os
+import sys
 import uuid
-import pandas as pd
-import gspread
-from google.oauth2.service_account import Credentials
-from collections import Counter
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from datetime import datetime
+from typing import Callable, Dict, List, Tuple
+from storage import ConflictError, SheetsBackend, StorageBackend, StorageError, create_backend
+from cache import DocumentCache
+from merge import save_with_retry
+from model import Book, GameState
+from catalog import MasterCatalog, load_catalog
+from stats import STATS_KEY, rebuild_stats, verify_stats
+from importer import run_import
+from replay import apply_replay, replay
+from levels import LevelCurve, get_curve, make_curve, set_curve
+from sprites import SpriteCache
+from writer import SaveQueue
+from journal import JournaledBackend
+from tenants import MAX_BYTES, MAX_TENANTS, TenantPool, normalize_tenant, verify_admin_token, verify_player_token
+from leaderboard import GENRE_PREFIX, Leaderboard, genre_metric
+from shelf import LogIndex, ShelfIndex, progress
+from timeseries import ReadingSeries, series_for
+from profiling import get_profiler, span
+from snapshot import Snapshot
+from game import (
+    ALL_GENRES, INITIAL_DATA, WEAPON_ICONS,
+    enemy_avatar_name, get_combo_multiplier, get_next_book_id, get_weapon_genre_name, parse_date, player_avatar_name, record_reading,
+)
 
 # --- ページ設定 ---
 st.set_page_config(
@@ -18,63 +38,27 @@ st.set_page_config(
 
 # --- 定数・設定 ---
 MASTER_FILE = "books_master.json"
+MASTER_PAGE_SIZE = 20 # マスタ検索結果の1ページあたりの件数
+SHELF_PAGE_SIZE = 20 # 本棚の1ページあたりの冊数
+LOG_PAGE_SIZE = 50 # 読書ログ一覧の1ページあたりの件数
 ASSETS_DIR = "assets"
+PLAYER_SPRITE_WIDTH = 200
+ENEMY_SPRITE_WIDTH = 150
 SPREADSHEET_NAME = "ReadingRPG_Data" # 共有したスプレッドシートの名前
-
-# 初期データ構造
-INITIAL_DATA = {
-    "user": {
-        "level": 1,
-        "exp": 0,
-        "next_level_exp": 250,
-        "combo": 0,
-        "last_read_date": None,
-        "job": "見習い (Novice)",
-        "total_investment": 0,
-        "total_hours": 0.0,
-        "weapons": []
-    },
-    "books": [],
-    "logs": []
-}
-
-# --- ジャンル・データ定義 (変更なし) ---
-GENRES = {
-    "ビジネス": ["business_basic", "business_strategy", "business_marketing", "business_finance", "business_organization", "business_leadership", "business_decision", "business_general"],
-    "教養": ["liberal_philosophy", "liberal_history", "liberal_psychology", "liberal_medicine", "liberal_engineering", "liberal_biology", "liberal_anthropology"]
-}
-
-ALL_GENRES = []
-for category_genres in GENRES.values():
-    ALL_GENRES.extend(category_genres)
-
-WEAPON_MAP = {
-    "liberal_philosophy": "杖 (Staff)", "liberal_history": "巻物 (Scroll)", "liberal_psychology": "鏡 (Mirror)",
-    "liberal_medicine": "薬瓶 (Potion)", "liberal_engineering": "ガジェット銃 (Gun)", "liberal_biology": "使い魔 (Pet)", "liberal_anthropology": "コンパス (Compass)"
-}
-
-GENRE_NAMES = {
-    "liberal_philosophy": "哲学", "liberal_history": "歴史", "liberal_psychology": "心理学", "liberal_medicine": "医学",
-    "liberal_engineering": "工学", "liberal_biology": "生物学", "liberal_anthropology": "文化人類学"
-}
-
-WEAPON_ICONS = {
-    "杖 (Staff)": "🪄", "巻物 (Scroll)": "📜", "鏡 (Mirror)": "🪞", "薬瓶 (Potion)": "🧪",
-    "ガジェット銃 (Gun)": "🔫", "使い魔 (Pet)": "🐾", "コンパス (Compass)": "🧭"
-}
-
-GENRE_TO_JOB = {
-    ("business_strategy", "business_marketing"): "騎士 (Knight)",
-    ("business_finance", "business_organization"): "参謀 (Tactician)",
-    ("business_leadership", "business_decision"): "聖騎士 (Paladin)",
-    ("business_general",): "賢者 (Sage)"
-}
+SQLITE_PATH = "readingrpg.sqlite3" # backend = "sqlite" のときの保存先
+JOURNAL_PATH = "readingrpg_local.sqlite3" # backend = "journal" のときのローカルレプリカ
+LEADERBOARD_PATH = "readingrpg_leaderboard.sqlite3" # 複数プレイヤーモードのランキング集計
+SNAPSHOT_PATH = "readingrpg_snapshot.json" # fast_start で最初の描画に使うローカルのスナップショット
+CACHE_TTL = {"sheets": 30.0, "sqlite": 0.0, "journal": 0.0} # リビジョン確認の間隔（秒）。ローカルは毎回確認しても安価
 
 # --- Google Sheets 接続関数 ---
+# gspread と google-auth は読み込みに時間がかかるため、最初にスプレッドシートへ接続するときに import する
 @st.cache_resource
 def get_gspread_client():
     """Google Sheetsへの接続クライアントを取得（キャッシュ対応）"""
     try:
+        import gspread
+        from google.oauth2.service_account import Credentials
         # StreamlitのSecretsから認証情報を取得
         key_dict = json.loads(st.secrets["gcp_service_account"])
         scopes = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]
@@ -85,215 +69,438 @@ def get_gspread_client():
         st.error(f"Google Cloud接続エラー: {e}")
         return None
 
+# --- ストレージ設定 ---
+def get_storage_config() -> Dict:
+    """ストレージ設定を取得（環境変数 > secrets の [storage] > 既定値）"""
+    config = {"backend": "sheets", "spreadsheet_name": SPREADSHEET_NAME, "sqlite_path": SQLITE_PATH, "journal_path": JOURNAL_PATH}
+    try:
+        config.update(dict(st.secrets.get("storage", {})))
+    except Exception:
+        pass # secrets.toml が無い場合は既定値のまま
+    if os.environ.get("READINGRPG_STORAGE"):
+        config["backend"] = os.environ["READINGRPG_STORAGE"]
+    if os.environ.get("READINGRPG_SQLITE_PATH"):
+        config["sqlite_path"] = os.environ["READINGRPG_SQLITE_PATH"]
+    if os.environ.get("READINGRPG_FAST_START"):
+        config["fast_start"] = os.environ["READINGRPG_FAST_START"] not in ("0", "false")
+    if os.environ.get("READINGRPG_PLAYER_SECRET"):
+        config["player_token_secret"] = os.environ["READINGRPG_PLAYER_SECRET"]
+    return config
+
+@st.cache_resource
+def get_storage_backend() -> StorageBackend:
+    """設定に応じたストレージバックエンドを取得（キャッシュ対応）"""
+    backend = create_backend(get_storage_config(), client_factory=get_gspread_client)
+    if isinstance(backend, JournaledBackend):
+        backend.start_sync()
+    return backend
+
+@st.cache_resource
+def setup_level_curve() -> LevelCurve:
+    """secrets の [level_curve] から経験値曲線を設定する（省略時は毎レベル250EXP）"""
+    try:
+        spec = dict(st.secrets.get("level_curve", {}))
+    except Exception:
+        spec = {}
+    curve = make_curve(spec)
+    set_curve(curve)
+    return curve
+
+@st.cache_resource
+def get_save_queue() -> SaveQueue:
+    """バックグラウンド保存のキュー（プロセスで1つ）"""
+    return SaveQueue()
+
+def is_multi_tenant() -> bool:
+    return bool(get_storage_config().get("multi_tenant", False))
+
+def is_fast_start() -> bool:
+    """起動優先モード。選んだタブだけを描画し、Sheets の場合は最初の描画をスナップショットで行う"""
+    return bool(get_storage_config().get("fast_start", False))
+
+def get_cache_ttl() -> float:
+    config = get_storage_config()
+    return float(config.get("cache_ttl", CACHE_TTL.get(config["backend"], 30.0)))
+
+@st.cache_resource
+def get_tenant_pool() -> TenantPool:
+    """複数プレイヤーモードで、プレイヤーごとの読み込み済みドキュメントを保持する（プロセスで1つ）"""
+    config = get_storage_config()
+    return TenantPool(
+        get_storage_backend(),
+        ttl=get_cache_ttl(),
+        max_tenants=int(config.get("tenant_cache_size", MAX_TENANTS)),
+        max_bytes=int(float(config.get("tenant_cache_mb", MAX_BYTES / 1024 / 1024)) * 1024 * 1024),
+    )
+
+@st.cache_resource
+def get_leaderboard() -> Leaderboard:
+    """全プレイヤーのランキング集計（プロセスで1つ。leaderboard_path を空にするとメモリ上だけで持つ）"""
+    return Leaderboard(get_storage_config().get("leaderboard_path", LEADERBOARD_PATH) or None)
+
+@st.cache_resource
+def get_snapshot() -> Snapshot:
+    """fast_start で使うローカルのスナップショット（プロセスで1つ）"""
+    return Snapshot(get_storage_config().get("snapshot_path", SNAPSHOT_PATH))
+
+def uses_snapshot() -> bool:
+    # ローカルに保存するバックエンドは読み込み自体が速いので使わない。複数プレイヤーモードも対象外
+    return is_fast_start() and not is_multi_tenant() and get_storage_config()["backend"] in ("sheets", "fake_sheets")
+
+def get_player_id() -> str:
+    """複数プレイヤーモードのプレイヤーID（ログインユーザーのメール > ?player= と合言葉 ?token=）
+
+    ログイン（st.login）を設定していない場合は、player_token_secret で署名した合言葉が一致したときだけ
+    ?player= を受け付ける（合言葉は python tenants.py <プレイヤーID> で発行する）。
+    """
+    if "_player_id" not in st.session_state:
+        raw = None
+        try:
+            if st.user.get("is_logged_in"):
+                raw = st.user.get("email")
+        except Exception:
+            pass # 認証を設定していない、または古い Streamlit
+        if raw:
+            st.session_state._player_id = normalize_tenant(raw)
+            return st.session_state._player_id
+        secret = get_storage_config().get("player_token_secret")
+        if not secret:
+            st.error("複数プレイヤーモードにはログイン（st.login）の設定か、secrets の [storage] player_token_secret が必要です。")
+            try:
+                if st.button("ログイン"):
+                    st.login()
+            except Exception:
+                pass
+            st.stop()
+        player = st.query_params.get("player")
+        if not player:
+            st.info("発行された URL（?player=...&token=...）から開いてください。")
+            st.stop()
+        tenant = normalize_tenant(player)
+        if not verify_player_token(secret, tenant, st.query_params.get("token")):
+            st.error("プレイヤーIDと合言葉が一致しません。")
+            st.stop()
+        st.session_state._player_id = tenant
+    return st.session_state._player_id
+
+def is_admin() -> bool:
+    """計測パネルを開けるか（secrets の [storage] admins にあるログインユーザー、または ?admin= に管理者の合言葉）"""
+    config = get_storage_config()
+    try:
+        if st.user.get("is_logged_in") and st.user.get("email") in config.get("admins", []):
+            return True
+    except Exception:
+        pass # 認証を設定していない、または古い Streamlit
+    return verify_admin_token(config.get("player_token_secret"), st.query_params.get("admin"))
+
+def get_save_key() -> str:
+    """保存キューでこのセッションを区別するキー（複数プレイヤーモードではプレイヤー単位）"""
+    if is_multi_tenant():
+        return get_player_id()
+    if "_save_key" not in st.session_state:
+        st.session_state._save_key = uuid.uuid4().hex
+    return st.session_state._save_key
+
+def get_data_cache() -> DocumentCache:
+    """セッション単位のドキュメントキャッシュを取得（複数プレイヤーモードではプレイヤー単位で共有）"""
+    if is_multi_tenant():
+        try:
+            return get_tenant_pool().get(get_player_id())
+        except NotImplementedError as e:
+            st.error(str(e))
+            st.stop()
+    if "_data_cache" not in st.session_state:
+        cache = DocumentCache(get_storage_backend(), ttl=get_cache_ttl())
+        if uses_snapshot():
+            data, revision = get_snapshot().load()
+            if data is not None:
+                cache.seed(data, revision)
+        st.session_state._data_cache = cache
+    return st.session_state._data_cache
+
 def load_data() -> Dict:
-    """スプレッドシートからデータを読み込む"""
-    client = get_gspread_client()
-    if not client:
-        return INITIAL_DATA.copy()
-    
+    """ストレージからデータを読み込む（キャッシュ済みなら再利用）"""
+    cache = None
     try:
-        # スプレッドシートを開く
-        sheet = client.open(SPREADSHEET_NAME).sheet1
-        # A1セルの値（JSON文字列）を取得
-        json_str = sheet.acell('A1').value
-        
-        if not json_str:
-            # データがない場合は初期データを返す
-            return INITIAL_DATA.copy()
-        
-        data = json.loads(json_str)
-        
-        # データの整合性チェックと補完（旧load_dataのロジックを統合）
-        if "user" not in data:
-             data["user"] = INITIAL_DATA["user"].copy()
-        if "books" not in data:
-            data["books"] = []
-        if "logs" not in data:
-            data["logs"] = []
-            
-        # user内のキー不足を補完
-        user = data["user"]
-        default_user = INITIAL_DATA["user"]
-        for key in default_user:
-            if key not in user:
-                user[key] = default_user[key]
+        cache = get_data_cache()
+        with span("load_data"):
+            data = cache.get()
+        if is_multi_tenant():
+            get_tenant_pool().account(get_player_id())
+    except Exception as e:
+        if cache is not None:
+            cache.failed = True # 読み込みに成功するまで保存しない（save_state を参照）
+        if is_spreadsheet_not_found(e):
+            st.error(f"スプレッドシート『{SPREADSHEET_NAME}』が見つかりません。Google側で作成し、Botのアドレスを招待してください。")
+            return copy.deepcopy(INITIAL_DATA)
+        # 読み込めなかった状態で保存すると既存データを初期データで上書きしてしまうため、保存を止める
+        st.error(f"データを読み込めませんでした（保存は行いません）: {e}")
+        return copy.deepcopy(INITIAL_DATA)
+
+    if not data:
+        # データがない場合は初期データを返す
+        return copy.deepcopy(INITIAL_DATA)
+
+    # データの整合性チェックと補完（旧load_dataのロジックを統合）
+    if "user" not in data:
+         data["user"] = INITIAL_DATA["user"].copy()
+    if "books" not in data:
+        data["books"] = []
+    if "logs" not in data:
+        data["logs"] = []
         
-        return data
+    # user内のキー不足を補完
+    user = data["user"]
+    default_user = INITIAL_DATA["user"]
+    for key in default_user:
+        if key not in user:
+            user[key] = copy.deepcopy(default_user[key])
+    
+    return data
 
-    except gspread.exceptions.SpreadsheetNotFound:
-        st.error(f"スプレッドシート『{SPREADSHEET_NAME}』が見つかりません。Google側で作成し、Botのアドレスを招待してください。")
-        return INITIAL_DATA.copy()
-    except Exception as e:
-        # まだデータがない場合など
-        return INITIAL_DATA.copy()
+def is_spreadsheet_not_found(e: Exception) -> bool:
+    # gspread が読み込まれていなければ、この例外が起きることもない
+    gspread = sys.modules.get("gspread")
+    return gspread is not None and isinstance(e, gspread.exceptions.SpreadsheetNotFound)
 
-def save_data(data: Dict):
-    """スプレッドシートにデータを保存する"""
-    client = get_gspread_client()
-    if not client:
-        st.error("保存に失敗しました（接続エラー）")
+def refresh_after_paint():
+    """スナップショットで描画した後にストレージを確認し、内容が違えば描き直す。確認済みの内容はスナップショットに残す"""
+    if not uses_snapshot():
         return
+    cache = get_data_cache()
+    if cache.provisional:
+        revision = cache.revision
+        try:
+            with span("refresh_after_paint"):
+                cache.get(force=True)
+        except Exception as e:
+            st.warning(f"保存済みのデータを確認できませんでした。前回の内容を表示しています（保存は行いません）: {e}")
+            return
+        if cache.revision != revision:
+            st.rerun()
+    if cache.checked_at is not None and not cache.dirty and cache.data:
+        get_snapshot().save(cache.data, cache.revision)
+
+def save_data(data: Dict) -> bool:
+    """ストレージにデータを保存し、キャッシュにも反映する
 
+    他のセッションが先に保存していた場合は、その内容とマージしてから保存する。
+    渡した内容のまま保存できた場合のみ True を返す。
+    """
+    cache = get_data_cache()
     try:
-        sheet = client.open(SPREADSHEET_NAME).sheet1
-        # データをJSON文字列に変換
-        json_str = json.dumps(data, ensure_ascii=False)
-        
-        # A1セルに書き込み
-        sheet.update_acell('A1', json_str)
-        
+        saved, revision = save_with_retry(cache.backend, data, cache.base, cache.revision)
+        merged = saved is not data
+        if merged:
+            # マージ結果を呼び出し元の dict にも反映する
+            data.clear()
+            data.update(saved)
+        cache.put(data, revision)
+        return not merged
+    except ConflictError:
+        cache.invalidate()
+        st.error("他の画面での更新と競合したため保存できませんでした。再読み込みしてやり直してください。")
+    except StorageError:
+        cache.invalidate()
+        st.error("保存に失敗しました（接続エラー）")
     except Exception as e:
+        cache.invalidate()
         st.error(f"データ保存エラー: {e}")
+    return False
 
-# --- 以下、ロジック関数（変更なし） ---
+def load_state() -> GameState:
+    """索引付きのゲーム状態を取得（同じリビジョンの間は使い回す）"""
+    data = load_data()
+    cache = get_data_cache()
+    if cache.failed or (cache.data is not None and cache.data is not data):
+        # 読み込みに失敗したときの初期データ。キャッシュに結び付けないので save_state は保存しない
+        return GameState(data)
+    # 保存済みのドキュメント（まだ何も保存されていなければ初期データ）から作る
+    state = cache.derive("state", lambda _: get_profiler().timed("state_index", GameState, data))
+    if is_multi_tenant():
+        # 他の画面での編集などを反映する（同じリビジョンの間は確認もしない）
+        cache.derive("leaderboard", lambda _: get_leaderboard().sync(get_player_id(), state))
+    return state
 
-def get_today_str() -> str:
-    return datetime.now().strftime("%Y-%m-%d")
+def load_analytics(state: GameState) -> Dict:
+    """履歴・分析タブの集計を取得（データのリビジョンが変わるまで再計算しない）"""
+    from analytics import compute_analytics # pandas はこのタブを開くまで読み込まない
+    cache = get_data_cache()
+    if cache.data is None:
+        return compute_analytics(state)
+    return cache.derive("analytics", lambda _: get_profiler().timed("analytics", compute_analytics, state))
 
-def calculate_combo(user_data: Dict, read_date: str) -> int:
-    last_date = user_data.get("last_read_date")
-    if last_date is None:
-        return 1
-    try:
-        last = datetime.strptime(last_date, "%Y-%m-%d")
-        current = datetime.strptime(read_date, "%Y-%m-%d")
-        diff = (current - last).days
-        if diff == 0 or diff == 1:
-            return user_data.get("combo", 0) + 1
-        else:
-            return 1
-    except:
-        return 1
-
-def get_combo_multiplier(combo_days: int) -> float:
-    multiplier = 1.0 + (combo_days * 0.1)
-    return min(multiplier, 1.5)
-
-def calculate_level_up(user_data: Dict, exp_gained: int) -> Dict:
-    new_exp = user_data["exp"] + exp_gained
-    new_level = user_data["level"]
-    next_level_exp = user_data["next_level_exp"]
-    while new_exp >= next_level_exp:
-        new_exp -= next_level_exp
-        new_level += 1
-        next_level_exp = 250 # 固定あるいは計算式
-    user_data["exp"] = new_exp
-    user_data["level"] = new_level
-    user_data["next_level_exp"] = next_level_exp
-    return user_data
-
-def count_basic_books(data: Dict) -> int:
-    count = 0
-    for book in data.get("books", []):
-        if book.get("genre") == "business_basic" and book.get("read_count", 0) > 0:
-            count += 1
-    return count
-
-def get_player_avatar_path(data: Dict) -> str:
-    basic_count = count_basic_books(data)
-    user = data.get("user", {})
-    if basic_count < 6:
-        level_num = min(basic_count + 1, 6)
-        filename = f"novice_lv{level_num}.png"
-    else:
-        job_class = user.get("job", "見習い (Novice)")
-        level = user.get("level", 1)
-        if "騎士" in job_class or "Knight" in job_class:
-            prefix = "knight"
-        elif "参謀" in job_class or "Tactician" in job_class:
-            prefix = "tactician"
-        elif "聖騎士" in job_class or "Paladin" in job_class:
-            prefix = "paladin"
-        elif "賢者" in job_class or "Sage" in job_class:
-            prefix = "sage"
-        else:
-            prefix = "novice"
-        
-        if level < 54: suffix = "lv1"
-        elif level < 126: suffix = "lv2"
-        else: suffix = "lv3"
-        filename = f"{prefix}_{suffix}.png"
-    return os.path.join(ASSETS_DIR, filename)
+def load_shelf(state: GameState) -> ShelfIndex:
+    """本棚の並べ替え用索引（データのリビジョンが変わるまで使い回す）"""
+    cache = get_data_cache()
+    if cache.data is None:
+        return ShelfIndex(state)
+    return cache.derive("shelf", lambda _: ShelfIndex(state))
+
+def load_log_index(state: GameState) -> LogIndex:
+    """読書ログ一覧の索引（データのリビジョンが変わるまで使い回す）"""
+    cache = get_data_cache()
+    if cache.data is None:
+        return LogIndex(state)
+    return cache.derive("log_index", lambda _: LogIndex(state))
+
+def page_selector(label: str, total: int, page_size: int, key: str) -> int:
+    """ページ番号の入力欄（1ページに収まる場合は出さない）。0 始まりの offset を返す"""
+    page_count = max(1, -(-total // page_size))
+    if st.session_state.get(key, 1) > page_count:
+        st.session_state[key] = 1
+    page = st.number_input(f"{label}（全{page_count}ページ・{total}件）", min_value=1, max_value=page_count, key=key) if page_count > 1 else 1
+    return (page - 1) * page_size
 
-def display_player_avatar(data: Dict):
+def save_state(state: GameState):
+    """ゲーム状態を保存する。マージが発生しなければ索引もそのまま使い回す
+
+    background_save が有効（既定）なら画面はローカルの状態ですぐ更新し、保存は別スレッドで行う。
+    """
+    cache = get_data_cache()
+    if cache.checked_at is None or cache.failed:
+        # 読み込めていない（読み込みエラー）状態では、初期データで既存データを上書きしないよう保存しない
+        st.error("データを読み込めていないため保存できません。再読み込みしてください。")
+        return
+    if cache.derived.get("state") is not state:
+        # 読み込み失敗時の初期データなど、キャッシュ済みのドキュメントから作られていない状態
+        st.error("保存済みのデータと対応していない状態のため保存しません。再読み込みしてください。")
+        return
+    with span("save_state"):
+        if get_storage_config().get("background_save", True):
+            get_save_queue().submit(get_save_key(), state.to_dict(), cache)
+            cache.derived["state"] = state
+        elif save_data(state.to_dict()):
+            get_data_cache().derived["state"] = state
+
+# --- 以下、表示まわりの関数 ---
+
+@st.cache_resource
+def get_sprite_cache() -> SpriteCache:
+    """アバター・敵画像を表示サイズに縮小して保持（プロセスで1回だけ作成。縮小は各画像を最初に表示するとき）"""
+    return SpriteCache(ASSETS_DIR)
+
+def get_player_avatar_path(state: GameState) -> str:
+    return os.path.join(ASSETS_DIR, player_avatar_name(state))
+
+def display_player_avatar(state: GameState):
+    with span("images"):
+        _display_player_avatar(state)
+
+def _display_player_avatar(state: GameState):
     try:
-        avatar_path = get_player_avatar_path(data)
-        if os.path.exists(avatar_path):
-            st.sidebar.image(avatar_path, width=200, use_container_width=True)
+        avatar_path = get_sprite_cache().resolve(get_player_avatar_path(state), os.path.join(ASSETS_DIR, "novice_lv1.png"))
+        if avatar_path:
+            st.sidebar.image(get_sprite_cache().get(avatar_path, PLAYER_SPRITE_WIDTH), width=PLAYER_SPRITE_WIDTH, use_container_width=True)
         else:
-            fallback_path = os.path.join(ASSETS_DIR, "novice_lv1.png")
-            if os.path.exists(fallback_path):
-                st.sidebar.image(fallback_path, width=200, use_container_width=True)
-            else:
-                st.sidebar.info("アバター画像が見つかりません")
+            st.sidebar.info("アバター画像が見つかりません")
     except Exception as e:
         st.sidebar.error(f"画像読み込みエラー: {e}")
 
+def display_save_status():
+    """バックグラウンド保存の状態をサイドバーに表示する"""
+    status = get_save_queue().status(get_save_key())
+    if status["error"]:
+        st.sidebar.error(status["error"])
+        c1, c2 = st.sidebar.columns(2)
+        if c1.button("再試行", use_container_width=True):
+            get_save_queue().retry(get_save_key())
+            st.rerun()
+        if c2.button("変更を破棄", use_container_width=True):
+            get_save_queue().discard(get_save_key())
+            get_data_cache().invalidate()
+            st.rerun()
+    elif status["pending"] or status["saving"]:
+        st.sidebar.caption("💾 保存中...")
+
+    backend = get_storage_backend()
+    if isinstance(backend, JournaledBackend):
+        sync = backend.status()
+        if sync["error"] and sync["pending"]:
+            st.sidebar.warning(f"☁️ オフライン: 未同期の変更 {sync['pending']}件（接続が戻ると自動で同期します）")
+        elif sync["pending"]:
+            st.sidebar.caption(f"☁️ 同期待ち {sync['pending']}件")
+
 def get_enemy_avatar_path(total_pages: int) -> str:
-    if total_pages < 100: filename = "enemy_swarm.png"
-    elif total_pages < 200: filename = "enemy_slime.png"
-    elif total_pages < 300: filename = "enemy_mimic.png"
-    elif total_pages < 400: filename = "enemy_golem.png"
-    elif total_pages < 500: filename = "enemy_dragon.png"
-    else: filename = "enemy_demon.png"
-    return os.path.join(ASSETS_DIR, filename)
+    return os.path.join(ASSETS_DIR, enemy_avatar_name(total_pages))
 
 def display_enemy_avatar(total_pages: int):
+    with span("images"):
+        _display_enemy_avatar(total_pages)
+
+def _display_enemy_avatar(total_pages: int):
     try:
-        enemy_path = get_enemy_avatar_path(total_pages)
-        if os.path.exists(enemy_path):
-            st.image(enemy_path, width=150, use_container_width=False)
+        enemy_path = get_sprite_cache().resolve(get_enemy_avatar_path(total_pages), os.path.join(ASSETS_DIR, "enemy_swarm.png"))
+        if enemy_path:
+            st.image(get_sprite_cache().get(enemy_path, ENEMY_SPRITE_WIDTH), width=ENEMY_SPRITE_WIDTH, use_container_width=False)
         else:
-            fallback_path = os.path.join(ASSETS_DIR, "enemy_swarm.png")
-            if os.path.exists(fallback_path):
-                st.image(fallback_path, width=150, use_container_width=False)
-            else:
-                st.info("敵画像が見つかりません")
+            st.info("敵画像が見つかりません")
     except Exception as e:
         st.error(f"画像読み込みエラー: {e}")
 
-def update_job_class(data: Dict):
-    genre_count = {}
-    for book in data.get("books", []):
-        if book.get("read_count", 0) > 0:
-            genre = book.get("genre", "")
-            genre_count[genre] = genre_count.get(genre, 0) + 1
-    if not genre_count: return
-    max_genre = max(genre_count.items(), key=lambda x: x[1])[0]
-    new_job = "見習い (Novice)"
-    for genres, job in GENRE_TO_JOB.items():
-        if max_genre in genres:
-            new_job = job
-            break
-    data["user"]["job"] = new_job
-
-def get_next_book_id(books: List[Dict]) -> int:
-    if not books: return 1
-    return max(b.get("id", 0) for b in books) + 1
-
-def load_master_data() -> List[Dict]:
+LEADERBOARD_METRICS = {"EXP": "exp", "ページ数": "pages", "連続読書日数": "streak", "ジャンル別ページ数": GENRE_PREFIX}
+LEADERBOARD_WINDOWS = {"今日": "day", "今週": "week", "全期間": "all"}
+
+WEEKDAY_LABELS = ["月", "火", "水", "木", "金", "土", "日"]
+
+def display_reading_calendar(series: ReadingSeries, weeks: int = 53):
+    """直近 weeks 週の日ごとのページ数を、週 × 曜日のヒートマップで表示する"""
+    cells = series.heatmap(datetime.now().date(), weeks=weeks)
+    st.vega_lite_chart({
+        "data": {"values": cells},
+        "mark": {"type": "rect", "cornerRadius": 2},
+        "encoding": {
+            "x": {"field": "week", "type": "ordinal", "title": None, "axis": {"labels": False, "ticks": False}},
+            "y": {"field": "weekday", "type": "ordinal", "title": None,
+                  "axis": {"labelExpr": f"{WEEKDAY_LABELS}[datum.value]"}},
+            "color": {"field": "value", "type": "quantitative", "title": "ページ", "scale": {"scheme": "greens"}},
+            "tooltip": [{"field": "date", "title": "日付"}, {"field": "value", "title": "ページ"}],
+        },
+    }, use_container_width=True)
+
+def display_leaderboard():
+    """プレイヤー・ギルドのランキング（上位10件と自分の順位）"""
+    board = get_leaderboard()
+    player = get_player_id()
+    st.header("🏆 ランキング")
+    guild = st.text_input("所属ギルド", value=board.guild_of(player) or "", placeholder="空欄なら無所属")
+    if guild.strip() != (board.guild_of(player) or ""):
+        board.set_guild(player, guild)
+
+    col1, col2, col3 = st.columns(3)
+    with col1: metric = LEADERBOARD_METRICS[st.selectbox("指標", list(LEADERBOARD_METRICS))]
+    with col2: window = LEADERBOARD_WINDOWS[st.radio("期間", list(LEADERBOARD_WINDOWS), horizontal=True)]
+    with col3: by_guild = st.toggle("ギルド別", value=False)
+    if metric == GENRE_PREFIX:
+        genres = board.genres()
+        if not genres:
+            st.info("まだ記録がありません")
+            return
+        metric = genre_metric(st.selectbox("ジャンル", genres))
+
+    member = board.guild_of(player) if by_guild else player
+    rank, score, total = board.rank(member, metric, window, guilds=by_guild) if member else (None, 0, 0)
+    st.metric("自分の順位" if not by_guild else "ギルドの順位", f"{rank}位 / {total}" if rank else "-", f"{score:,}")
+    top = board.top(metric, window, 10, guilds=by_guild)
+    if top:
+        st.dataframe([{"順位": board.rank(m, metric, window, guilds=by_guild)[0], "名前": m, "値": v} for m, v in top],
+                     use_container_width=True, hide_index=True)
+    else:
+        st.info("この期間の記録はまだありません")
+
+@st.cache_resource
+def _load_master_catalog(path: str, mtime: float) -> MasterCatalog:
+    """マスタの索引を作成（ファイルの更新時刻が変わるまで使い回す）"""
+    return load_catalog(path)
+
+def get_master_catalog() -> MasterCatalog:
     try:
-        if os.path.exists(MASTER_FILE):
-            with open(MASTER_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-    except: pass
-    return []
-
-def acquire_weapon(user: Dict, genre: str) -> Optional[str]:
-    if genre in WEAPON_MAP:
-        weapon = WEAPON_MAP[genre]
-        if "weapons" not in user: user["weapons"] = []
-        user["weapons"].append(weapon)
-        return weapon
-    return None
-
-def get_weapon_genre_name(weapon: str) -> str:
-    for genre, weapon_name in WEAPON_MAP.items():
-        if weapon_name == weapon:
-            return GENRE_NAMES.get(genre, genre)
-    return ""
-
-def display_result_screen(completed_data: Dict, data: Dict):
+        mtime = os.path.getmtime(MASTER_FILE)
+    except OSError:
+        mtime = 0.0
+    return _load_master_catalog(MASTER_FILE, mtime)
+
+def display_result_screen(completed_data: Dict, state: GameState):
     st.balloons()
     st.title("🎉 CONGRATULATIONS! 読破おめでとうございます！")
     st.divider()
@@ -337,38 +544,77 @@ def display_result_screen(completed_data: Dict, data: Dict):
         review_action = st.text_area("ネクストアクション", key="result_review_action")
         submitted = st.form_submit_button("冒険を続ける（完了）", use_container_width=True)
         if submitted:
-            book_id = completed_data.get("book_id")
-            if book_id:
-                for b in data.get("books", []):
-                    if b["id"] == book_id:
-                        b["review"] = {"good": review_good, "learn": review_learn, "action": review_action}
-                        break
-                save_data(data)
+            book = state.book(completed_data.get("book_id"))
+            if book:
+                book.review = {"good": review_good, "learn": review_learn, "action": review_action}
+                save_state(state)
             if "completed_book_data" in st.session_state:
                 del st.session_state.completed_book_data
             st.rerun()
 
+def display_admin_panel():
+    """管理者（is_admin）だけに出す計測パネル（処理ごとの p50/p95/p99・cProfile・JSONL 出力）"""
+    profiler = get_profiler()
+    with st.sidebar.expander("⏱ 計測（管理者用）"):
+        summary = profiler.summary()
+        if summary:
+            st.dataframe([
+                {"処理": name, "回数": m["count"], "p50(ms)": round(m["p50"], 1), "p95(ms)": round(m["p95"], 1),
+                 "p99(ms)": round(m["p99"], 1), "最大(ms)": round(m["max"], 1), "直近(ms)": round(m["last"], 1)}
+                for name, m in summary.items()
+            ], use_container_width=True, hide_index=True)
+        else:
+            st.info("まだ計測していません")
+        if st.button("次の再描画をプロファイル", use_container_width=True):
+            profiler.capture_next()
+            st.rerun()
+        st.download_button("計測値を JSONL で保存", profiler.export_jsonl(), file_name="readingrpg_metrics.jsonl",
+                           mime="application/jsonl", use_container_width=True)
+        if st.button("計測値をリセット", use_container_width=True):
+            profiler.reset()
+            st.rerun()
+        if profiler.last_profile:
+            st.caption(f"cProfile（{datetime.fromtimestamp(profiler.last_profile_at):%H:%M:%S}・累積時間順）")
+            st.code(profiler.last_profile, language=None)
+
+def display_main_tabs(views: List[Tuple[str, Callable[[], None]]]):
+    """メインのタブを描画する。fast_start では選んだタブの中身だけを実行する"""
+    if not is_fast_start():
+        for tab, (_, view) in zip(st.tabs([label for label, _ in views]), views):
+            with tab:
+                view()
+        return
+    labels = [label for label, _ in views]
+    selected = st.radio("表示", labels, horizontal=True, key="main_view", label_visibility="collapsed")
+    dict(views)[selected]()
+
 def main():
+    with get_profiler().rerun():
+        render()
+    refresh_after_paint()
+
+def render():
     st.title("📚 読書RPG - Cloud ver.")
     
-    # データ読み込み（スプレッドシートから）
-    data = load_data()
+    setup_level_curve()
+    # データ読み込み（キャッシュ → スプレッドシート）
+    state = load_state()
     
     # --- リザルト画面チェック ---
     if "completed_book_data" in st.session_state and st.session_state.completed_book_data:
-        display_result_screen(st.session_state.completed_book_data, data)
+        display_result_screen(st.session_state.completed_book_data, state)
         return
 
     # --- サイドバー ---
-    display_player_avatar(data)
+    display_player_avatar(state)
+    display_save_status()
     st.sidebar.divider()
     
-    user = data.get("user", {})
-    weapons = user.get("weapons", [])
+    user = state.user
+    weapon_counter = state.stats["weapons"]
     
     with st.sidebar.expander("🎒 所持アイテム / 装備"):
-        if weapons:
-            weapon_counter = Counter(weapons)
+        if weapon_counter:
             for weapon, count in weapon_counter.items():
                 weapon_icon = WEAPON_ICONS.get(weapon, "⚔️")
                 genre_name = get_weapon_genre_name(weapon)
@@ -386,9 +632,10 @@ def main():
         st.metric("レベル", user.get("level", 1))
     with col2:
         st.metric("職業", user.get("job", "見習い (Novice)"))
-        exp_progress = user.get("exp", 0) / user.get("next_level_exp", 250)
+        next_level_exp = user.get("next_level_exp") or get_curve().required(user.get("level", 1))
+        exp_progress = user.get("exp", 0) / next_level_exp
         st.progress(exp_progress)
-        st.caption(f"経験値: {user.get('exp', 0)} / {user.get('next_level_exp', 250)} EXP")
+        st.caption(f"経験値: {user.get('exp', 0)} / {next_level_exp} EXP")
     with col3:
         combo_days = user.get("combo", 0)
         if combo_days > 1:
@@ -399,262 +646,381 @@ def main():
             st.info("📖 読書開始")
     
     st.divider()
-    main_tab = st.tabs(["ステータス", "履歴・分析", "本棚"])
-    
-    # --- タブ1: ステータス ---
-    with main_tab[0]:
-        if sidebar_tab == "記録":
-            st.header("📖 読書記録")
-            active_books = [b for b in data.get("books", []) if b.get("status") in ["active", "reread"]]
+    views = [("ステータス", lambda: display_status(state, sidebar_tab)), ("履歴・分析", lambda: display_history(state)),
+             ("本棚", lambda: display_bookshelf(state))]
+    if is_multi_tenant():
+        views.append(("ランキング", display_leaderboard))
+    display_main_tabs(views)
+
+    if is_admin():
+        display_admin_panel()
+
+def display_status(state: GameState, sidebar_tab: str):
+    """ステータスタブ（読書記録・書籍管理）"""
+    user = state.user
+    if sidebar_tab == "記録":
+        st.header("📖 読書記録")
+        active_books = state.books_with_status("active", "reread")
+        
+        if not active_books:
+            st.warning("現在攻略中の本がありません。「管理」タブから本を開始してください。")
+        else:
+            book_options = {}
+            for b in active_books:
+                status_label = "再読中" if b.status == "reread" else ""
+                display_name = f"{b.title} " + (f"({status_label}) " if status_label else "") + f"(残り{b.current_hp}/{b.max_hp}ページ)"
+                book_options[display_name] = b.id
             
-            if not active_books:
-                st.warning("現在攻略中の本がありません。「管理」タブから本を開始してください。")
-            else:
-                book_options = {}
-                for b in active_books:
-                    status_label = "再読中" if b.get("status") == "reread" else ""
-                    display_name = f"{b['title']} " + (f"({status_label}) " if status_label else "") + f"(残り{b['current_hp']}/{b['max_hp']}ページ)"
-                    book_options[display_name] = b["id"]
+            selected_title = st.selectbox("読書する本を選択", options=list(book_options.keys()))
+            selected_book_id = book_options.get(selected_title) if selected_title else None
+            
+            if selected_book_id:
+                book = state.book(selected_book_id)
+                if book:
+                    col1, col2 = st.columns([1, 2])
+                    with col1:
+                        st.subheader("敵")
+                        display_enemy_avatar(book.max_hp)
+                    with col2:
+                        st.subheader(book.title)
+                        st.caption(f"ジャンル: {book.genre} | 総ページ数: {book.max_hp}ページ")
+                        current_hp = book.current_hp
+                        st.progress(current_hp / book.max_hp)
+                        st.caption(f"残りHP: {int(current_hp)}/{book.max_hp}")
+                    
+                    st.divider()
+                    
+                    with st.form(key=f"reading_form_{book.id}"):
+                        col1, col2 = st.columns(2)
+                        with col1:
+                            pages_input = st.number_input("読んだページ数", min_value=1, max_value=min(book.current_hp, book.max_hp), value=min(10, book.current_hp))
+                            minutes_input = st.number_input("読書時間（分）", min_value=0, value=0)
+                        with col2:
+                            rating_input = st.selectbox("評価（1-5星）", options=[0, 1, 2, 3, 4, 5], format_func=lambda x: f"{x}星" if x > 0 else "未評価")
+                            memo_input = st.text_area("メモ", height=100)
+                        
+                        submitted = st.form_submit_button("📖 読書記録（攻撃）", use_container_width=True)
+                        
+                        if submitted:
+                            if pages_input > book.current_hp:
+                                st.error(f"残りページ数（{book.current_hp}ページ）を超えています。")
+                            else:
+                                result = record_reading(
+                                    state, book, pages_input, minutes=minutes_input,
+                                    rating=rating_input, memo=memo_input
+                                )
+                                if is_multi_tenant():
+                                    log = result["log"]
+                                    get_leaderboard().record(get_player_id(), state, log.date, log.pages,
+                                                             result["exp_gained"], book.genre)
+                                if result["completed"]:
+                                    st.session_state.completed_book_data = {
+                                        "book_id": book.id, "book_title": book.title,
+                                        "book_genre": book.genre, "book_max_hp": book.max_hp,
+                                        "exp_gained": result["exp_gained"], "old_level": result["old_level"],
+                                        "new_level": result["new_level"], "leveled_up": result["leveled_up"],
+                                        "acquired_weapon": result["acquired_weapon"]
+                                    }
+                                
+                                save_state(state)
+                                st.rerun()
+
+    elif sidebar_tab == "管理":
+        st.header("📚 書籍管理")
+        management_tab = st.tabs(["新規追加", "編集・削除", "一括インポート", "メンテナンス"])
+        
+        with management_tab[0]:
+            st.subheader("新規書籍の追加")
+            catalog = get_master_catalog()
+            
+            # Session State Initialize
+            if "new_title" not in st.session_state: st.session_state.new_title = ""
+            if "new_genre" not in st.session_state: st.session_state.new_genre = ALL_GENRES[0] if ALL_GENRES else ""
+            if "new_pages" not in st.session_state: st.session_state.new_pages = 300
+            if "new_price" not in st.session_state: st.session_state.new_price = 0
+            if "master_select_idx" not in st.session_state: st.session_state.master_select_idx = -1
+
+            if len(catalog):
+                col1, col2 = st.columns([2, 1])
+                with col1:
+                    master_query = st.text_input("マスタを検索（任意）", key="master_query", placeholder="タイトルの一部")
+                with col2:
+                    master_genre = st.selectbox("ジャンルで絞り込み", options=[""] + ALL_GENRES, format_func=lambda g: g or "全ジャンル", key="master_genre")
+                
+                _, total = catalog.search(master_query, master_genre or None, limit=0)
+                offset = page_selector("ページ", total, MASTER_PAGE_SIZE, "master_page")
+                hits, _ = catalog.search(master_query, master_genre or None, offset=offset, limit=MASTER_PAGE_SIZE)
+                
+                selected_master_idx = st.selectbox("マスタから選ぶ（任意）", options=[-1] + hits, format_func=lambda i: "マスタから選ぶ（任意）" if i < 0 else catalog.label(i), key="master_select")
                 
-                selected_title = st.selectbox("読書する本を選択", options=list(book_options.keys()))
+                if selected_master_idx != st.session_state.master_select_idx:
+                    st.session_state.master_select_idx = selected_master_idx
+                    if selected_master_idx >= 0:
+                        m_book = catalog.books[selected_master_idx]
+                        st.session_state.new_title = m_book.get("title", "")
+                        if m_book.get("genre") in ALL_GENRES: st.session_state.new_genre = m_book.get("genre")
+                        st.session_state.new_pages = m_book.get("pages", 300)
+                        st.session_state.new_price = m_book.get("price", 0)
+
+            st.divider()
+
+            def add_new_book():
+                title = st.session_state.new_title
+                genre = st.session_state.new_genre
+                pages = st.session_state.new_pages
+                price = st.session_state.new_price
+                if not title or not genre or pages <= 0:
+                    st.session_state.add_error = "入力内容を確認してください"
+                    return
+                
+                current_state = load_state()
+                current_state.add_book(Book(
+                    id=get_next_book_id(current_state),
+                    title=title, genre=genre, max_hp=pages, current_hp=pages,
+                    price=price, status="active", rating=0,
+                    review={"good": "", "learn": "", "action": ""}, read_count=0
+                ))
+                save_state(current_state)
+                st.session_state.add_success = f"『{title}』を追加しました"
+                st.session_state.new_title = ""
+
+            st.text_input("タイトル *", key="new_title")
+            st.selectbox("ジャンル *", options=ALL_GENRES, key="new_genre")
+            st.number_input("ページ数 *", min_value=1, key="new_pages")
+            st.number_input("価格（円）", min_value=0, key="new_price")
+            
+            if "add_error" in st.session_state and st.session_state.add_error:
+                st.error(st.session_state.add_error)
+                del st.session_state.add_error
+            if "add_success" in st.session_state and st.session_state.add_success:
+                st.success(st.session_state.add_success)
+                del st.session_state.add_success
+            
+            st.button("追加", on_click=add_new_book, use_container_width=True)
+
+        with management_tab[1]:
+            st.subheader("書籍の編集・削除")
+            books = list(state.books.values())
+            if not books:
+                st.info("本がありません")
+            else:
+                book_options = {f"{b.title} ({b.status})": b.id for b in books}
+                selected_title = st.selectbox("編集する本を選択", options=list(book_options.keys()), key="edit_target_select")
                 selected_book_id = book_options.get(selected_title) if selected_title else None
                 
                 if selected_book_id:
-                    book = next((b for b in data["books"] if b["id"] == selected_book_id), None)
+                    book = state.book(selected_book_id)
                     if book:
-                        col1, col2 = st.columns([1, 2])
-                        with col1:
-                            st.subheader("敵")
-                            display_enemy_avatar(book["max_hp"])
-                        with col2:
-                            st.subheader(book["title"])
-                            st.caption(f"ジャンル: {book.get('genre', '')} | 総ページ数: {book['max_hp']}ページ")
-                            current_hp = book.get("current_hp", book["max_hp"])
-                            st.progress(current_hp / book["max_hp"])
-                            st.caption(f"残りHP: {int(current_hp)}/{book['max_hp']}")
-                        
-                        st.divider()
+                        if "last_edit_target" not in st.session_state or st.session_state.last_edit_target != selected_title:
+                            st.session_state.edit_title = book.title
+                            st.session_state.edit_genre = book.genre
+                            st.session_state.edit_max_hp = book.max_hp
+                            st.session_state.edit_current_hp = book.current_hp
+                            st.session_state.edit_price = book.price
+                            st.session_state.edit_status = book.status
+                            st.session_state.last_edit_target = selected_title
                         
-                        with st.form(key=f"reading_form_{book['id']}"):
+                        with st.form("edit_book_form"):
+                            st.write(f"ID: {book.id}")
+                            new_title = st.text_input("タイトル", key="edit_title")
+                            new_genre = st.selectbox("ジャンル", options=ALL_GENRES, index=ALL_GENRES.index(st.session_state.edit_genre) if st.session_state.edit_genre in ALL_GENRES else 0, key="edit_genre")
                             col1, col2 = st.columns(2)
                             with col1:
-                                pages_input = st.number_input("読んだページ数", min_value=1, max_value=min(book["current_hp"], book["max_hp"]), value=min(10, book["current_hp"]))
-                                minutes_input = st.number_input("読書時間（分）", min_value=0, value=0)
+                                new_max_hp = st.number_input("総ページ数", min_value=1, key="edit_max_hp")
+                                new_current_hp = st.number_input("現在のHP", min_value=0, max_value=new_max_hp, key="edit_current_hp")
                             with col2:
-                                rating_input = st.selectbox("評価（1-5星）", options=[0, 1, 2, 3, 4, 5], format_func=lambda x: f"{x}星" if x > 0 else "未評価")
-                                memo_input = st.text_area("メモ", height=100)
+                                new_price = st.number_input("価格", min_value=0, key="edit_price")
+                                status_opts = ["unread", "active", "completed", "reread"]
+                                new_status = st.selectbox("ステータス", options=status_opts, index=status_opts.index(st.session_state.edit_status) if st.session_state.edit_status in status_opts else 0, key="edit_status")
                             
-                            submitted = st.form_submit_button("📖 読書記録（攻撃）", use_container_width=True)
+                            c1, c2 = st.columns(2)
+                            save = c1.form_submit_button("保存", use_container_width=True)
+                            delete = c2.form_submit_button("削除", use_container_width=True)
                             
-                            if submitted:
-                                if pages_input > book["current_hp"]:
-                                    st.error(f"残りページ数（{book['current_hp']}ページ）を超えています。")
-                                else:
-                                    read_date = get_today_str()
-                                    new_combo = calculate_combo(user, read_date)
-                                    user["combo"] = new_combo
-                                    user["last_read_date"] = read_date
-                                    combo_mult = get_combo_multiplier(new_combo)
-                                    
-                                    damage = pages_input
-                                    exp_gained = int(pages_input * combo_mult)
-                                    
-                                    user = calculate_level_up(user, exp_gained)
-                                    book["current_hp"] = max(0, book["current_hp"] - damage)
-                                    if minutes_input > 0:
-                                        user["total_hours"] = user.get("total_hours", 0.0) + (minutes_input / 60.0)
-                                    if rating_input > 0: book["rating"] = rating_input
-                                    
-                                    log_entry = {
-                                        "id": str(uuid.uuid4()), "date": read_date, "book_id": book["id"],
-                                        "pages": pages_input, "minutes": minutes_input, "exp_gained": exp_gained,
-                                        "rating": rating_input, "memo": memo_input
-                                    }
-                                    data["logs"].append(log_entry)
-                                    
-                                    old_level = user.get("level", 1)
-                                    leveled_up = False
-                                    
-                                    if book["current_hp"] <= 0:
-                                        book["status"] = "completed"
-                                        book["read_count"] = book.get("read_count", 0) + 1
-                                        user["total_investment"] = user.get("total_investment", 0) + book.get("price", 0)
-                                        update_job_class(data)
-                                        new_level = user.get("level", 1)
-                                        leveled_up = (new_level > old_level)
-                                        book_genre = book.get("genre", "")
-                                        acquired_weapon = acquire_weapon(user, book_genre)
-                                        
-                                        st.session_state.completed_book_data = {
-                                            "book_id": book["id"], "book_title": book.get("title", ""),
-                                            "book_genre": book_genre, "book_max_hp": book.get("max_hp", 0),
-                                            "exp_gained": exp_gained, "old_level": old_level, "new_level": new_level,
-                                            "leveled_up": leveled_up, "acquired_weapon": acquired_weapon
-                                        }
-                                    
-                                    data["user"] = user
-                                    save_data(data)
-                                    st.rerun()
-
-        elif sidebar_tab == "管理":
-            st.header("📚 書籍管理")
-            management_tab = st.tabs(["新規追加", "編集・削除"])
+                            if save:
+                                state.update_book(
+                                    book, title=new_title, genre=new_genre, max_hp=new_max_hp,
+                                    current_hp=new_current_hp, price=new_price, status=new_status
+                                )
+                                save_state(state)
+                                st.success("保存しました")
+                                st.rerun()
+                            if delete:
+                                state.remove_book(book.id)
+                                save_state(state)
+                                st.success("削除しました")
+                                st.rerun()
+
+        with management_tab[2]:
+            st.subheader("書籍・読書ログの一括インポート")
+            st.caption("書籍: title, genre, pages, price, status ／ 読書ログ: date, book_id または title, pages, minutes, rating, memo（日付順）")
+            import_kind = st.radio("種類", ["books", "logs"], format_func=lambda k: "書籍" if k == "books" else "読書ログ", horizontal=True, key="import_kind")
+            uploaded = st.file_uploader("CSV / JSONL ファイル", type=["csv", "jsonl", "ndjson"], key="import_file")
+            dry_run = st.checkbox("ドライラン（保存せずに検証のみ）", value=True, key="import_dry_run")
             
-            with management_tab[0]:
-                st.subheader("新規書籍の追加")
-                master_books = load_master_data()
-                
-                # Session State Initialize
-                if "new_title" not in st.session_state: st.session_state.new_title = ""
-                if "new_genre" not in st.session_state: st.session_state.new_genre = ALL_GENRES[0] if ALL_GENRES else ""
-                if "new_pages" not in st.session_state: st.session_state.new_pages = 300
-                if "new_price" not in st.session_state: st.session_state.new_price = 0
-                if "master_select_idx" not in st.session_state: st.session_state.master_select_idx = 0
-
-                if master_books:
-                    master_options = ["マスタから選ぶ（任意）"] + [f"{b.get('title', '')} ({b.get('genre', '')})" for b in master_books]
-                    selected_master_idx = st.selectbox("マスタから選ぶ（任意）", options=range(len(master_options)), format_func=lambda x: master_options[x], key="master_select")
-                    
-                    if selected_master_idx != st.session_state.master_select_idx:
-                        st.session_state.master_select_idx = selected_master_idx
-                        if selected_master_idx > 0:
-                            m_book = master_books[selected_master_idx - 1]
-                            st.session_state.new_title = m_book.get("title", "")
-                            if m_book.get("genre") in ALL_GENRES: st.session_state.new_genre = m_book.get("genre")
-                            st.session_state.new_pages = m_book.get("pages", 300)
-                            st.session_state.new_price = m_book.get("price", 0)
+            if uploaded and st.button("インポート実行", use_container_width=True):
+                progress_bar = st.progress(0.0, text="読み込み中...")
+                try:
+                    imported_state, report = run_import(
+                        state, uploaded, uploaded.name, import_kind, dry_run=dry_run,
+                        progress=lambda p: progress_bar.progress(p, text=f"読み込み中... {p:.0%}"),
+                        total_bytes=uploaded.size
+                    )
+                except ValueError as e:
+                    st.error(str(e))
+                else:
+                    if not dry_run and report["imported"]:
+                        # 取り込んだ結果はまとめて1回で保存する
+                        save_state(imported_state)
+                    st.success(
+                        ("[ドライラン] " if dry_run else "")
+                        + f"{report['rows']}行中 {report['imported']}件を取り込みました"
+                        + (f"（重複 {report['skipped']}件をスキップ）" if report["skipped"] else "")
+                    )
+                    if import_kind == "logs":
+                        st.caption(f"獲得EXP: {report['exp_gained']:,} / 読了: {report['completed']}冊")
+                    if report["error_count"]:
+                        st.warning(f"{report['error_count']}件のエラーがありました（先頭{len(report['errors'])}件を表示）")
+                        st.dataframe([{"行": line_no, "内容": message} for line_no, message in report["errors"]], use_container_width=True)
 
-                st.divider()
+        with management_tab[3]:
+            st.subheader("集計値の検証")
+            st.caption("保存済みの集計値（読了数・ジャンル別読了数・武器・総ページ数・総読書時間）を記録から再計算して比較します。")
+            if st.button("検証する", use_container_width=True):
+                drift = verify_stats(state.to_dict())
+                if drift:
+                    st.warning("集計値にずれがあります")
+                    st.json({key: {"保存値": stored, "正しい値": expected} for key, (stored, expected) in drift.items()})
+                else:
+                    st.success("集計値は一致しています")
+            if st.button("記録から再構築", use_container_width=True):
+                user[STATS_KEY] = rebuild_stats(state.to_dict())
+                save_state(state)
+                st.success("集計値を再構築しました")
+                st.rerun()
 
-                def add_new_book():
-                    title = st.session_state.new_title
-                    genre = st.session_state.new_genre
-                    pages = st.session_state.new_pages
-                    price = st.session_state.new_price
-                    if not title or not genre or pages <= 0:
-                        st.session_state.add_error = "入力内容を確認してください"
-                        return
-                    
-                    current_data = load_data()
-                    new_book = {
-                        "id": get_next_book_id(current_data.get("books", [])),
-                        "title": title, "genre": genre, "max_hp": pages, "current_hp": pages,
-                        "price": price, "status": "active", "rating": 0,
-                        "review": {"good": "", "learn": "", "action": ""}, "read_count": 0
-                    }
-                    current_data["books"].append(new_book)
-                    save_data(current_data)
-                    st.session_state.add_success = f"『{title}』を追加しました"
-                    st.session_state.new_title = ""
-
-                st.text_input("タイトル *", key="new_title")
-                st.selectbox("ジャンル *", options=ALL_GENRES, key="new_genre")
-                st.number_input("ページ数 *", min_value=1, key="new_pages")
-                st.number_input("価格（円）", min_value=0, key="new_price")
-                
-                if "add_error" in st.session_state and st.session_state.add_error:
-                    st.error(st.session_state.add_error)
-                    del st.session_state.add_error
-                if "add_success" in st.session_state and st.session_state.add_success:
-                    st.success(st.session_state.add_success)
-                    del st.session_state.add_success
-                
-                st.button("追加", on_click=add_new_book, use_container_width=True)
+            st.divider()
+            st.subheader("ログから再計算")
+            st.caption("レベル・EXP・コンボ・総読書時間・総投資額・武器・職業と本のHPを、読書ログを日付順に再生して作り直します。")
+            if st.button("ログから再計算", use_container_width=True):
+                fold, st.session_state._replay_snapshots = replay(state, st.session_state.get("_replay_snapshots"))
+                changes = apply_replay(state, fold)
+                save_state(state)
+                if changes:
+                    st.warning("以下の値を修正しました")
+                    st.json({key: {"修正前": old, "修正後": new} for key, (old, new) in changes.items()})
+                else:
+                    st.success("ログと一致しています")
+
+            if is_multi_tenant():
+                st.divider()
+                st.subheader("プレイヤーキャッシュ")
+                pool = get_tenant_pool().stats()
+                col1, col2, col3 = st.columns(3)
+                with col1: st.metric("保持中のプレイヤー", f"{pool['tenants']} / {pool['max_tenants']}")
+                with col2: st.metric("推定メモリ", f"{pool['bytes'] / 1024 / 1024:.1f} / {pool['max_bytes'] / 1024 / 1024:.0f} MB")
+                with col3: st.metric("追い出し回数", pool["evictions"])
 
-            with management_tab[1]:
-                st.subheader("書籍の編集・削除")
-                books = data.get("books", [])
-                if not books:
-                    st.info("本がありません")
+            backend = get_storage_backend()
+            if isinstance(backend, JournaledBackend):
+                backend = backend.remote
+            if isinstance(backend, SheetsBackend):
+                st.divider()
+                st.subheader("Google Sheets API の利用状況")
+                metrics = backend.sheets.metrics()
+                if metrics:
+                    st.dataframe([
+                        {"メソッド": method, "回数": m["calls"], "エラー": m["errors"], "429": m["rate_limited"],
+                         "平均(ms)": round(m["total_seconds"] / m["calls"] * 1000, 1), "最大(ms)": round(m["max_seconds"] * 1000, 1),
+                         "待機(秒)": round(m["throttled_seconds"], 1)}
+                        for method, m in metrics.items()
+                    ], use_container_width=True)
                 else:
-                    book_options = {f"{b['title']} ({b.get('status', 'unread')})": b["id"] for b in books}
-                    selected_title = st.selectbox("編集する本を選択", options=list(book_options.keys()), key="edit_target_select")
-                    selected_book_id = book_options.get(selected_title) if selected_title else None
-                    
-                    if selected_book_id:
-                        book = next((b for b in books if b["id"] == selected_book_id), None)
-                        if book:
-                            if "last_edit_target" not in st.session_state or st.session_state.last_edit_target != selected_title:
-                                st.session_state.edit_title = book.get("title", "")
-                                st.session_state.edit_genre = book.get("genre", "")
-                                st.session_state.edit_max_hp = book.get("max_hp", 300)
-                                st.session_state.edit_current_hp = book.get("current_hp", 300)
-                                st.session_state.edit_price = book.get("price", 0)
-                                st.session_state.edit_status = book.get("status", "unread")
-                                st.session_state.last_edit_target = selected_title
-                            
-                            with st.form("edit_book_form"):
-                                st.write(f"ID: {book['id']}")
-                                new_title = st.text_input("タイトル", key="edit_title")
-                                new_genre = st.selectbox("ジャンル", options=ALL_GENRES, index=ALL_GENRES.index(st.session_state.edit_genre) if st.session_state.edit_genre in ALL_GENRES else 0, key="edit_genre")
-                                col1, col2 = st.columns(2)
-                                with col1:
-                                    new_max_hp = st.number_input("総ページ数", min_value=1, key="edit_max_hp")
-                                    new_current_hp = st.number_input("現在のHP", min_value=0, max_value=new_max_hp, key="edit_current_hp")
-                                with col2:
-                                    new_price = st.number_input("価格", min_value=0, key="edit_price")
-                                    status_opts = ["unread", "active", "completed", "reread"]
-                                    new_status = st.selectbox("ステータス", options=status_opts, index=status_opts.index(st.session_state.edit_status) if st.session_state.edit_status in status_opts else 0, key="edit_status")
-                                
-                                c1, c2 = st.columns(2)
-                                save = c1.form_submit_button("保存", use_container_width=True)
-                                delete = c2.form_submit_button("削除", use_container_width=True)
-                                
-                                if save:
-                                    book["title"] = new_title
-                                    book["genre"] = new_genre
-                                    book["max_hp"] = new_max_hp
-                                    book["current_hp"] = new_current_hp
-                                    book["price"] = new_price
-                                    book["status"] = new_status
-                                    save_data(data)
-                                    st.success("保存しました")
-                                    st.rerun()
-                                if delete:
-                                    data["books"] = [b for b in data["books"] if b["id"] != book["id"]]
-                                    data["logs"] = [l for l in data["logs"] if l.get("book_id") != book["id"]]
-                                    save_data(data)
-                                    st.success("削除しました")
-                                    st.rerun()
-
-    # --- タブ2: 履歴・分析 ---
-    with main_tab[1]:
-        st.header("📊 履歴・分析")
+                    st.info("まだ API を呼び出していません")
+
+def display_history(state: GameState):
+    """履歴・分析タブ"""
+    user = state.user
+    st.header("📊 履歴・分析")
+    col1, col2, col3 = st.columns(3)
+    with col1: st.metric("総投資額", f"¥{user.get('total_investment', 0):,}")
+    with col2: st.metric("総読書時間", f"{user.get('total_hours', 0.0):.1f}時間")
+    with col3: st.metric("読了書籍数", f"{state.stats['completed']}冊")
+    
+    st.divider()
+    if not state.logs:
+        st.subheader("読書ログ")
+        st.info("記録がありません")
+    else:
+        stats = load_analytics(state)
+        series = get_profiler().timed("timeseries", series_for, state)
         col1, col2, col3 = st.columns(3)
-        with col1: st.metric("総投資額", f"¥{user.get('total_investment', 0):,}")
-        with col2: st.metric("総読書時間", f"{user.get('total_hours', 0.0):.1f}時間")
-        with col3: st.metric("読了書籍数", f"{len([b for b in data.get('books', []) if b.get('status') == 'completed'])}冊")
+        with col1: st.metric("総ページ数", f"{stats['total_pages']:,}P")
+        with col2: st.metric("読書速度", f"{stats['speed']:.2f}P/分" if stats["speed"] else "-")
+        with col3: st.metric("最長連続記録", f"{series.longest_streak()}日")
         
-        st.divider()
-        st.subheader("読書ログ")
-        logs = data.get("logs", [])
-        if not logs:
-            st.info("記録がありません")
-        else:
-            logs_data = []
-            for log in logs:
-                b = next((b for b in data.get("books", []) if b["id"] == log.get("book_id")), None)
-                logs_data.append({
-                    "日付": log.get("date"), "書籍": b.get("title", "不明") if b else "不明",
-                    "P": log.get("pages"), "分": log.get("minutes"), "EXP": log.get("exp_gained")
-                })
-            st.dataframe(pd.DataFrame(logs_data), use_container_width=True)
-
-    # --- タブ3: 本棚 ---
-    with main_tab[2]:
-        st.header("📚 本棚")
-        status_filter = st.selectbox("フィルタ", ["全て", "未読", "読書中", "読了", "再読中"])
-        books = data.get("books", [])
-        filtered_books = books
-        if status_filter == "未読": filtered_books = [b for b in books if b.get("status") == "unread"]
-        elif status_filter == "読書中": filtered_books = [b for b in books if b.get("status") == "active"]
-        elif status_filter == "読了": filtered_books = [b for b in books if b.get("status") == "completed"]
-        elif status_filter == "再読中": filtered_books = [b for b in books if b.get("status") == "reread"]
+        period_label = st.radio("集計単位", ["日", "週", "月"], horizontal=True, key="analytics_period")
+        period_key = {"日": "daily", "週": "weekly", "月": "monthly"}[period_label]
+        periods, totals = series.window(period_key, fill=True)
+        st.bar_chart({"期間": periods, "ページ": totals["pages"], "分": totals["minutes"]}, x="期間", y=["ページ", "分"])
+        metric_label = st.radio("推移", ["ページ", "EXP", "読了冊数"], horizontal=True, key="trend_metric")
+        metric = {"ページ": "pages", "EXP": "exp", "読了冊数": "completed"}[metric_label]
+        st.line_chart({"期間": periods, metric_label: totals[metric]}, x="期間", y=metric_label)
+
+        st.subheader("読書カレンダー")
+        display_reading_calendar(series)
+        
+        st.subheader("ジャンル別")
+        st.dataframe(
+            stats["genres"].rename(columns={"pages": "P", "minutes": "分", "exp_gained": "EXP", "speed": "P/分"}),
+            use_container_width=True
+        )
         
-        for book in filtered_books:
-            with st.expander(f"{book['title']} ({book.get('status')})"):
-                st.write(f"ジャンル: {book.get('genre')} | P: {book['max_hp']}")
-                if book.get("review", {}).get("good"): st.write(f"Good: {book['review']['good']}")
+        st.subheader("読書ログ")
+        log_index = load_log_index(state)
+        first, last = log_index.date_range()
+        col1, col2 = st.columns(2)
+        with col1:
+            # key を付けないことで、ログが増えて範囲が変わったら既定値（全期間）に戻る
+            date_range = st.date_input("期間", value=(parse_date(first).date(), parse_date(last).date()) if first else ())
+        with col2:
+            book_options = [None] + log_index.book_ids()
+            book_filter = st.selectbox(
+                "書籍", book_options, key="log_book_filter",
+                format_func=lambda i: "全て" if i is None else (state.book(i).title if state.book(i) else "不明"),
+            )
+        # 終了日を選ぶ前（開始日だけ）の間は開始日以降を出す
+        start = date_range[0].isoformat() if len(date_range) > 0 else None
+        end = date_range[1].isoformat() if len(date_range) > 1 else None
+        _, total = log_index.query(start, end, book_filter, limit=0)
+        offset = page_selector("ページ", total, LOG_PAGE_SIZE, "log_page")
+        rows, _ = log_index.query(start, end, book_filter, offset=offset, limit=LOG_PAGE_SIZE)
+        st.dataframe(
+            [{"日付": log.date, "書籍": book.title if book else "不明", "P": log.pages, "分": log.minutes,
+              "EXP": log.exp_gained} for log, book in rows],
+            use_container_width=True, hide_index=True
+        )
+
+def display_bookshelf(state: GameState):
+    """本棚タブ"""
+    st.header("📚 本棚")
+    shelf = load_shelf(state)
+    col1, col2, col3 = st.columns([2, 2, 1])
+    with col1: status_filter = st.selectbox("フィルタ", ["全て", "未読", "読書中", "読了", "再読中"])
+    with col2: sort_label = st.selectbox("並び順", ["タイトル", "ステータス", "ジャンル", "進捗", "最終読書日"])
+    with col3: descending = st.toggle("降順", value=False)
+    status_map = {"未読": "unread", "読書中": "active", "読了": "completed", "再読中": "reread"}
+    sort_map = {"タイトル": "title", "ステータス": "status", "ジャンル": "genre", "進捗": "progress", "最終読書日": "last_read"}
+    status = status_map.get(status_filter)
+    _, total = shelf.page(status, limit=0)
+    offset = page_selector("ページ", total, SHELF_PAGE_SIZE, "shelf_page")
+    filtered_books, _ = shelf.page(status, sort_map[sort_label], descending, offset=offset, limit=SHELF_PAGE_SIZE)
+    
+    for book in filtered_books:
+        with st.expander(f"{book.title} ({book.status})"):
+            st.write(f"ジャンル: {book.genre} | P: {book.max_hp} | 進捗: {progress(book):.0%}"
+                     + (f" | 最終読書日: {shelf.last_read[book.id]}" if book.id in shelf.last_read else ""))
+            if book.review.get("good"): st.write(f"Good: {book.review['good']}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
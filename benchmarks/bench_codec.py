@@ -0,0 +1,63 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from codec import pack_log_segments, pack_state, unpack_logs, unpack_state  # noqa: E402
+from storage import CHUNK_SIZE, SheetsBackend, split_document  # noqa: E402
+from synthetic import generate_document  # noqa: E402
+
+# --- 保存形式のベンチマーク ---
+# python benchmarks/bench_codec.py --sizes 1000 10000 100000
+# ログを JSON・1件1行（rows）・列指向の圧縮形式（packed）で保存した場合のサイズと、符号化・復号の時間を比べる。
+# ログIDはアプリと同じく uuid4 にする。
+
+
+def timed(fn, repeat: int):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return result, (time.perf_counter() - start) / repeat
+
+
+def run(num_logs: int, repeat: int):
+    data = generate_document(num_logs, years=max(1, num_logs // 700), uuid_ids=True)
+    state, logs = split_document(data)
+
+    json_str, json_enc = timed(lambda: json.dumps(logs, ensure_ascii=False), repeat)
+    _, json_dec = timed(lambda: json.loads(json_str), repeat)
+
+    rows = [SheetsBackend._log_to_row(l) for l in logs]
+    row_chars = sum(len(str(v)) for row in rows for v in row)
+
+    segments, packed_enc = timed(lambda: pack_log_segments(logs, CHUNK_SIZE), repeat)
+    decoded, packed_dec = timed(lambda: [l for s in segments for l in unpack_logs(s)], repeat)
+    assert decoded == logs, "復号したログが一致しません"
+    packed_chars = sum(len(s) for s in segments)
+
+    state_json = json.dumps(state, ensure_ascii=False)
+    state_packed = pack_state(state)
+    assert unpack_state(state_packed) == state
+
+    print(f"{num_logs:>8,} logs")
+    print(f"  json    {len(json_str):>12,} chars  1 cell         enc {json_enc * 1000:8.1f} ms  dec {json_dec * 1000:8.1f} ms")
+    print(f"  rows    {row_chars:>12,} chars  {len(rows) * len(rows[0]):>9,} cells")
+    print(f"  packed  {packed_chars:>12,} chars  {len(segments):>9,} cells  enc {packed_enc * 1000:8.1f} ms  dec {packed_dec * 1000:8.1f} ms"
+          f"  ({packed_chars / len(json_str):.1%} of json)")
+    print(f"  state   json {len(state_json):,} chars -> packed {len(state_packed):,} chars")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="保存形式のベンチマーク")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    for size in args.sizes:
+        run(size, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
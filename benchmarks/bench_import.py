@@ -0,0 +1,77 @@
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# --- 起動時の import 時間 ---
+# python benchmarks/bench_import.py                  # app を import したときの時間と、重いモジュールが読み込まれていないことを確認
+# python benchmarks/bench_import.py --module storage --top 20
+# 別プロセスで python -X importtime -c "import <module>" を実行し、標準エラーの出力を集計する。
+# インタプリタの起動時に読み込まれるモジュール（-c pass でも読み込まれるもの）は除く。
+# 最初の描画に不要な LAZY_MODULES のいずれかが読み込まれていれば終了コード 1 にする。
+
+LAZY_MODULES = ["pandas", "gspread", "google.auth", "google.oauth2"] # 使う画面・処理まで import しないもの
+
+
+def import_times(statement: str, repeat: int) -> Dict[str, Tuple[int, int]]:
+    """モジュール名 → (自身の時間, 累積時間)（マイクロ秒）。repeat 回のうち合計が最短の回"""
+    best = None
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], cwd=ROOT,
+                              capture_output=True, text=True)
+        if proc.returncode != 0:
+            sys.exit(proc.stderr.strip().splitlines()[-1])
+        times = {}
+        for line in proc.stderr.splitlines():
+            if not line.startswith("import time:") or "self [us]" in line:
+                continue
+            self_us, cumulative_us, name = line[len("import time:"):].split("|")
+            times[name.strip()] = (int(self_us), int(cumulative_us))
+        if best is None or sum(s for s, _ in times.values()) < sum(s for s, _ in best.values()):
+            best = times
+    return best
+
+
+def top_level(times: Dict[str, Tuple[int, int]]) -> List[Tuple[str, int]]:
+    """パッケージごとの自身の時間の合計（降順）"""
+    totals: Dict[str, int] = {}
+    for name, (self_us, _) in times.items():
+        package = name.split(".")[0]
+        totals[package] = totals.get(package, 0) + self_us
+    return sorted(totals.items(), key=lambda item: -item[1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="起動時の import 時間")
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    startup = import_times("pass", 1)
+    times = {name: t for name, t in import_times(f"import {args.module}", args.repeat).items() if name not in startup}
+    total = sum(s for s, _ in times.values())
+    print(f"import {args.module}: {total / 1000:.1f} ms ({len(times)} modules)")
+    for package, self_us in top_level(times)[:args.top]:
+        print(f"  {package:<24} {self_us / 1000:8.1f} ms")
+
+    loaded = [m for m in LAZY_MODULES if any(name == m or name.startswith(m + ".") for name in times)]
+    # 遅延させたモジュールを先に読み込んだ場合の時間（比較用。入っていないものは除く）
+    available = [m for m in LAZY_MODULES if subprocess.run([sys.executable, "-c", f"import {m}"],
+                                                          capture_output=True).returncode == 0]
+    if available:
+        eager = import_times("import " + ", ".join([args.module] + available), args.repeat)
+        eager_total = sum(s for name, (s, _) in eager.items() if name not in startup)
+        print(f"import {args.module} + {', '.join(available)}: {eager_total / 1000:.1f} ms"
+              f"  (遅延により {max(0, eager_total - total) / 1000:.1f} ms 短縮)")
+    if loaded:
+        print(f"起動時に読み込まれています: {', '.join(loaded)}")
+        sys.exit(1)
+    print(f"起動時に読み込まれていません: {', '.join(LAZY_MODULES)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import argparse
+import copy
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model import GameState, Log  # noqa: E402
+from replay import REPLAY_USER_FIELDS, apply_replay, replay  # noqa: E402
+from synthetic import generate_document  # noqa: E402
+
+# --- 再計算エンジンのベンチマーク ---
+# python benchmarks/bench_replay.py --sizes 1000 10000 100000
+# 全件の再生と、スナップショットからの差分再生（最後の1日分を追記）の時間を測る。
+
+
+def check(state: GameState, expected_user: dict):
+    """合成時に record_reading で積み上げた値と再生結果が一致するか確かめる"""
+    changes = apply_replay(state, replay(state)[0])
+    drift = {k: v for k, v in changes.items() if k in REPLAY_USER_FIELDS}
+    assert not drift, f"再生結果が一致しません: {drift}"
+    assert state.user["level"] == expected_user["level"]
+
+
+def run(num_logs: int, repeat: int):
+    data = generate_document(num_logs, years=max(1, num_logs // 700))
+    state = GameState(copy.deepcopy(data))
+    check(GameState(copy.deepcopy(data)), data["user"])
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fold, snapshots = replay(state)
+    full = (time.perf_counter() - start) / repeat
+
+    # 最後の日付で10件追記し、スナップショットから再開する
+    last = state.logs[-1]
+    for n in range(10):
+        state.add_log(Log(id=f"extra-{n}", date=last.date, book_id=last.book_id, pages=1))
+    start = time.perf_counter()
+    for _ in range(repeat):
+        replay(state, snapshots)
+    incremental = (time.perf_counter() - start) / repeat
+
+    print(f"{num_logs:>8,} logs  full {full * 1000:8.1f} ms ({num_logs / full:>10,.0f} logs/s)"
+          f"  incremental {incremental * 1000:7.2f} ms  snapshots {len(snapshots)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ログ再計算のベンチマーク")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    for size in args.sizes:
+        run(size, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
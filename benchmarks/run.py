@@ -0,0 +1,161 @@
+import argparse
+import copy
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+from typing import Callable, Dict, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from codec import pack_log_segments, pack_state  # noqa: E402
+from game import calculate_combo, calculate_level_up, player_avatar_name, update_job_class  # noqa: E402
+from model import GameState  # noqa: E402
+from replay import replay  # noqa: E402
+from storage import CHUNK_SIZE, split_document  # noqa: E402
+from synthetic import generate_document  # noqa: E402
+from timeseries import ReadingSeries  # noqa: E402
+
+# --- ゲームコアのベンチマーク ---
+# python benchmarks/run.py                          # 1k/10k/100k ログで計測して表示
+# python benchmarks/run.py --save benchmarks/baseline.json
+# python benchmarks/run.py --compare benchmarks/baseline.json   # 基準より tolerance 倍以上遅ければ終了コード 1
+# 各処理を repeat 回実行した最短時間からスループットを求め、データ量に比例する処理はメモリのピークも測る。
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+
+def best_time(fn: Callable[[], object], repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def peak_memory(fn: Callable[[], object]) -> int:
+    """fn の実行中に確保されたメモリのピーク（バイト）"""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def cases(num_logs: int, data: Dict) -> Dict[str, tuple]:
+    """処理名 → (関数, 1回あたりの件数, メモリも測るか)"""
+    state = GameState(copy.deepcopy(data))
+    dates = [(date(2020, 1, 1) + timedelta(days=n // 2)).isoformat() for n in range(num_logs)]
+
+    def combo():
+        u = {"combo": 0, "last_read_date": None}
+        for d in dates:
+            u["combo"] = calculate_combo(u, d)
+            u["last_read_date"] = d
+
+    def level_up():
+        u = {"level": 1, "exp": 0}
+        for _ in range(num_logs):
+            calculate_level_up(u, 30)
+
+    def job_class():
+        for _ in range(num_logs):
+            update_job_class(state)
+
+    def avatar():
+        for _ in range(num_logs):
+            player_avatar_name(state)
+
+    def pack():
+        doc_state, logs = split_document(data)
+        pack_state(doc_state)
+        pack_log_segments(logs, CHUNK_SIZE)
+
+    result = {
+        "generate": (lambda: generate_document(num_logs, years=max(1, num_logs // 700), num_books=num_logs // 20), num_logs, True),
+        "calculate_combo": (combo, num_logs, False),
+        "calculate_level_up": (level_up, num_logs, False),
+        "update_job_class": (job_class, num_logs, False),
+        "player_avatar_name": (avatar, num_logs, False),
+        "state_index": (lambda: GameState(copy.deepcopy(data)), num_logs, True),
+        "json_dumps": (lambda: json.dumps(data, ensure_ascii=False), num_logs, True),
+        "codec_pack": (pack, num_logs, True),
+        "replay": (lambda: replay(state), num_logs, True),
+        "timeseries": (lambda: ReadingSeries(state), num_logs, True),
+    }
+    try:
+        from analytics import compute_analytics # pandas が無い環境では測らない
+        result["analytics_join"] = (lambda: compute_analytics(state), num_logs, True)
+    except ImportError:
+        pass
+    return result
+
+
+def run(num_logs: int, repeat: int) -> Dict[str, Dict]:
+    data = generate_document(num_logs, years=max(1, num_logs // 700), num_books=num_logs // 20, uuid_ids=True)
+    results = {}
+    for name, (fn, items, measure_memory) in cases(num_logs, data).items():
+        seconds = best_time(fn, 1 if name == "generate" else repeat)
+        results[name] = {"seconds": seconds, "per_second": items / seconds if seconds else None,
+                         "peak_bytes": peak_memory(fn) if measure_memory else None}
+    return results
+
+
+def report(size: int, results: Dict[str, Dict], baseline: Optional[Dict], tolerance: float) -> int:
+    """結果を表示し、基準より tolerance 倍以上遅くなった処理の数を返す"""
+    regressions = 0
+    print(f"--- {size:,} logs ---")
+    for name, r in results.items():
+        line = f"  {name:<20} {r['seconds'] * 1000:10.2f} ms  {r['per_second']:>14,.0f} /s"
+        line += f"  peak {r['peak_bytes'] / 1024 / 1024:8.1f} MB" if r["peak_bytes"] is not None else " " * 19
+        base = (baseline or {}).get(str(size), {}).get(name)
+        if base:
+            ratio = r["seconds"] / base["seconds"]
+            line += f"  x{ratio:5.2f} vs baseline"
+            if ratio >= tolerance:
+                line += "  << REGRESSION"
+                regressions += 1
+        print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ゲームコアのベンチマーク")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--save", nargs="?", const=DEFAULT_BASELINE, help="結果を基準値として保存する")
+    parser.add_argument("--compare", nargs="?", const=DEFAULT_BASELINE, help="基準値と比較する")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="この倍率以上遅くなったら退行とみなす")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+
+    all_results = {}
+    regressions = 0
+    for size in args.sizes:
+        all_results[str(size)] = run(size, args.repeat)
+        regressions += report(size, all_results[str(size)], baseline, args.tolerance)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"python": platform.python_version(), "machine": platform.machine(),
+                       "created": date.today().isoformat(), "results": all_results}, f, indent=1)
+            f.write("\n")
+        print(f"基準値を保存しました: {args.save}")
+    if regressions:
+        print(f"{regressions} 件の処理が基準値より {args.tolerance} 倍以上遅くなりました")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
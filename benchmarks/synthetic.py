@@ -0,0 +1,52 @@
+import os
+import random
+import sys
+import uuid
+from datetime import date, timedelta
+from typing import Dict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from game import ALL_GENRES, INITIAL_DATA, record_reading  # noqa: E402
+from model import Book, GameState  # noqa: E402
+
+# --- ベンチマーク用の合成データ ---
+# 何年分もの読書履歴を、画面からの記録と同じ record_reading で生成する。
+# 乱数の種を固定すれば毎回同じドキュメントになる。
+
+
+def _add_book(state: GameState, rng: random.Random, status: str) -> Book:
+    pages = rng.randint(150, 500)
+    return state.add_book(Book(
+        id=state.next_book_id(), title=f"Book {state.next_book_id()}", genre=rng.choice(ALL_GENRES),
+        max_hp=pages, price=rng.randint(800, 3000), status=status,
+    ))
+
+
+def generate_document(num_logs: int, years: int = 3, seed: int = 0, start: date = date(2020, 1, 1),
+                      num_books: int = 0, uuid_ids: bool = False) -> Dict:
+    """num_logs 件の読書ログを years 年に散らばせたドキュメントを作る
+
+    読み進める本は必要に応じて追加する。num_books を指定すると、合計がその冊数になるまで未読の本を積んでおく。
+    uuid_ids なら画面からの記録と同じく uuid4 のログIDにする（既定は log-<番号>）。
+    """
+    rng = random.Random(seed)
+    state = GameState({"user": dict(INITIAL_DATA["user"], weapons=[]), "books": [], "logs": []})
+    # 読んだ日はところどころ空けて、コンボが途切れる日も作る
+    days = sorted(rng.randrange(years * 365) for _ in range(num_logs))
+    book = None
+    for n, day in enumerate(days):
+        if book is None or book.current_hp <= 0:
+            if book is not None and rng.random() < 0.05:
+                state.update_book(book, status="reread", current_hp=book.max_hp)
+            else:
+                book = _add_book(state, rng, "active")
+        read_date = (start + timedelta(days=day)).isoformat()
+        log_id = str(uuid.UUID(int=rng.getrandbits(128), version=4)) if uuid_ids else f"log-{n}"
+        record_reading(
+            state, book, min(rng.randint(10, 60), book.current_hp), minutes=rng.randint(0, 90),
+            rating=rng.choice((0, 0, 0, 3, 4, 5)), read_date=read_date, log_id=log_id,
+        )
+    while len(state.books) < num_books:
+        _add_book(state, rng, "unread")
+    return state.to_dict()
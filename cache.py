@@ -0,0 +1,104 @@
+import time
+from typing import Callable, Dict, Optional
+
+from merge import make_base
+from storage import StorageBackend
+
+# --- パース済みドキュメントのキャッシュ ---
+# Streamlit の rerun ごとにスプレッドシートを読み直さないよう、セッション内で
+# パース済みの dict を保持する。変更検知はリビジョン（B1 等）だけを読む。
+
+
+class DocumentCache:
+    """リビジョン確認付きのライトスルーキャッシュ"""
+
+    def __init__(self, backend: StorageBackend, ttl: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        self.backend = backend
+        self.ttl = ttl # この秒数の間はリビジョン確認もしない
+        self.clock = clock
+        self.data: Optional[Dict] = None
+        self.base: Optional[Dict] = None # 読み込み時点のスナップショット（競合時のマージ基準）
+        self.revision: Optional[str] = None
+        self.checked_at: Optional[float] = None
+        self.derived: Dict[str, object] = {} # 同じリビジョンの間だけ有効な派生データ
+        self.dirty = False # バックグラウンド保存が終わっていないローカルの変更がある
+        self.provisional = False # ローカルのスナップショットを表示中（ストレージで未確認）
+        self.failed = False # 直近のリビジョン確認・読み込みが失敗した（成功するまで保存しない）
+
+    def is_fresh(self) -> bool:
+        """TTL 内であればネットワークに触れずにキャッシュを使える"""
+        return self.checked_at is not None and self.clock() - self.checked_at < self.ttl
+
+    def get(self, force: bool = False) -> Optional[Dict]:
+        """キャッシュ済みドキュメントを返す。古ければリビジョンを確認して必要時のみ再読込"""
+        if not force and self.provisional:
+            return self.data
+        try:
+            if not force and self.checked_at is not None:
+                if self.is_fresh() or self.dirty:
+                    return self.data
+                revision = self.backend.revision()
+                if revision is not None and revision == self.revision:
+                    self.checked_at = self.clock()
+                    self.failed = False
+                    return self.data
+
+            data, revision = self.backend.load()
+        except Exception:
+            self.failed = True
+            raise
+        self.put(data, revision)
+        return data
+
+    def put(self, data: Optional[Dict], revision: Optional[str]):
+        """保存済みのドキュメントをそのままキャッシュに反映する（ライトスルー）"""
+        self.data = data
+        self.base = make_base(data)
+        self.revision = revision
+        self.checked_at = self.clock()
+        self.derived = {}
+        self.dirty = False
+        self.provisional = False
+        self.failed = False
+
+    def seed(self, data: Dict, revision: Optional[str]):
+        """スナップショットを仮に表示する。get(force=True) で確認するまでストレージには触れず、保存にも使わない"""
+        self.data = data
+        self.base = make_base(data)
+        self.revision = revision
+        self.checked_at = None
+        self.derived = {}
+        self.dirty = False
+        self.provisional = True
+
+    def put_local(self, data: Dict):
+        """保存前のローカルの変更を反映する。保存が終わるまでストレージから読み直さない"""
+        self.data = data
+        self.derived = {}
+        self.dirty = True
+
+    def mark_saved(self, saved: Dict, revision: Optional[str], latest: Optional[Dict] = None, dirty: bool = False):
+        """バックグラウンド保存の完了を反映する。latest はマージ後に表示すべきドキュメント"""
+        self.base = make_base(saved)
+        self.revision = revision
+        self.checked_at = self.clock()
+        self.dirty = dirty
+        if latest is not None:
+            self.data = latest
+            self.derived = {}
+
+    def derive(self, key: str, builder: Callable[[Optional[Dict]], object]):
+        """ドキュメントから派生データを作り、リビジョンが変わるまで使い回す"""
+        if key not in self.derived:
+            self.derived[key] = builder(self.data)
+        return self.derived[key]
+
+    def invalidate(self):
+        self.data = None
+        self.base = None
+        self.revision = None
+        self.checked_at = None
+        self.derived = {}
+        self.provisional = False
+        self.failed = False
+        self.dirty = False
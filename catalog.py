@@ -0,0 +1,279 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import unicodedata
+from bisect import bisect_left
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# --- マスタ書籍カタログの索引 ---
+# books_master.json を一度だけ読み込み、タイトルの前方一致（ソート済み配列 + 二分探索）と
+# 部分一致（文字 1-gram / 2-gram の転置索引）で検索できるようにする。
+# 日本語タイトルは空白区切りにならないため、単語ではなく文字 n-gram で索引を作る。
+#
+# 作った索引は元ファイルの横（<path>.idx）にバイナリで書き出し、以後は mmap で読む。
+# 文字列は1つの領域に連結し、書籍・n-gram・ジャンルはそこへの (位置, 長さ) と番号の配列で表すため、
+# 読み込み時に解析も辞書の構築も要らず、同じマシンの複数のワーカープロセスはページを共有する。
+
+
+def normalize_title(text: str) -> str:
+    """全角半角・大文字小文字・空白の違いを吸収する"""
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    return "".join(text.split())
+
+
+def _ngrams(text: str, n: int) -> set:
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class MasterCatalog:
+    """マスタ書籍の検索用索引"""
+
+    def __init__(self, books: List[Dict]):
+        self.books = books
+        self.titles = [normalize_title(b.get("title", "")) for b in books]
+        # 前方一致用: (正規化タイトル, 番号) のソート済み配列
+        self._sorted = sorted((title, i) for i, title in enumerate(self.titles))
+        self._sorted_keys = [title for title, _ in self._sorted]
+        # 部分一致用: n-gram -> 番号の昇順リスト
+        self._postings: Dict[str, List[int]] = {}
+        for i, title in enumerate(self.titles):
+            for gram in _ngrams(title, 1) | _ngrams(title, 2):
+                self._postings.setdefault(gram, []).append(i)
+        self._by_genre: Dict[str, List[int]] = {}
+        for i, b in enumerate(books):
+            self._by_genre.setdefault(b.get("genre", ""), []).append(i)
+
+    def __len__(self) -> int:
+        return len(self.books)
+
+    def label(self, index: int) -> str:
+        b = self.books[index]
+        return f"{b.get('title', '')} ({b.get('genre', '')})"
+
+    def _prefix_matches(self, query: str) -> List[int]:
+        start = bisect_left(self._sorted_keys, query)
+        result = []
+        for title, i in self._sorted[start:]:
+            if not title.startswith(query):
+                break
+            result.append(i)
+        return result
+
+    def _posting(self, gram: str) -> Sequence[int]:
+        return self._postings.get(gram, [])
+
+    def _genre_ids(self, genre: str) -> Sequence[int]:
+        return self._by_genre.get(genre, [])
+
+    def _substring_matches(self, query: str) -> List[int]:
+        grams = _ngrams(query, 2) if len(query) >= 2 else {query}
+        postings = [self._posting(g) for g in grams]
+        if not all(postings):
+            return []
+        postings.sort(key=len)
+        # 最も短い転置リストを候補とし、実際に部分一致するものだけに絞り込む
+        candidates = postings[0]
+        return [i for i in candidates if query in self.titles[i]]
+
+    def search(self, query: str = "", genre: Optional[str] = None, offset: int = 0, limit: int = 20) -> Tuple[List[int], int]:
+        """検索結果の番号（前方一致 → 部分一致の順）のうち offset から limit 件と、総件数を返す"""
+        query = normalize_title(query)
+        if not query:
+            matches = self._genre_ids(genre) if genre else range(len(self.books))
+            return list(matches[offset:offset + limit]), len(matches)
+
+        prefix = self._prefix_matches(query)
+        prefix_set = set(prefix)
+        matches = prefix + [i for i in self._substring_matches(query) if i not in prefix_set]
+        if genre:
+            in_genre = set(self._genre_ids(genre))
+            matches = [i for i in matches if i in in_genre]
+        return matches[offset:offset + limit], len(matches)
+
+
+# --- 索引ファイル ---
+INDEX_MAGIC = b"RRPGCAT\0"
+INDEX_VERSION = 1
+INDEX_SUFFIX = ".idx"
+# magic, 版, バイト順（1 = little）, 元ファイルの SHA-1, 各領域の長さ（u32 の個数。文字列領域はバイト数）
+_HEADER = struct.Struct("<8sII20s10I")
+# 文字列領域の後に続く u32 配列の並び
+_SECTIONS = ("books", "titles", "sorted", "gram_refs", "gram_starts", "postings",
+             "genre_refs", "genre_starts", "genre_postings")
+
+
+class _StringTable:
+    """文字列領域への (位置, 長さ) 配列を、文字列の列として読む"""
+
+    def __init__(self, blob: memoryview, refs: memoryview):
+        self._blob = blob
+        self._refs = refs
+
+    def __len__(self) -> int:
+        return len(self._refs) // 2
+
+    def __getitem__(self, index: int) -> str:
+        start = self._refs[index * 2]
+        return str(self._blob[start:start + self._refs[index * 2 + 1]], "utf-8")
+
+    def find(self, key: str) -> int:
+        """ソート済みの表から key の番号を探す。無ければ -1"""
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self[mid] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < len(self) and self[lo] == key else -1
+
+
+class _Records:
+    """書籍ごとの JSON を、読むたびに dict に戻す"""
+
+    def __init__(self, strings: _StringTable):
+        self._strings = strings
+
+    def __len__(self) -> int:
+        return len(self._strings)
+
+    def __getitem__(self, index: int) -> Dict:
+        return json.loads(self._strings[index])
+
+
+class CompiledCatalog(MasterCatalog):
+    """write_index() で書き出した索引を mmap で読む。MasterCatalog と同じように検索できる"""
+
+    def __init__(self, path: str, source_digest: Optional[bytes] = None):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mmap) < _HEADER.size:
+            raise ValueError("索引ファイルが壊れています")
+        magic, version, little, digest, blob_size, *sizes = _HEADER.unpack_from(self._mmap)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION or little != (sys.byteorder == "little"):
+            raise ValueError("索引ファイルの形式が違います")
+        if source_digest is not None and digest != source_digest:
+            raise ValueError("索引ファイルが元のファイルと一致しません")
+        view = memoryview(self._mmap)
+        offset = _HEADER.size
+        blob = view[offset:offset + blob_size]
+        offset += _padded(blob_size)
+        arrays = {}
+        for name, size in zip(_SECTIONS, sizes):
+            arrays[name] = view[offset:offset + size * 4].cast("I")
+            offset += size * 4
+        if offset > len(self._mmap):
+            raise ValueError("索引ファイルが壊れています")
+        self.books = _Records(_StringTable(blob, arrays["books"]))
+        self.titles = _StringTable(blob, arrays["titles"])
+        self._sorted_ids = arrays["sorted"]
+        self._grams = _StringTable(blob, arrays["gram_refs"])
+        self._gram_starts = arrays["gram_starts"]
+        self._gram_postings = arrays["postings"]
+        self._genres = _StringTable(blob, arrays["genre_refs"])
+        self._genre_starts = arrays["genre_starts"]
+        self._genre_postings = arrays["genre_postings"]
+
+    def _prefix_matches(self, query: str) -> List[int]:
+        ids, titles = self._sorted_ids, self.titles
+        lo, hi = 0, len(ids)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if titles[ids[mid]] < query:
+                lo = mid + 1
+            else:
+                hi = mid
+        result = []
+        for i in ids[lo:]:
+            if not titles[i].startswith(query):
+                break
+            result.append(i)
+        return result
+
+    def _posting(self, gram: str) -> Sequence[int]:
+        index = self._grams.find(gram)
+        if index < 0:
+            return []
+        return self._gram_postings[self._gram_starts[index]:self._gram_starts[index + 1]]
+
+    def _genre_ids(self, genre: str) -> Sequence[int]:
+        index = self._genres.find(genre)
+        if index < 0:
+            return []
+        return self._genre_postings[self._genre_starts[index]:self._genre_starts[index + 1]]
+
+
+def _padded(size: int) -> int:
+    return -(-size // 4) * 4
+
+
+def write_index(catalog: MasterCatalog, path: str, source_digest: bytes):
+    """MasterCatalog の索引をファイルに書き出す。一時ファイルを置き換えるので、読み込み中のプロセスがあっても壊れない"""
+    blob = bytearray()
+    interned: Dict[str, int] = {}
+
+    def ref(text: str) -> Tuple[int, int]:
+        if text not in interned:
+            interned[text] = len(blob)
+            blob.extend(text.encode("utf-8"))
+        return interned[text], len(text.encode("utf-8"))
+
+    def refs(texts) -> List[int]:
+        return [n for text in texts for n in ref(text)]
+
+    def grouped(groups: Dict[str, List[int]]) -> Tuple[List[int], List[int], List[int]]:
+        keys = sorted(groups)
+        starts, ids = [0], []
+        for key in keys:
+            ids.extend(groups[key])
+            starts.append(len(ids))
+        return refs(keys), starts, ids
+
+    gram_refs, gram_starts, postings = grouped(catalog._postings)
+    genre_refs, genre_starts, genre_postings = grouped(catalog._by_genre)
+    arrays = {
+        "books": refs(json.dumps(b, ensure_ascii=False, separators=(",", ":")) for b in catalog.books),
+        "titles": refs(catalog.titles),
+        "sorted": [i for _, i in catalog._sorted],
+        "gram_refs": gram_refs, "gram_starts": gram_starts, "postings": postings,
+        "genre_refs": genre_refs, "genre_starts": genre_starts, "genre_postings": genre_postings,
+    }
+    header = _HEADER.pack(INDEX_MAGIC, INDEX_VERSION, sys.byteorder == "little", source_digest, len(blob),
+                          *(len(arrays[name]) for name in _SECTIONS))
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(header)
+        f.write(blob + b"\0" * (_padded(len(blob)) - len(blob)))
+        for name in _SECTIONS:
+            f.write(struct.pack(f"={len(arrays[name])}I", *arrays[name]))
+    os.replace(tmp, path)
+
+
+def load_catalog(path: str, index_path: Optional[str] = None) -> MasterCatalog:
+    """マスタファイルの索引を開く。ファイルが無い・壊れている場合は空の索引
+
+    元ファイルと一致する索引ファイル（既定は <path>.idx）があれば mmap で開き、無ければ作って書き出す。
+    書き出せない場所では、その場で作った索引をそのまま使う。
+    """
+    try:
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                raw = f.read()
+            digest = hashlib.sha1(raw).digest()
+            index_path = index_path or path + INDEX_SUFFIX
+            try:
+                return CompiledCatalog(index_path, digest)
+            except (OSError, ValueError):
+                pass # 未作成・古い・別の版
+            catalog = MasterCatalog(json.loads(raw.decode("utf-8")))
+            try:
+                write_index(catalog, index_path, digest)
+                return CompiledCatalog(index_path, digest)
+            except OSError:
+                return catalog
+    except (OSError, ValueError):
+        pass
+    return MasterCatalog([])
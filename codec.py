@@ -0,0 +1,165 @@
+import base64
+import json
+import re
+import zlib
+from datetime import date
+from typing import Dict, List
+
+# --- 保存用のコンパクトな符号化 ---
+# ログは列ごとの配列（列指向）にし、日付は前のログとの日数差、UUID のログIDはハイフンを除いて連結する。
+# 状態（user/books）は書籍のジャンルを番号に置き換える。いずれも zlib で圧縮して base64 にし、
+# 版を示す接頭辞を付けた文字列として Sheets のセルに保存する。接頭辞の無い値は従来の JSON として読む。
+
+CODEC_VERSION = 1
+LOG_PREFIX = f"RL{CODEC_VERSION}:"
+STATE_ENCODING = f"zlib-b64-v{CODEC_VERSION}" # チャンク形式のマニフェストの encoding
+
+LOG_FIELDS = ["book_id", "pages", "minutes", "exp_gained", "rating", "memo"] # id・date 以外の列
+COMPRESS_LEVEL = 6
+
+_UUID = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$")
+
+
+def _pack(prefix: str, obj) -> str:
+    raw = json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return prefix + base64.b64encode(zlib.compress(raw, COMPRESS_LEVEL)).decode("ascii")
+
+
+def _unpack(prefix: str, text: str):
+    return json.loads(zlib.decompress(base64.b64decode(text[len(prefix):])).decode("utf-8"))
+
+
+# --- ログ ---
+def _encode_dates(values: List) -> List:
+    """YYYY-MM-DD は前の日付との日数差（整数）に、それ以外（None や不正な文字列）はそのまま残す"""
+    encoded, previous = [], 0
+    for value in values:
+        try:
+            ordinal = date.fromisoformat(value).toordinal()
+        except (TypeError, ValueError):
+            encoded.append(value)
+            continue
+        if date.fromordinal(ordinal).isoformat() != value:
+            encoded.append(value) # 2024-1-5 など元の表記に戻せないもの
+            continue
+        encoded.append(ordinal - previous)
+        previous = ordinal
+    return encoded
+
+
+def _decode_dates(values: List) -> List:
+    decoded, previous = [], 0
+    for value in values:
+        if isinstance(value, int):
+            previous += value
+            decoded.append(date.fromordinal(previous).isoformat())
+        else:
+            decoded.append(value)
+    return decoded
+
+
+def encode_logs(logs: List[Dict]) -> Dict:
+    """ログのリストを列指向の dict にする。値の無い列（キーが無いか None）は None で表す"""
+    ids = [l.get("id") for l in logs]
+    columns: Dict = {"v": CODEC_VERSION, "n": len(logs)}
+    if ids and all(isinstance(i, str) and _UUID.match(i) for i in ids):
+        columns["uuid"] = "".join(i.replace("-", "") for i in ids)
+    else:
+        columns["id"] = ids
+    columns["date"] = _encode_dates([l.get("date") for l in logs])
+    for field in LOG_FIELDS:
+        values = [l.get(field) for l in logs]
+        if any(v is not None for v in values):
+            columns[field] = values
+    known = {"id", "date", *LOG_FIELDS}
+    extra = {str(i): {k: v for k, v in l.items() if k not in known} for i, l in enumerate(logs)
+             if any(k not in known for k in l)}
+    if extra:
+        columns["extra"] = extra
+    return columns
+
+
+def decode_logs(columns: Dict) -> List[Dict]:
+    if columns.get("v") != CODEC_VERSION:
+        raise ValueError(f"未対応のログ形式です: v{columns.get('v')}")
+    n = columns["n"]
+    if "uuid" in columns:
+        hexes = columns["uuid"]
+        ids = [f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}" for h in (hexes[i * 32:(i + 1) * 32] for i in range(n))]
+    else:
+        ids = columns["id"]
+    present = [(field, columns[field]) for field in LOG_FIELDS if field in columns]
+    extra = columns.get("extra", {})
+    logs = []
+    for i, (log_id, log_date) in enumerate(zip(ids, _decode_dates(columns["date"]))):
+        log = {"id": log_id} if log_id is not None else {}
+        if log_date is not None:
+            log["date"] = log_date
+        for field, values in present:
+            if values[i] is not None:
+                log[field] = values[i]
+        if str(i) in extra:
+            log.update(extra[str(i)])
+        logs.append(log)
+    return logs
+
+
+def is_packed_logs(value) -> bool:
+    return isinstance(value, str) and value.startswith(LOG_PREFIX)
+
+
+def pack_logs(logs: List[Dict]) -> str:
+    return _pack(LOG_PREFIX, encode_logs(logs))
+
+
+def unpack_logs(text: str) -> List[Dict]:
+    return decode_logs(_unpack(LOG_PREFIX, text))
+
+
+def pack_log_segments(logs: List[Dict], max_length: int, size: int = 1000) -> List[str]:
+    """ログを max_length 文字以内のセグメント（1セル分）に分けて符号化する"""
+    segments = []
+    start = 0
+    while start < len(logs):
+        count = min(size, len(logs) - start)
+        packed = pack_logs(logs[start:start + count])
+        while len(packed) > max_length and count > 1:
+            count = max(1, count * max_length // len(packed) * 9 // 10)
+            packed = pack_logs(logs[start:start + count])
+        segments.append(packed)
+        start += count
+    return segments
+
+
+# --- 状態（user/books） ---
+def encode_state(state: Dict) -> Dict:
+    """書籍のジャンルを genres 表の番号に置き換える"""
+    genres: Dict[str, int] = {}
+    books = []
+    for book in state.get("books", []):
+        if "genre" in book:
+            book = dict(book, genre=genres.setdefault(book["genre"], len(genres)))
+        books.append(book)
+    encoded = dict(state, books=books)
+    encoded["_codec"] = {"v": CODEC_VERSION, "genres": list(genres)}
+    return encoded
+
+
+def decode_state(encoded: Dict) -> Dict:
+    codec = encoded.pop("_codec", None)
+    if codec is None:
+        return encoded
+    if codec.get("v") != CODEC_VERSION:
+        raise ValueError(f"未対応の状態形式です: v{codec.get('v')}")
+    genres = codec["genres"]
+    encoded["books"] = [dict(b, genre=genres[b["genre"]]) if "genre" in b else b for b in encoded.get("books", [])]
+    return encoded
+
+
+def pack_state(state: Dict) -> str:
+    return _pack("", encode_state(state))
+
+
+def unpack_state(text: str) -> Dict:
+    return decode_state(_unpack("", text))
+
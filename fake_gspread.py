@@ -0,0 +1,208 @@
+import re
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+# --- オフライン用の gspread 互換クライアント ---
+# SheetsBackend / SheetsClient が使う API（open・worksheet・values_batch_get・batch_update など）だけを
+# メモリ上で再現する。Google に接続せずに保存の動作やレート制限の挙動を確かめるために使う。
+# requests_per_minute を指定すると、超えた呼び出しは本物と同じく 429 で失敗する。
+
+_A1 = re.compile(r"^(?:'?(?P<sheet>[^'!]+)'?!)?(?P<c1>[A-Z]+)(?P<r1>\d*)(?::(?P<c2>[A-Z]+)(?P<r2>\d*))?$")
+
+
+class FakeResponse:
+    def __init__(self, status_code: int):
+        self.status_code = status_code
+
+
+class FakeAPIError(Exception):
+    """gspread.exceptions.APIError と同じく response.status_code を持つ例外"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.code = status_code
+        self.response = FakeResponse(status_code)
+
+
+class WorksheetNotFound(Exception):
+    pass
+
+
+def _column_index(letters: str) -> int:
+    index = 0
+    for ch in letters:
+        index = index * 26 + ord(ch) - ord("A") + 1
+    return index - 1
+
+
+def parse_range(a1: str) -> Tuple[Optional[str], int, int, Optional[int], Optional[int]]:
+    """'シート'!A2:I → (シート名, 開始行, 開始列, 終了行, 終了列)。いずれも 0 始まりで終了は含む"""
+    m = _A1.match(a1)
+    if not m:
+        raise FakeAPIError(400, f"Unable to parse range: {a1}")
+    r1 = int(m["r1"]) - 1 if m["r1"] else 0
+    c1 = _column_index(m["c1"])
+    if m["c2"] is None:
+        return m["sheet"], r1, c1, r1, c1
+    r2 = int(m["r2"]) - 1 if m["r2"] else None
+    return m["sheet"], r1, c1, r2, _column_index(m["c2"])
+
+
+class FakeWorksheet:
+    def __init__(self, spreadsheet: "FakeSpreadsheet", sheet_id: int, title: str, rows: int = 1000, cols: int = 26):
+        self.spreadsheet = spreadsheet
+        self.id = sheet_id
+        self.title = title
+        self.row_count = rows
+        self.col_count = cols
+        self.cells: Dict[Tuple[int, int], object] = {}
+
+    def _set(self, row: int, col: int, value):
+        if value is None or value == "":
+            self.cells.pop((row, col), None)
+        else:
+            self.cells[(row, col)] = value
+
+    def last_row(self) -> int:
+        """データのある最終行（0 始まり）。空なら -1"""
+        return max((r for r, _ in self.cells), default=-1)
+
+    def read(self, r1: int, c1: int, r2: Optional[int], c2: Optional[int]) -> List[List]:
+        """本物と同じく末尾の空行・空セルを省いて返す"""
+        r2 = self.last_row() if r2 is None else min(r2, self.last_row())
+        c2 = self.col_count - 1 if c2 is None else c2
+        rows = [[self.cells.get((r, c), "") for c in range(c1, c2 + 1)] for r in range(r1, r2 + 1)]
+        rows = [row[:max((i + 1 for i, v in enumerate(row) if v != ""), default=0)] for row in rows]
+        while rows and not rows[-1]:
+            rows.pop()
+        return rows
+
+    def update(self, range_name: str, values: List[List], value_input_option: str = "RAW"):
+        self.spreadsheet.client.tick()
+        _, r1, c1, _, _ = parse_range(range_name)
+        for i, row in enumerate(values):
+            for j, value in enumerate(row):
+                self._set(r1 + i, c1 + j, value)
+
+    def write_rows(self, row: int, col: int, rows: List[Dict]):
+        for i, row_data in enumerate(rows):
+            if row + i >= self.row_count:
+                raise FakeAPIError(400, f"Range exceeds grid limits: row {row + i + 1} of {self.title}")
+            for j, cell in enumerate(row_data.get("values", [])):
+                value = next(iter(cell.get("userEnteredValue", {}).values()), "")
+                self._set(row + i, col + j, value)
+
+
+class FakeSpreadsheet:
+    def __init__(self, client: "FakeClient", title: str, key: str):
+        self.client = client
+        self.title = title
+        self.id = key
+        self.worksheets: List[FakeWorksheet] = [FakeWorksheet(self, 0, "Sheet1")]
+
+    @property
+    def sheet1(self) -> FakeWorksheet:
+        return self.worksheets[0]
+
+    def get_worksheet(self, index: int) -> FakeWorksheet:
+        self.client.tick()
+        return self.worksheets[index]
+
+    def worksheet(self, title: str) -> FakeWorksheet:
+        self.client.tick()
+        for worksheet in self.worksheets:
+            if worksheet.title == title:
+                return worksheet
+        raise WorksheetNotFound(title)
+
+    def _by_id(self, sheet_id: int) -> FakeWorksheet:
+        for worksheet in self.worksheets:
+            if worksheet.id == sheet_id:
+                return worksheet
+        raise FakeAPIError(400, f"No grid with id: {sheet_id}")
+
+    def add_worksheet(self, title: str, rows: int, cols: int) -> FakeWorksheet:
+        self.client.tick()
+        if any(w.title == title for w in self.worksheets):
+            raise FakeAPIError(400, f"A sheet with the name \"{title}\" already exists.")
+        worksheet = FakeWorksheet(self, max(w.id for w in self.worksheets) + 1, title, rows, cols)
+        self.worksheets.append(worksheet)
+        return worksheet
+
+    def values_batch_get(self, ranges: List[str], params: Optional[Dict] = None) -> Dict:
+        self.client.tick()
+        value_ranges = []
+        for a1 in ranges:
+            sheet, r1, c1, r2, c2 = parse_range(a1)
+            worksheet = self.worksheet(sheet) if sheet else self.sheet1
+            value_ranges.append({"range": a1, "values": worksheet.read(r1, c1, r2, c2)})
+        return {"spreadsheetId": self.id, "valueRanges": value_ranges}
+
+    def batch_update(self, body: Dict) -> Dict:
+        """updateCells / appendCells だけに対応する"""
+        self.client.tick()
+        for request in body.get("requests", []):
+            if "updateCells" in request:
+                req = request["updateCells"]
+                start = req["start"]
+                self._by_id(start["sheetId"]).write_rows(start.get("rowIndex", 0), start.get("columnIndex", 0), req["rows"])
+            elif "appendCells" in request:
+                req = request["appendCells"]
+                worksheet = self._by_id(req["sheetId"])
+                first = worksheet.last_row() + 1
+                worksheet.row_count = max(worksheet.row_count, first + len(req["rows"]))
+                worksheet.write_rows(first, 0, req["rows"])
+            else:
+                raise FakeAPIError(400, f"Unsupported request: {list(request)}")
+        return {"spreadsheetId": self.id, "replies": [{} for _ in body.get("requests", [])]}
+
+
+class FakeClient:
+    """gspread.Client の代わり。スプレッドシートは名前で開いたときに無ければ作る"""
+
+    _shared: Optional["FakeClient"] = None
+
+    def __init__(self, requests_per_minute: Optional[int] = None, latency: float = 0.0):
+        self.requests_per_minute = requests_per_minute
+        self.latency = latency # 呼び出しごとに待つ秒数（通信の遅さを再現する）
+        self.calls = 0
+        self._recent = deque()
+        self._lock = threading.Lock()
+        self.spreadsheets: Dict[str, FakeSpreadsheet] = {}
+
+    @classmethod
+    def shared(cls) -> "FakeClient":
+        """プロセスで共有するクライアント（Streamlit の複数セッションから同じシートを見る）"""
+        if cls._shared is None:
+            cls._shared = cls()
+        return cls._shared
+
+    def tick(self):
+        """1回の API 呼び出しとして数え、クォータを超えていれば 429 を返す"""
+        with self._lock:
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] >= 60:
+                self._recent.popleft()
+            if self.requests_per_minute is not None and len(self._recent) >= self.requests_per_minute:
+                raise FakeAPIError(429, "Quota exceeded for quota metric 'Read requests' (fake)")
+            self._recent.append(now)
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def open(self, title: str) -> FakeSpreadsheet:
+        self.tick()
+        for spreadsheet in self.spreadsheets.values():
+            if spreadsheet.title == title:
+                return spreadsheet
+        key = f"fake-{len(self.spreadsheets) + 1}"
+        self.spreadsheets[key] = FakeSpreadsheet(self, title, key)
+        return self.spreadsheets[key]
+
+    def open_by_key(self, key: str) -> FakeSpreadsheet:
+        self.tick()
+        if key not in self.spreadsheets:
+            self.spreadsheets[key] = FakeSpreadsheet(self, key, key)
+        return self.spreadsheets[key]
@@ -0,0 +1,219 @@
+import uuid
+from bisect import bisect_right
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Optional
+
+from levels import LevelCurve, get_curve
+from model import Book, GameState, Log
+from stats import STATS_KEY, add_count
+
+# --- ゲームのルール ---
+# Streamlit に依存しない純粋なロジック。画面（app.py）と一括インポート・再計算の両方から使う。
+
+# 初期データ構造
+INITIAL_DATA = {
+    "user": {
+        "level": 1,
+        "exp": 0,
+        "next_level_exp": 250,
+        "combo": 0,
+        "last_read_date": None,
+        "job": "見習い (Novice)",
+        "total_investment": 0,
+        "total_hours": 0.0,
+        "weapons": []
+    },
+    "books": [],
+    "logs": []
+}
+
+# --- ジャンル・データ定義 ---
+GENRES = {
+    "ビジネス": ["business_basic", "business_strategy", "business_marketing", "business_finance", "business_organization", "business_leadership", "business_decision", "business_general"],
+    "教養": ["liberal_philosophy", "liberal_history", "liberal_psychology", "liberal_medicine", "liberal_engineering", "liberal_biology", "liberal_anthropology"]
+}
+
+ALL_GENRES = []
+for category_genres in GENRES.values():
+    ALL_GENRES.extend(category_genres)
+
+WEAPON_MAP = {
+    "liberal_philosophy": "杖 (Staff)", "liberal_history": "巻物 (Scroll)", "liberal_psychology": "鏡 (Mirror)",
+    "liberal_medicine": "薬瓶 (Potion)", "liberal_engineering": "ガジェット銃 (Gun)", "liberal_biology": "使い魔 (Pet)", "liberal_anthropology": "コンパス (Compass)"
+}
+
+GENRE_NAMES = {
+    "liberal_philosophy": "哲学", "liberal_history": "歴史", "liberal_psychology": "心理学", "liberal_medicine": "医学",
+    "liberal_engineering": "工学", "liberal_biology": "生物学", "liberal_anthropology": "文化人類学"
+}
+
+WEAPON_ICONS = {
+    "杖 (Staff)": "🪄", "巻物 (Scroll)": "📜", "鏡 (Mirror)": "🪞", "薬瓶 (Potion)": "🧪",
+    "ガジェット銃 (Gun)": "🔫", "使い魔 (Pet)": "🐾", "コンパス (Compass)": "🧭"
+}
+
+GENRE_TO_JOB = {
+    ("business_strategy", "business_marketing"): "騎士 (Knight)",
+    ("business_finance", "business_organization"): "参謀 (Tactician)",
+    ("business_leadership", "business_decision"): "聖騎士 (Paladin)",
+    ("business_general",): "賢者 (Sage)"
+}
+
+# 逆引き表（import 時に一度だけ作り、ジャンル・武器ごとの参照を O(1) にする）
+GENRE_SET = frozenset(ALL_GENRES)
+WEAPON_TO_GENRE = {weapon: genre for genre, weapon in WEAPON_MAP.items()}
+JOB_BY_GENRE: Dict[str, str] = {}
+for job_genres, job_name in GENRE_TO_JOB.items():
+    for job_genre in job_genres:
+        JOB_BY_GENRE.setdefault(job_genre, job_name) # 複数の組にあれば先の組（従来の走査順と同じ）
+
+
+def get_today_str() -> str:
+    return datetime.now().strftime("%Y-%m-%d")
+
+
+@lru_cache(maxsize=4096)
+def parse_date(date_str: str) -> datetime:
+    """YYYY-MM-DD を解析する。ログの再計算では同じ日付を何度も解析するためキャッシュする"""
+    return datetime.strptime(date_str, "%Y-%m-%d")
+
+
+def calculate_combo(user_data: Dict, read_date: str) -> int:
+    last_date = user_data.get("last_read_date")
+    if last_date is None:
+        return 1
+    try:
+        last = parse_date(last_date)
+        current = parse_date(read_date)
+        diff = (current - last).days
+        if diff == 0 or diff == 1:
+            return user_data.get("combo", 0) + 1
+        else:
+            return 1
+    except:
+        return 1
+
+
+def get_combo_multiplier(combo_days: int) -> float:
+    multiplier = 1.0 + (combo_days * 0.1)
+    return min(multiplier, 1.5)
+
+
+def calculate_level_up(user_data: Dict, exp_gained: int, curve: Optional[LevelCurve] = None) -> Dict:
+    curve = curve or get_curve()
+    # 累積 EXP に直してから経験値曲線で引き直すので、何レベル上がっても O(log L)
+    total_exp = curve.total_for(user_data["level"]) + user_data["exp"] + exp_gained
+    new_level, new_exp = curve.level_for(total_exp)
+    user_data["exp"] = new_exp
+    user_data["level"] = new_level
+    user_data["next_level_exp"] = curve.required(new_level)
+    return user_data
+
+
+def count_basic_books(state: GameState) -> int:
+    return state.genre_read_counts.get("business_basic", 0)
+
+
+def job_for_genres(genre_count: Dict[str, int]) -> Optional[str]:
+    """最も多く読了したジャンルに対応する職業。読了が無ければ None"""
+    if not genre_count: return None
+    max_genre = max(genre_count.items(), key=lambda x: x[1])[0]
+    return JOB_BY_GENRE.get(max_genre, "見習い (Novice)")
+
+
+def update_job_class(state: GameState):
+    new_job = job_for_genres(state.genre_read_counts)
+    if new_job: state.user["job"] = new_job
+
+
+def get_next_book_id(state: GameState) -> int:
+    return state.next_book_id()
+
+
+def acquire_weapon(user: Dict, genre: str) -> Optional[str]:
+    if genre in WEAPON_MAP:
+        weapon = WEAPON_MAP[genre]
+        if "weapons" not in user: user["weapons"] = []
+        user["weapons"].append(weapon)
+        if STATS_KEY in user: add_count(user[STATS_KEY]["weapons"], weapon, 1)
+        return weapon
+    return None
+
+
+def get_weapon_genre_name(weapon: str) -> str:
+    genre = WEAPON_TO_GENRE.get(weapon)
+    return GENRE_NAMES.get(genre, genre) if genre else ""
+
+
+# --- アバター・敵の画像 ---
+# 職業名に含まれる語 → 画像ファイル名の接頭辞（上から順に判定する）
+JOB_AVATAR_PREFIXES = (
+    (("騎士", "Knight"), "knight"),
+    (("参謀", "Tactician"), "tactician"),
+    (("聖騎士", "Paladin"), "paladin"),
+    (("賢者", "Sage"), "sage"),
+)
+NOVICE_AVATAR_STAGES = 6 # 基礎書籍をこの冊数読むまでは見習いの段階画像を使う
+ENEMY_PAGE_THRESHOLDS = [100, 200, 300, 400, 500]
+ENEMY_AVATARS = ["enemy_swarm.png", "enemy_slime.png", "enemy_mimic.png", "enemy_golem.png", "enemy_dragon.png", "enemy_demon.png"]
+
+
+def player_avatar_name(state: GameState, curve: Optional[LevelCurve] = None) -> str:
+    """プレイヤーのアバター画像のファイル名"""
+    basic_count = count_basic_books(state)
+    if basic_count < NOVICE_AVATAR_STAGES:
+        return f"novice_lv{min(basic_count + 1, NOVICE_AVATAR_STAGES)}.png"
+    job_class = state.user.get("job", "見習い (Novice)")
+    prefix = next((p for words, p in JOB_AVATAR_PREFIXES if any(w in job_class for w in words)), "novice")
+    tier = (curve or get_curve()).tier(state.user.get("level", 1))
+    return f"{prefix}_lv{tier}.png"
+
+
+def enemy_avatar_name(total_pages: int) -> str:
+    """本のページ数（敵の HP）に応じた敵画像のファイル名"""
+    return ENEMY_AVATARS[bisect_right(ENEMY_PAGE_THRESHOLDS, total_pages)]
+
+
+def record_reading(state: GameState, book: Book, pages: int, minutes: int = 0, rating: int = 0,
+                   memo: str = "", read_date: Optional[str] = None, log_id: Optional[str] = None) -> Dict:
+    """読書記録（攻撃）1回分をゲーム状態に反映し、結果をまとめて返す"""
+    user = state.user
+    read_date = read_date or get_today_str()
+    old_level = user.get("level", 1)
+
+    new_combo = calculate_combo(user, read_date)
+    user["combo"] = new_combo
+    user["last_read_date"] = read_date
+    combo_mult = get_combo_multiplier(new_combo)
+
+    damage = pages
+    exp_gained = int(pages * combo_mult)
+
+    calculate_level_up(user, exp_gained)
+    book.current_hp = max(0, book.current_hp - damage)
+    if minutes > 0:
+        user["total_hours"] = user.get("total_hours", 0.0) + (minutes / 60.0)
+    if rating > 0: book.rating = rating
+
+    log = Log(
+        id=log_id or str(uuid.uuid4()), date=read_date, book_id=book.id,
+        pages=pages, minutes=minutes, exp_gained=exp_gained,
+        rating=rating, memo=memo
+    )
+    state.add_log(log)
+
+    completed = book.current_hp <= 0
+    acquired_weapon = None
+    if completed:
+        state.update_book(book, status="completed", read_count=book.read_count + 1)
+        user["total_investment"] = user.get("total_investment", 0) + book.price
+        update_job_class(state)
+        acquired_weapon = acquire_weapon(user, book.genre)
+
+    new_level = user.get("level", 1)
+    return {
+        "log": log, "exp_gained": exp_gained, "completed": completed,
+        "old_level": old_level, "new_level": new_level, "leveled_up": new_level > old_level,
+        "acquired_weapon": acquired_weapon,
+    }
@@ -0,0 +1,180 @@
+import copy
+import csv
+import json
+import os
+from datetime import datetime
+from typing import BinaryIO, Callable, Dict, Iterator, Optional, Tuple
+
+from game import GENRE_SET, record_reading
+from model import Book, GameState
+
+# --- 書籍・読書ログの一括インポート ---
+# CSV / JSONL を1行ずつ読み、検証しながらゲーム状態に適用する。
+# ファイル全体をメモリに載せないため、10万行規模でも使用メモリは状態の増加分だけで済む。
+# 保存は呼び出し側で最後に1回だけ行う。
+#
+# 書籍: title, genre, pages, price, status
+# ログ: date (YYYY-MM-DD), book_id または title, pages, minutes, rating, memo, id
+#       日付順に並んでいる前提で、コンボ・EXP・レベル・武器を画面からの記録と同じ規則で再現する。
+
+BOOK_STATUSES = ("unread", "active", "completed", "reread")
+MAX_REPORTED_ERRORS = 100
+PROGRESS_EVERY = 1000
+
+
+def detect_format(filename: str) -> str:
+    ext = os.path.splitext(filename)[1].lower()
+    if ext in (".jsonl", ".ndjson"):
+        return "jsonl"
+    if ext == ".csv":
+        return "csv"
+    raise ValueError(f"対応していないファイル形式です: {filename}")
+
+
+def _parse_json_line(line: str) -> Optional[Dict]:
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None
+    return record if isinstance(record, dict) else None
+
+
+def iter_records(stream: BinaryIO, fmt: str, progress: Optional[Callable[[float], None]] = None,
+                 total_bytes: Optional[int] = None) -> Iterator[Tuple[int, Dict]]:
+    """(行番号, レコード) をストリームから1件ずつ返す。読めない行のレコードは None"""
+    consumed = [0]
+
+    def lines():
+        for raw in stream:
+            consumed[0] += len(raw)
+            yield raw.decode("utf-8-sig")
+
+    if fmt == "csv":
+        reader = csv.DictReader(lines())
+        records = ((reader.line_num, row) for row in reader)
+    else:
+        records = ((n, _parse_json_line(line)) for n, line in enumerate(lines(), start=1) if line.strip())
+
+    for count, (line_no, record) in enumerate(records, start=1):
+        if progress and total_bytes and count % PROGRESS_EVERY == 0:
+            progress(min(consumed[0] / total_bytes, 1.0))
+        yield line_no, record
+    if progress:
+        progress(1.0)
+
+
+def _int(record: Dict, key: str, default: Optional[int] = None, minimum: int = 0) -> int:
+    value = record.get(key)
+    if value in (None, ""):
+        if default is None:
+            raise ValueError(f"{key} がありません")
+        return default
+    number = int(value)
+    if number < minimum:
+        raise ValueError(f"{key} は {minimum} 以上にしてください")
+    return number
+
+
+def new_report(kind: str, dry_run: bool) -> Dict:
+    return {"kind": kind, "dry_run": dry_run, "rows": 0, "imported": 0, "skipped": 0,
+            "completed": 0, "exp_gained": 0, "errors": [], "error_count": 0}
+
+
+def _add_error(report: Dict, line_no: int, message: str):
+    report["error_count"] += 1
+    if len(report["errors"]) < MAX_REPORTED_ERRORS:
+        report["errors"].append((line_no, message))
+
+
+def import_books(state: GameState, records: Iterator[Tuple[int, Dict]], report: Dict):
+    """書籍を検証して追加する。ID は現在の最大値から連番で払い出す"""
+    next_id = state.next_book_id()
+    for line_no, record in records:
+        report["rows"] += 1
+        try:
+            if record is None:
+                raise ValueError("行を読み取れません")
+            title = (record.get("title") or "").strip()
+            if not title:
+                raise ValueError("title がありません")
+            genre = record.get("genre")
+            if genre not in GENRE_SET:
+                raise ValueError(f"不明なジャンルです: {genre}")
+            pages = _int(record, "pages", minimum=1)
+            status = record.get("status") or "unread"
+            if status not in BOOK_STATUSES:
+                raise ValueError(f"不明なステータスです: {status}")
+            book = Book(id=next_id, title=title, genre=genre, max_hp=pages,
+                        price=_int(record, "price", default=0), status=status)
+        except (ValueError, TypeError) as e:
+            _add_error(report, line_no, str(e))
+            continue
+        state.add_book(book)
+        next_id += 1
+        report["imported"] += 1
+
+
+def import_logs(state: GameState, records: Iterator[Tuple[int, Dict]], report: Dict):
+    """読書ログを日付順に再生し、EXP・コンボ・レベル・読了の効果を反映する"""
+    title_to_id = {b.title: b.id for b in state.books.values()}
+    seen_ids = {log.id for log in state.logs}
+    for line_no, record in records:
+        report["rows"] += 1
+        try:
+            if record is None:
+                raise ValueError("行を読み取れません")
+            read_date = record.get("date") or ""
+            datetime.strptime(read_date, "%Y-%m-%d")
+            if record.get("book_id") not in (None, ""):
+                book = state.book(int(record["book_id"]))
+            else:
+                book = state.book(title_to_id.get(record.get("title")))
+            if book is None:
+                raise ValueError("対応する書籍がありません（先に書籍をインポートしてください）")
+            pages = _int(record, "pages", minimum=1)
+            minutes = _int(record, "minutes", default=0)
+            rating = _int(record, "rating", default=0)
+            if rating > 5:
+                raise ValueError("rating は 0〜5 にしてください")
+        except (ValueError, TypeError) as e:
+            _add_error(report, line_no, str(e))
+            continue
+
+        log_id = record.get("id") or None
+        if log_id in seen_ids:
+            report["skipped"] += 1 # 同じファイルの再インポート
+            continue
+
+        if book.current_hp <= 0:
+            # 読了済みの本への記録は再読として扱う
+            state.update_book(book, status="reread", current_hp=book.max_hp)
+        elif book.status == "unread":
+            state.update_book(book, status="active")
+        # 最後の記録日より前の記録では、連続記録（コンボと最終記録日）を過去に戻さない
+        last_read_date = state.user.get("last_read_date")
+        streak = (state.user.get("combo", 0), last_read_date) if last_read_date and read_date < last_read_date else None
+        result = record_reading(
+            state, book, min(pages, book.current_hp), minutes=minutes, rating=rating,
+            memo=record.get("memo") or "", read_date=read_date, log_id=log_id
+        )
+        if streak is not None:
+            state.user["combo"], state.user["last_read_date"] = streak
+        seen_ids.add(result["log"].id)
+        report["imported"] += 1
+        report["exp_gained"] += result["exp_gained"]
+        report["completed"] += int(result["completed"])
+
+
+def run_import(state: GameState, stream: BinaryIO, filename: str, kind: str, dry_run: bool = False,
+               progress: Optional[Callable[[float], None]] = None, total_bytes: Optional[int] = None) -> Tuple[GameState, Dict]:
+    """ファイルを取り込んだ状態とレポートを返す。dry_run の場合は複製に適用して元の状態は変更しない"""
+    target = GameState(copy.deepcopy(state.to_dict())) if dry_run else state
+    report = new_report(kind, dry_run)
+    records = iter_records(stream, detect_format(filename), progress=progress, total_bytes=total_bytes)
+    if kind == "books":
+        import_books(target, records, report)
+    elif kind == "logs":
+        import_logs(target, records, report)
+    else:
+        raise ValueError(f"不明なインポート種別です: {kind}")
+    return target, report
@@ -0,0 +1,305 @@
+import json
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from merge import COUNTER_BOOK_FIELDS, make_base, merge_book_counters, merge_user
+from stats import STATS_KEY, rebuild_stats
+from storage import UNCHECKED, ConflictError, SQLiteBackend, StorageBackend
+
+# --- オフライン優先のジャーナル ---
+# 画面はローカルの SQLite（レプリカ）だけを読み書きし、保存のたびに変更内容を操作（ops）として
+# 同じトランザクションでジャーナルに追記する。同期スレッドがリモート（Google Sheets）の
+# 最新ドキュメントに操作を適用して書き込むため、通信できない間も記録でき、復旧後に上書きで
+# データを失うこともない。リモートには端末ごとの適用済み番号を残し、同じ操作を二度適用しない。
+#
+# 操作: add_book / update_book / remove_book / add_log / remove_log / update_user
+
+JOURNAL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS journal (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    op TEXT NOT NULL,
+    payload TEXT NOT NULL
+);
+"""
+SYNCED_KEY = "synced_seq" # リモートのドキュメントに残す {端末ID: 適用済みの最後の seq}
+SYNC_INTERVAL = 30.0
+
+
+def diff_documents(base: Dict, data: Dict) -> List[Tuple[str, Dict]]:
+    """make_base() の基準から data への変更を操作の列にする"""
+    ops: List[Tuple[str, Dict]] = []
+    base_books = base.get("books", {})
+    books = {b.get("id"): b for b in data.get("books", [])}
+    for book_id, book in books.items():
+        old = base_books.get(book_id)
+        if old is None:
+            ops.append(("add_book", book))
+            continue
+        changes = {k: v for k, v in book.items() if old.get(k) != v}
+        if changes:
+            payload = {"id": book_id, "changes": changes}
+            counters = {k: old.get(k) for k in COUNTER_BOOK_FIELDS if k in changes}
+            if counters:
+                payload["base"] = counters # HP・読了回数は適用時にリモートの値へ増減として足す
+            ops.append(("update_book", payload))
+    ops.extend(("remove_book", {"id": book_id}) for book_id in base_books if book_id not in books)
+
+    base_log_ids = base.get("log_ids", set())
+    log_ids = set()
+    for log in data.get("logs", []):
+        log_ids.add(log.get("id"))
+        if log.get("id") not in base_log_ids:
+            ops.append(("add_log", log))
+    ops.extend(("remove_log", {"id": log_id}) for log_id in base_log_ids - log_ids)
+
+    user_op = _diff_user(base.get("user", {}), data.get("user", {}))
+    if user_op:
+        ops.append(("update_user", user_op))
+    return ops
+
+
+def _diff_user(base: Dict, user: Dict) -> Optional[Dict]:
+    """merge_user にそのまま渡せる (base, mine) の組。変更の無いキーは含めない"""
+    changed = [k for k, v in user.items() if k != STATS_KEY and base.get(k) != v]
+    if not changed:
+        return None
+    keys = set(changed) | {"level", "exp"} # EXP は level と exp の組で増分を求める
+    old = {k: base[k] for k in keys if k in base and k != "weapons"}
+    new = {k: user[k] for k in keys if k in user and k != "weapons"}
+    if "weapons" in changed:
+        # 武器は追加のみなので、増えた分だけを持つ（merge_user は mine[len(base):] を追加する）
+        old["weapons"], new["weapons"] = [], user.get("weapons", [])[len(base.get("weapons", [])):]
+    if "last_read_date" in user:
+        new.setdefault("last_read_date", user["last_read_date"])
+        new.setdefault("combo", user.get("combo", 0))
+    return {"base": old, "mine": new}
+
+
+def apply_ops(data: Dict, ops: List[Tuple[str, Dict]], remap: Optional[Dict[int, int]] = None) -> Tuple[Dict, Dict[int, int]]:
+    """ドキュメントに操作を順に適用した新しいドキュメントと、採番し直した本の ID 対応を返す"""
+    remap = dict(remap or {})
+    books = {b.get("id"): b for b in data.get("books", [])}
+    logs = list(data.get("logs", []))
+    log_ids = {l.get("id") for l in logs}
+    removed_logs = set()
+    user = dict(data.get("user", {}))
+
+    for op, payload in ops:
+        if op == "add_book":
+            book_id = remap.get(payload.get("id"), payload.get("id"))
+            existing = books.get(book_id)
+            if existing is not None and existing != dict(payload, id=book_id):
+                # 別の端末が同じ ID で別の本を追加していた
+                new_id = max(list(books) + [0]) + 1
+                remap[payload.get("id")] = new_id
+                book_id = new_id
+            books[book_id] = dict(payload, id=book_id)
+        elif op == "update_book":
+            book_id = remap.get(payload["id"], payload["id"])
+            if book_id in books:
+                book = dict(books[book_id], **payload["changes"])
+                if "base" in payload: # base の無い古い操作は値をそのまま上書きする
+                    book = merge_book_counters(book, payload["base"], payload["changes"], books[book_id])
+                books[book_id] = book
+        elif op == "remove_book":
+            books.pop(remap.get(payload["id"], payload["id"]), None)
+        elif op == "add_log":
+            if payload.get("id") not in log_ids:
+                log_ids.add(payload.get("id"))
+                book_id = payload.get("book_id")
+                logs.append(dict(payload, book_id=remap[book_id]) if book_id in remap else payload)
+        elif op == "remove_log":
+            removed_logs.add(payload["id"])
+        elif op == "update_user":
+            user = merge_user(payload["base"], payload["mine"], user)
+        else:
+            raise ValueError(f"不明な操作です: {op}")
+
+    result = dict(data)
+    result["user"] = user
+    result["books"] = list(books.values())
+    result["logs"] = [l for l in logs if l.get("id") not in removed_logs] if removed_logs else logs
+    if STATS_KEY in user:
+        user[STATS_KEY] = rebuild_stats(result)
+    return result, remap
+
+
+def _remap_payload(op: str, payload: Dict, remap: Dict[int, int]) -> Dict:
+    key = "book_id" if op == "add_log" else "id"
+    if payload.get(key) in remap:
+        return dict(payload, **{key: remap[payload[key]]})
+    return payload
+
+
+class LocalReplica(SQLiteBackend):
+    """ジャーナル付きのローカルレプリカ。ドキュメントの保存と操作の追記を1トランザクションで行う"""
+
+    name = "local"
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        with self._lock, self._conn:
+            self._conn.executescript(JOURNAL_SCHEMA)
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'device_id'").fetchone()
+            if row is None:
+                self._conn.execute("INSERT INTO meta (key, value) VALUES ('device_id', ?)", (uuid.uuid4().hex,))
+        self._ops: List[Tuple[str, Dict]] = []
+        self._acked_seq: Optional[int] = None
+        self._remap: Dict[int, int] = {}
+
+    @property
+    def device_id(self) -> str:
+        with self._lock:
+            return self._conn.execute("SELECT value FROM meta WHERE key = 'device_id'").fetchone()["value"]
+
+    def save_with_ops(self, data: Dict, ops: List[Tuple[str, Dict]], expected_revision=UNCHECKED,
+                      acked_seq: Optional[int] = None, remap: Optional[Dict[int, int]] = None) -> Optional[str]:
+        """ドキュメントを保存し、同じトランザクションで操作を追記・同期済みの操作を削除する"""
+        self._ops, self._acked_seq, self._remap = ops, acked_seq, remap or {}
+        try:
+            return self.save(data, expected_revision=expected_revision)
+        finally:
+            self._ops, self._acked_seq, self._remap = [], None, {}
+
+    def _after_write(self):
+        if self._remap:
+            # ログは追記のみで保存されるため、採番し直した本を指すログはここで書き換える
+            self._conn.executemany("UPDATE logs SET book_id = ? WHERE id = ?", [
+                (book_id, log_id) for log_id, book_id in self._remapped_logs().items()
+            ])
+            rows = self._conn.execute("SELECT seq, op, payload FROM journal").fetchall()
+            self._conn.executemany("UPDATE journal SET payload = ? WHERE seq = ?", [
+                (json.dumps(_remap_payload(r["op"], json.loads(r["payload"]), self._remap), ensure_ascii=False), r["seq"])
+                for r in rows
+            ])
+        if self._acked_seq is not None:
+            self._conn.execute("DELETE FROM journal WHERE seq <= ?", (self._acked_seq,))
+        now = time.time()
+        self._conn.executemany(
+            "INSERT INTO journal (created_at, op, payload) VALUES (?, ?, ?)",
+            [(now, op, json.dumps(payload, ensure_ascii=False)) for op, payload in self._ops],
+        )
+
+    def _remapped_logs(self) -> Dict[str, int]:
+        """この端末で記録したログのうち、本の ID が採番し直されたもの {ログID: 新しい本のID}"""
+        rows = self._conn.execute("SELECT payload FROM journal WHERE op = 'add_log'").fetchall()
+        result = {}
+        for row in rows:
+            log = json.loads(row["payload"])
+            if log.get("book_id") in self._remap:
+                result[log.get("id")] = self._remap[log["book_id"]]
+        return result
+
+    def pending_ops(self, after: int = 0) -> List[Tuple[int, str, Dict]]:
+        with self._lock:
+            rows = self._conn.execute("SELECT seq, op, payload FROM journal WHERE seq > ? ORDER BY seq", (after,)).fetchall()
+        return [(r["seq"], r["op"], json.loads(r["payload"])) for r in rows]
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM journal").fetchone()[0]
+
+
+class JournaledBackend(StorageBackend):
+    """ローカルレプリカで読み書きし、ジャーナルをバックグラウンドでリモートに同期するバックエンド"""
+
+    name = "journal"
+
+    def __init__(self, local: LocalReplica, remote: StorageBackend, sync_interval: float = SYNC_INTERVAL):
+        super().__init__()
+        self.local = local
+        self.remote = remote
+        self.sync_interval = sync_interval
+        self._base: Optional[Dict] = None # ローカルの現在のリビジョンの内容（操作の差分の基準）
+        self._remote_revision: Optional[str] = None # 最後に取り込んだリモートのリビジョン
+        self._lock = threading.Lock() # ローカルへの書き込みを直列化する
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.last_synced: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def load(self) -> Tuple[Optional[Dict], Optional[str]]:
+        with self._lock:
+            data, revision = self.local.load()
+            self._base = make_base(data)
+        if data is None and self.last_synced is None:
+            self._wake.set() # 初回起動時はリモートからの取り込みを急ぐ
+        return data, revision
+
+    def revision(self) -> Optional[str]:
+        return self.local.revision()
+
+    def save(self, data: Dict, expected_revision=UNCHECKED) -> Optional[str]:
+        with self._lock:
+            if self._base is None:
+                self._base = make_base(self.local.load()[0])
+            ops = diff_documents(self._base, data)
+            revision = self.local.save_with_ops(data, ops, expected_revision=expected_revision)
+            self._base = make_base(data)
+        self._wake.set()
+        return revision
+
+    # --- 同期 ---
+    def sync(self) -> int:
+        """未同期の操作をリモートに適用し、リモートの最新内容をローカルに取り込む。適用した件数を返す"""
+        entries = self.local.pending_ops()
+        device_id = self.local.device_id
+        if not entries and self._remote_revision is not None and self.remote.revision() == self._remote_revision:
+            self.last_synced = time.time()
+            self.last_error = None
+            return 0 # 送る操作も、取り込む変更も無い
+        theirs, remote_revision = self.remote.load()
+        acked = entries[-1][0] if entries else None
+        remap: Dict[int, int] = {}
+
+        if theirs is None:
+            # リモートが空ならローカルの内容をそのまま書き込む
+            merged = self.local.load()[0]
+        else:
+            done = (theirs.get(SYNCED_KEY) or {}).get(device_id, 0)
+            ops = [(op, payload) for seq, op, payload in entries if seq > done] # 前回の同期が途中で止まった分は除く
+            merged, remap = apply_ops(theirs, ops) if ops else (theirs, {})
+        if merged is not None and entries:
+            merged = dict(merged)
+            merged[SYNCED_KEY] = dict(merged.get(SYNCED_KEY) or {}, **{device_id: acked})
+            remote_revision = self.remote.save(merged, expected_revision=remote_revision)
+
+        with self._lock:
+            # 同期中にローカルで保存された操作は、リモートの内容の上に載せ直す
+            newer = self.local.pending_ops(after=acked or 0)
+            if newer:
+                newer_ops = [(op, _remap_payload(op, payload, remap)) for _, op, payload in newer]
+                merged = apply_ops(merged, newer_ops)[0] if merged is not None else self.local.load()[0]
+            if merged is not None:
+                self.local.save_with_ops(merged, [], acked_seq=acked, remap=remap)
+                self._base = make_base(merged)
+            self._remote_revision = remote_revision
+        self.last_synced = time.time()
+        self.last_error = None
+        return len(entries)
+
+    def start_sync(self):
+        """同期スレッドを開始する。保存のたび、または sync_interval 秒ごとに同期する"""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="readingrpg-journal-sync", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        failures = 0
+        while True:
+            self._wake.wait(self.sync_interval if not failures else min(self.sync_interval, 2 ** failures))
+            self._wake.clear()
+            try:
+                self.sync()
+                failures = 0
+            except ConflictError:
+                self._wake.set() # リモートが先に更新された。読み直してすぐやり直す
+            except Exception as e:
+                failures += 1
+                self.last_error = str(e) or type(e).__name__
+
+    def status(self) -> Dict:
+        return {"pending": self.local.pending_count(), "last_synced": self.last_synced, "error": self.last_error}
@@ -0,0 +1,321 @@
+import bisect
+import sqlite3
+import threading
+from datetime import date, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from game import parse_date
+from model import GameState
+from replay import books_fingerprint
+from storage import content_revision
+
+# --- ランキング・ギルド集計 ---
+# 複数プレイヤーモードで、EXP・ページ数・連続読書日数・ジャンル別ページ数のランキングを日・週・全期間で出す。
+# プレイヤーごとの値は (指標, 期間の種類, 期間) のバケットに持ち、読書記録のたびに差分で更新する。
+# 順位は (−値, プレイヤー) の昇順に並べた配列を二分探索して求めるため、全員のドキュメントを読まない。
+# ログの編集・削除など差分で追えない変更は、そのプレイヤーの分だけログから作り直す。
+
+WINDOWS = ("day", "week", "all")
+METRICS = ("exp", "pages", "streak")
+GENRE_PREFIX = "genre:" # ジャンル別ページ数の指標名は genre:<ジャンル>
+KEEP_DAYS = 8 # 日別バケットを残す日数（昨日との比較用に今日より前も残す）
+KEEP_WEEKS = 5
+
+LEADERBOARD_SCHEMA = """
+CREATE TABLE IF NOT EXISTS scores (
+    player TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    span TEXT NOT NULL,
+    period TEXT NOT NULL,
+    value INTEGER NOT NULL,
+    PRIMARY KEY (player, metric, span, period)
+);
+CREATE TABLE IF NOT EXISTS players (
+    player TEXT PRIMARY KEY,
+    guild TEXT,
+    fingerprint TEXT,
+    last_day TEXT,
+    run INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+Key = Tuple[str, str, str] # (指標, 期間の種類, 期間)
+
+
+def period_of(window: str, day: date) -> str:
+    """日付が属する期間（日は YYYY-MM-DD、週は月曜日の日付、全期間は all）"""
+    if window == "day":
+        return day.isoformat()
+    if window == "week":
+        return (day - timedelta(days=day.weekday())).isoformat()
+    return "all"
+
+
+def genre_metric(genre: str) -> str:
+    return f"{GENRE_PREFIX}{genre or '不明'}"
+
+
+def state_fingerprint(state: GameState) -> str:
+    """ランキングに関わる内容（ログの件数・末尾・合計と本のジャンル）の指紋"""
+    stats = state.stats
+    last_id = state.logs[-1].id if state.logs else ""
+    return content_revision(f"{len(state.logs)}:{last_id}:{stats['total_pages']}:{stats['total_minutes']};",
+                            books_fingerprint(state))
+
+
+class RankIndex:
+    """値の降順に並んだ (−値, メンバー) の配列。更新・順位・上位 N 件を二分探索で扱う"""
+
+    __slots__ = ("scores", "keys")
+
+    def __init__(self):
+        self.scores: Dict[str, int] = {}
+        self.keys: List[Tuple[int, str]] = []
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def update(self, member: str, score: int):
+        old = self.scores.get(member)
+        if old == score:
+            return
+        if old is not None:
+            del self.keys[bisect.bisect_left(self.keys, (-old, member))]
+        if score:
+            self.scores[member] = score
+            bisect.insort(self.keys, (-score, member))
+        else:
+            self.scores.pop(member, None)
+
+    def rank(self, member: str) -> Optional[int]:
+        """同点は同順位（自分より値の大きいメンバー数 + 1）。値が無ければ None"""
+        score = self.scores.get(member)
+        if score is None:
+            return None
+        return bisect.bisect_left(self.keys, (-score,)) + 1
+
+    def top(self, n: int) -> List[Tuple[str, int]]:
+        return [(member, -neg) for neg, member in self.keys[:n]]
+
+
+class Leaderboard:
+    """全プレイヤーの集計バケットと順位の索引。path を指定すると SQLite に書き込み、起動時に読み戻す"""
+
+    def __init__(self, path: Optional[str] = None, today: Callable[[], date] = date.today):
+        self.today = today
+        self._lock = threading.Lock()
+        self._values: Dict[str, Dict[Key, int]] = {} # プレイヤー → バケット → 値
+        self._indexes: Dict[Key, RankIndex] = {}
+        self._guild_totals: Dict[Key, Dict[str, int]] = {}
+        self._guild_indexes: Dict[Key, RankIndex] = {}
+        self._players: Dict[str, Dict] = {} # プレイヤー → {guild, fingerprint, last_day, run}
+        self._pruned_on: Optional[date] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._writes: Dict[Tuple[str, Key], int] = {}
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            with self._conn:
+                self._conn.executescript(LEADERBOARD_SCHEMA)
+            self._restore()
+
+    # --- 永続化 ---
+    def _restore(self):
+        for player, guild, fingerprint, last_day, run in self._conn.execute("SELECT * FROM players"):
+            self._players[player] = {"guild": guild, "fingerprint": fingerprint, "last_day": last_day, "run": run}
+        for player, metric, span, period, value in self._conn.execute("SELECT * FROM scores"):
+            self._set(player, (metric, span, period), value)
+        self._writes.clear()
+
+    def _flush(self, *players: str):
+        """変更したバケットとプレイヤー情報を1トランザクションで書き込む"""
+        writes, self._writes = self._writes, {}
+        if self._conn is None:
+            return
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO scores (player, metric, span, period, value) VALUES (?, ?, ?, ?, ?)",
+                [(player,) + key + (value,) for (player, key), value in writes.items() if value])
+            self._conn.executemany(
+                "DELETE FROM scores WHERE player = ? AND metric = ? AND span = ? AND period = ?",
+                [(player,) + key for (player, key), value in writes.items() if not value])
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO players (player, guild, fingerprint, last_day, run) VALUES (?, ?, ?, ?, ?)",
+                [(p, info["guild"], info["fingerprint"], info["last_day"], info["run"])
+                 for p in players for info in [self._players[p]]])
+
+    # --- バケットの更新 ---
+    def _player(self, player: str) -> Dict:
+        if player not in self._players:
+            self._players[player] = {"guild": None, "fingerprint": None, "last_day": None, "run": 0}
+        return self._players[player]
+
+    def _set(self, player: str, key: Key, value: int):
+        values = self._values.setdefault(player, {})
+        old = values.get(key, 0)
+        if value == old:
+            return
+        if value:
+            values[key] = value
+        else:
+            values.pop(key, None)
+        self._indexes.setdefault(key, RankIndex()).update(player, value)
+        self._writes[(player, key)] = value
+        guild = self._player(player)["guild"]
+        if guild:
+            self._add_guild(guild, key, value - old)
+
+    def _add_guild(self, guild: str, key: Key, delta: int):
+        totals = self._guild_totals.setdefault(key, {})
+        totals[guild] = totals.get(guild, 0) + delta
+        self._guild_indexes.setdefault(key, RankIndex()).update(guild, totals[guild])
+
+    def _retained(self, window: str, period: str, today: date) -> bool:
+        if window == "day":
+            return period >= (today - timedelta(days=KEEP_DAYS - 1)).isoformat()
+        if window == "week":
+            return period >= period_of("week", today - timedelta(weeks=KEEP_WEEKS - 1))
+        return True
+
+    def _buckets(self, day: date, today: date):
+        """その日の値が入るバケット（保持期間を過ぎた日別・週別は除く）"""
+        for window in WINDOWS:
+            period = period_of(window, day)
+            if self._retained(window, period, today):
+                yield window, period
+
+    # --- 呼び出し側（app.py） ---
+    def record(self, player: str, state: GameState, read_date: str, pages: int, exp: int, genre: str):
+        """読書記録1件を差分で反映する。過去の日付の記録など差分で追えない場合は作り直す"""
+        day = parse_date(read_date).date()
+        with self._lock:
+            info = self._player(player)
+            last_day = date.fromisoformat(info["last_day"]) if info["last_day"] else None
+            if info["fingerprint"] is None or (last_day is not None and day < last_day):
+                self._rebuild(player, state)
+            else:
+                today = self.today()
+                values = self._values.get(player, {})
+                if last_day is None or day - last_day > timedelta(days=1):
+                    info["run"] = 1
+                elif day - last_day == timedelta(days=1):
+                    info["run"] += 1
+                info["last_day"] = day.isoformat()
+                for window, period in self._buckets(day, today):
+                    for metric, amount in (("pages", pages), ("exp", exp), (genre_metric(genre), pages)):
+                        key = (metric, window, period)
+                        self._set(player, key, values.get(key, 0) + amount)
+                    key = ("streak", window, period)
+                    self._set(player, key, max(values.get(key, 0), info["run"]))
+                info["fingerprint"] = state_fingerprint(state)
+            self._flush(player)
+
+    def sync(self, player: str, state: GameState) -> bool:
+        """ドキュメントの内容が前回反映したものと違えば、そのプレイヤーの値を作り直す。作り直したら True"""
+        fingerprint = state_fingerprint(state)
+        with self._lock:
+            if self._player(player)["fingerprint"] == fingerprint:
+                return False
+            self._rebuild(player, state)
+            self._flush(player)
+            return True
+
+    def _rebuild(self, player: str, state: GameState):
+        today = self.today()
+        logs = []
+        for log, book in state.iter_logs_with_books():
+            try:
+                day = parse_date(log.date).date()
+            except (TypeError, ValueError):
+                continue
+            logs.append((day, log.pages or 0, log.exp_gained or 0, book.genre if book else ""))
+        values: Dict[Key, int] = {}
+        for day, pages, exp, genre in logs:
+            for window, period in self._buckets(day, today):
+                for metric, amount in (("pages", pages), ("exp", exp), (genre_metric(genre), pages)):
+                    if amount:
+                        values[(metric, window, period)] = values.get((metric, window, period), 0) + amount
+
+        # 連続読書日数: 各日の連続日数を、その日・週・全期間の最大値として入れる
+        info = self._player(player)
+        run, last_day = 0, None
+        for day in sorted({entry[0] for entry in logs}):
+            run = run + 1 if last_day is not None and day - last_day == timedelta(days=1) else 1
+            last_day = day
+            for window, period in self._buckets(day, today):
+                key = ("streak", window, period)
+                values[key] = max(values.get(key, 0), run)
+        info["run"], info["last_day"] = run, last_day.isoformat() if last_day else None
+        info["fingerprint"] = state_fingerprint(state)
+
+        for key in set(self._values.get(player, {})) - set(values):
+            self._set(player, key, 0)
+        for key, value in values.items():
+            self._set(player, key, value)
+
+    def set_guild(self, player: str, guild: Optional[str]):
+        """所属ギルドを変え、そのプレイヤーの値をギルドの合計から付け替える"""
+        guild = (guild or "").strip() or None
+        with self._lock:
+            info = self._player(player)
+            if info["guild"] == guild:
+                return
+            values = self._values.get(player, {})
+            for key, value in values.items():
+                if info["guild"]:
+                    self._add_guild(info["guild"], key, -value)
+                if guild:
+                    self._add_guild(guild, key, value)
+            info["guild"] = guild
+            self._flush(player)
+
+    def guild_of(self, player: str) -> Optional[str]:
+        with self._lock:
+            info = self._players.get(player)
+            return info["guild"] if info else None
+
+    # --- 参照 ---
+    def _prune(self):
+        """日付が変わったら保持期間を過ぎたバケットを捨てる"""
+        today = self.today()
+        if self._pruned_on == today:
+            return
+        self._pruned_on = today
+        expired = [key for key in self._indexes if not self._retained(key[1], key[2], today)]
+        if not expired:
+            return
+        for key in expired:
+            for player in list(self._indexes[key].scores):
+                self._set(player, key, 0)
+            del self._indexes[key]
+            self._guild_totals.pop(key, None)
+            self._guild_indexes.pop(key, None)
+        self._flush()
+
+    def _index(self, metric: str, window: str, on: Optional[date], guilds: bool) -> RankIndex:
+        self._prune()
+        key = (metric, window, period_of(window, on or self.today()))
+        return (self._guild_indexes if guilds else self._indexes).get(key) or RankIndex()
+
+    def top(self, metric: str, window: str, n: int = 10, on: Optional[date] = None,
+            guilds: bool = False) -> List[Tuple[str, int]]:
+        """上位 n 件の (プレイヤーまたはギルド, 値)"""
+        with self._lock:
+            return self._index(metric, window, on, guilds).top(n)
+
+    def rank(self, member: str, metric: str, window: str, on: Optional[date] = None,
+             guilds: bool = False) -> Tuple[Optional[int], int, int]:
+        """(順位, 値, 参加人数)。その期間に記録が無ければ順位は None"""
+        with self._lock:
+            index = self._index(metric, window, on, guilds)
+            return index.rank(member), index.scores.get(member, 0), len(index)
+
+    def genres(self) -> List[str]:
+        """全期間の値があるジャンル"""
+        with self._lock:
+            return sorted(key[0][len(GENRE_PREFIX):] for key in self._indexes
+                          if key[0].startswith(GENRE_PREFIX) and key[1] == "all" and self._indexes[key])
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"players": len(self._players), "buckets": len(self._indexes),
+                    "entries": sum(len(index) for index in self._indexes.values())}
@@ -0,0 +1,163 @@
+from bisect import bisect_right
+from math import isqrt
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# --- 経験値曲線 ---
+# レベル n から n+1 に必要な EXP（required）と、レベル1からの累積 EXP（total_for）を扱う。
+# 総EXP からレベルと端数を求めるときは、一定・一次の曲線は閉じた式で、
+# それ以外は累積しきい値の表を二分探索して O(log L) で求める（1レベルずつのループはしない）。
+
+# アバターの見た目が変わるレベル（lv1 → lv2 → lv3）
+AVATAR_TIER_LEVELS = (54, 126)
+
+
+class LevelCurve:
+    """累積しきい値の表を二分探索する曲線の基底クラス"""
+
+    def __init__(self, tiers: Sequence[int] = AVATAR_TIER_LEVELS):
+        self.tiers = tuple(tiers)
+        self._thresholds = [0] # _thresholds[i] = レベル i+1 に到達する累積 EXP
+
+    def required(self, level: int) -> int:
+        raise NotImplementedError
+
+    def _extend(self, level: int):
+        while len(self._thresholds) < level:
+            n = len(self._thresholds)
+            step = self.required(n)
+            if step < 1:
+                raise ValueError(f"レベル{n}の必要経験値が不正です: {step}")
+            self._thresholds.append(self._thresholds[-1] + step)
+
+    def total_for(self, level: int) -> int:
+        """レベル1からそのレベルに到達するまでの累積 EXP"""
+        self._extend(level)
+        return self._thresholds[level - 1]
+
+    def level_for(self, total_exp: int) -> Tuple[int, int]:
+        """累積 EXP から (レベル, そのレベル内の EXP) を求める"""
+        total_exp = max(0, total_exp)
+        # 表が足りなければ倍々に伸ばしてから二分探索する
+        while self._thresholds[-1] <= total_exp:
+            self._extend(len(self._thresholds) * 2)
+        level = bisect_right(self._thresholds, total_exp)
+        return level, total_exp - self._thresholds[level - 1]
+
+    def tier(self, level: int) -> int:
+        """アバターの段階（1 始まり）"""
+        return bisect_right(self.tiers, level) + 1
+
+
+class FlatCurve(LevelCurve):
+    """毎レベル同じ EXP"""
+
+    def __init__(self, step: int = 250, **kwargs):
+        super().__init__(**kwargs)
+        self.step = step
+
+    def required(self, level: int) -> int:
+        return self.step
+
+    def total_for(self, level: int) -> int:
+        return (level - 1) * self.step
+
+    def level_for(self, total_exp: int) -> Tuple[int, int]:
+        total_exp = max(0, total_exp)
+        return total_exp // self.step + 1, total_exp % self.step
+
+
+class LinearCurve(LevelCurve):
+    """レベルごとに increment ずつ増える"""
+
+    def __init__(self, base: int = 250, increment: int = 10, **kwargs):
+        super().__init__(**kwargs)
+        if base < 1 or increment < 0:
+            raise ValueError("base は1以上、increment は0以上にしてください")
+        self.base = base
+        self.increment = increment
+
+    def required(self, level: int) -> int:
+        return self.base + self.increment * (level - 1)
+
+    def total_for(self, level: int) -> int:
+        m = level - 1
+        return m * self.base + self.increment * m * (m - 1) // 2
+
+    def level_for(self, total_exp: int) -> Tuple[int, int]:
+        total_exp = max(0, total_exp)
+        if self.increment == 0:
+            return total_exp // self.base + 1, total_exp % self.base
+        # total_for(m + 1) <= total_exp を満たす最大の m を二次方程式の解から求め、丸め誤差を整数で補正する
+        b, d = 2 * self.base - self.increment, self.increment
+        m = (isqrt(b * b + 8 * d * total_exp) - b) // (2 * d)
+        while self.total_for(m + 2) <= total_exp:
+            m += 1
+        while m > 0 and self.total_for(m + 1) > total_exp:
+            m -= 1
+        return m + 1, total_exp - self.total_for(m + 1)
+
+
+class PolynomialCurve(LevelCurve):
+    """base + coefficient * (level - 1) ** exponent"""
+
+    def __init__(self, base: int = 250, coefficient: float = 1.0, exponent: float = 2.0, **kwargs):
+        super().__init__(**kwargs)
+        self.base = base
+        self.coefficient = coefficient
+        self.exponent = exponent
+
+    def required(self, level: int) -> int:
+        return int(self.base + self.coefficient * (level - 1) ** self.exponent)
+
+
+class TableCurve(LevelCurve):
+    """レベルごとの必要 EXP の表。表より先は最後の値を使い続ける"""
+
+    def __init__(self, steps: List[int], **kwargs):
+        super().__init__(**kwargs)
+        if not steps or min(steps) < 1:
+            raise ValueError("必要経験値の表は1以上の値を1つ以上並べてください")
+        self.steps = list(steps)
+        self._extend(len(self.steps) + 1)
+
+    def required(self, level: int) -> int:
+        return self.steps[min(level, len(self.steps)) - 1]
+
+    def level_for(self, total_exp: int) -> Tuple[int, int]:
+        total_exp = max(0, total_exp)
+        table_end = self._thresholds[len(self.steps)]
+        if total_exp < table_end:
+            level = bisect_right(self._thresholds, total_exp)
+            return level, total_exp - self._thresholds[level - 1]
+        # 表の先は一定なので閉じた式で求める
+        step = self.steps[-1]
+        over = total_exp - table_end
+        return len(self.steps) + 1 + over // step, over % step
+
+    def total_for(self, level: int) -> int:
+        if level <= len(self.steps) + 1:
+            return self._thresholds[level - 1]
+        return self._thresholds[len(self.steps)] + (level - 1 - len(self.steps)) * self.steps[-1]
+
+
+CURVE_TYPES = {"flat": FlatCurve, "linear": LinearCurve, "polynomial": PolynomialCurve, "table": TableCurve}
+
+_active_curve: LevelCurve = FlatCurve(250)
+
+
+def make_curve(spec: Optional[Dict]) -> LevelCurve:
+    """{"type": "linear", "base": 250, "increment": 10} のような設定から曲線を作る。省略時は毎レベル250"""
+    spec = dict(spec or {})
+    kind = spec.pop("type", "flat")
+    if kind not in CURVE_TYPES:
+        raise ValueError(f"不明な経験値曲線です: {kind}")
+    return CURVE_TYPES[kind](**spec)
+
+
+def get_curve() -> LevelCurve:
+    return _active_curve
+
+
+def set_curve(curve: LevelCurve):
+    global _active_curve
+    _active_curve = curve
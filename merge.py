@@ -0,0 +1,161 @@
+import copy
+import random
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from levels import get_curve
+from stats import STATS_KEY, rebuild_stats
+from storage import ConflictError, StorageBackend
+
+# --- 楽観的並行制御 ---
+# 保存時にリビジョンを比較し、他のセッションが先に保存していた場合は
+# 読み込み時点（base）からの差分同士をマージしてから再試行する。
+
+ADDITIVE_USER_FIELDS = ("total_hours", "total_investment")
+COUNTER_BOOK_FIELDS = ("current_hp", "read_count") # 双方の増減を足し合わせる書籍のフィールド
+
+
+def make_base(data: Optional[Dict]) -> Dict:
+    """マージの基準となる読み込み時点のスナップショットを作る"""
+    data = data or {}
+    return {
+        "user": copy.deepcopy(data.get("user", {})),
+        "books": {b.get("id"): copy.deepcopy(b) for b in data.get("books", [])},
+        "log_ids": {l.get("id") for l in data.get("logs", [])},
+    }
+
+
+def _total_exp(user: Dict) -> int:
+    return get_curve().total_for(user.get("level", 1)) + user.get("exp", 0)
+
+
+def merge_user(base: Dict, mine: Dict, theirs: Dict) -> Dict:
+    """base からの自分の変更を theirs の user に適用する（加算系・EXP・武器は増分を足す）"""
+    merged = dict(theirs)
+    for key, value in mine.items():
+        if key not in base or base[key] != value:
+            merged[key] = value
+
+    # 加算系の値は双方の増分を足し合わせる
+    for key in ADDITIVE_USER_FIELDS:
+        if key in mine or key in theirs:
+            merged[key] = theirs.get(key, 0) + (mine.get(key, 0) - base.get(key, 0))
+    total = _total_exp(theirs) + (_total_exp(mine) - _total_exp(base))
+    merged["level"], merged["exp"] = get_curve().level_for(total)
+    merged["next_level_exp"] = get_curve().required(merged["level"])
+
+    base_weapons = base.get("weapons", [])
+    mine_weapons = mine.get("weapons", [])
+    merged["weapons"] = list(theirs.get("weapons", [])) + list(mine_weapons[len(base_weapons):])
+
+    # コンボは最後に読んだ日付が新しい側を採用する
+    if (mine.get("last_read_date") or "") > (theirs.get("last_read_date") or ""):
+        merged["combo"] = mine.get("combo", 0)
+        merged["last_read_date"] = mine.get("last_read_date")
+    else:
+        merged["combo"] = theirs.get("combo", 0)
+        merged["last_read_date"] = theirs.get("last_read_date")
+    return merged
+
+
+def _merge_counter(base, mine, theirs):
+    """theirs に base からの自分の増減を足す（HP を2つのセッションで削った場合など）。数値でなければ自分の変更を優先"""
+    if all(isinstance(v, int) for v in (base, mine, theirs)):
+        return theirs + (mine - base)
+    return mine if mine != base else theirs
+
+
+def merge_book_counters(merged: Dict, base: Dict, mine: Dict, theirs: Dict) -> Dict:
+    """merged の HP・読了回数を双方の増減の合計にし、HP を 0〜最大HP に収める"""
+    for key in COUNTER_BOOK_FIELDS:
+        if key in mine or key in theirs:
+            merged[key] = _merge_counter(base.get(key), mine.get(key), theirs.get(key))
+    if isinstance(merged.get("current_hp"), int) and isinstance(merged.get("max_hp"), int):
+        merged["current_hp"] = max(0, min(merged["current_hp"], merged["max_hp"]))
+    return merged
+
+
+def merge_documents(base: Dict, mine: Dict, theirs: Dict) -> Dict:
+    """base からの自分の変更を、他セッションが保存した theirs に適用する"""
+    base_books = base.get("books", {})
+    theirs_books = {b.get("id"): b for b in theirs.get("books", [])}
+    mine_books = {b.get("id"): b for b in mine.get("books", [])}
+    next_id = max(list(theirs_books) + list(mine_books) + [0]) + 1
+    id_remap = {}
+
+    books = []
+    for book_id, theirs_book in theirs_books.items():
+        if book_id in base_books and book_id not in mine_books:
+            continue # 自分が削除した
+        mine_book = mine_books.get(book_id)
+        base_book = base_books.get(book_id)
+        if mine_book is None or base_book is None:
+            books.append(theirs_book)
+            continue
+        merged_book = dict(theirs_book)
+        for key, value in mine_book.items():
+            if key not in COUNTER_BOOK_FIELDS and base_book.get(key) != value:
+                merged_book[key] = value # タイトル・ステータスなどはフィールド単位で自分の変更を優先
+        books.append(merge_book_counters(merged_book, base_book, mine_book, theirs_book))
+
+    for book_id, mine_book in mine_books.items():
+        if book_id in base_books:
+            continue # 既存の本は上でマージ済み（相手が削除した場合は削除のまま）
+        if book_id in theirs_books:
+            if theirs_books[book_id] == mine_book:
+                continue
+            # 同じIDで別の本が追加されていた場合は自分の側を採番し直す
+            id_remap[book_id] = next_id
+            mine_book = dict(mine_book, id=next_id)
+            next_id += 1
+        books.append(mine_book)
+
+    base_log_ids = base.get("log_ids", set())
+    mine_log_ids = {l.get("id") for l in mine.get("logs", [])}
+    theirs_log_ids = {l.get("id") for l in theirs.get("logs", [])}
+    logs = [l for l in theirs.get("logs", []) if not (l.get("id") in base_log_ids and l.get("id") not in mine_log_ids)]
+    for log in mine.get("logs", []):
+        if log.get("id") in base_log_ids or log.get("id") in theirs_log_ids:
+            continue
+        if log.get("book_id") in id_remap:
+            log = dict(log, book_id=id_remap[log["book_id"]])
+        logs.append(log)
+
+    merged = dict(theirs)
+    for key, value in mine.items():
+        if key not in ("user", "books", "logs"):
+            merged[key] = value
+    merged["user"] = merge_user(base.get("user", {}), mine.get("user", {}), theirs.get("user", {}))
+    merged["books"] = books
+    merged["logs"] = logs
+    if STATS_KEY in merged["user"]:
+        # 集計値はフィールド単位でマージできないため、マージ後の内容から作り直す
+        merged["user"][STATS_KEY] = rebuild_stats(merged)
+    return merged
+
+
+def save_with_retry(
+    backend: StorageBackend,
+    data: Dict,
+    base: Optional[Dict],
+    revision: Optional[str],
+    retries: int = 5,
+    backoff: float = 0.2,
+    sleep: Callable[[float], None] = time.sleep,
+) -> Tuple[Dict, Optional[str]]:
+    """比較交換で保存し、競合時は再読込・マージ・指数バックオフで再試行する
+
+    戻り値は実際に保存したドキュメント（マージ後）と新しいリビジョン。
+    """
+    base = base if base is not None else make_base(None)
+    for attempt in range(retries + 1):
+        try:
+            return data, backend.save(data, expected_revision=revision)
+        except ConflictError:
+            if attempt == retries:
+                raise
+            sleep(backoff * (2 ** attempt) * (1 + random.random()))
+            theirs, revision = backend.load()
+            data = merge_documents(base, data, theirs or {})
+            base = make_base(theirs)
+    raise ConflictError("保存の再試行回数を超えました")
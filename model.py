@@ -0,0 +1,205 @@
+from typing import Dict, Iterable, List, Optional
+
+from stats import STATS_KEY, add_count, rebuild_stats
+
+# --- ドメインモデル ---
+# 読み込んだドキュメントを id・ステータス・ジャンル別の索引付きで保持する。
+# 索引と user["stats"] の集計値は変更メソッド経由で更新されるため、
+# 描画時に books/logs を走査しなくてよい。
+
+
+class Book:
+    """本棚の1冊"""
+
+    __slots__ = ("id", "title", "genre", "max_hp", "current_hp", "price", "status", "rating", "review", "read_count", "extra")
+    FIELDS = __slots__[:-1]
+
+    def __init__(self, id: int, title: str, genre: str = "", max_hp: int = 300, current_hp: Optional[int] = None,
+                 price: int = 0, status: str = "unread", rating: int = 0, review: Optional[Dict] = None,
+                 read_count: int = 0, extra: Optional[Dict] = None):
+        self.id = id
+        self.title = title
+        self.genre = genre
+        self.max_hp = max_hp
+        self.current_hp = max_hp if current_hp is None else current_hp
+        self.price = price
+        self.status = status
+        self.rating = rating
+        self.review = review if review is not None else {"good": "", "learn": "", "action": ""}
+        self.read_count = read_count
+        self.extra = extra or {}
+
+    @classmethod
+    def from_dict(cls, d: Dict) -> "Book":
+        known = {k: d[k] for k in cls.FIELDS if k in d}
+        extra = {k: v for k, v in d.items() if k not in cls.FIELDS}
+        return cls(extra=extra, **known)
+
+    def to_dict(self) -> Dict:
+        d = {k: getattr(self, k) for k in self.FIELDS}
+        d.update(self.extra)
+        return d
+
+
+class Log:
+    """読書記録1件（追記のみで変更しない）"""
+
+    __slots__ = ("id", "date", "book_id", "pages", "minutes", "exp_gained", "rating", "memo", "extra")
+    FIELDS = __slots__[:-1]
+
+    def __init__(self, id: str, date: str, book_id: int, pages: int = 0, minutes: int = 0,
+                 exp_gained: int = 0, rating: int = 0, memo: str = "", extra: Optional[Dict] = None):
+        self.id = id
+        self.date = date
+        self.book_id = book_id
+        self.pages = pages
+        self.minutes = minutes
+        self.exp_gained = exp_gained
+        self.rating = rating
+        self.memo = memo
+        self.extra = extra or {}
+
+    @classmethod
+    def from_dict(cls, d: Dict) -> "Log":
+        known = {k: d[k] for k in cls.FIELDS if k in d}
+        extra = {k: v for k, v in d.items() if k not in cls.FIELDS}
+        return cls(extra=extra, **known)
+
+    def to_dict(self) -> Dict:
+        d = {k: getattr(self, k) for k in self.FIELDS}
+        d.update(self.extra)
+        return d
+
+
+class GameState:
+    """索引付きのゲーム状態。books/logs の変更は必ずメソッド経由で行う"""
+
+    def __init__(self, data: Dict):
+        self.user: Dict = data.get("user", {})
+        self.extra = {k: v for k, v in data.items() if k not in ("user", "books", "logs")}
+        self.books: Dict[int, Book] = {}
+        self.books_by_status: Dict[str, Dict[int, Book]] = {}
+        self.books_by_genre: Dict[str, Dict[int, Book]] = {}
+        self.max_book_id = 0
+        self.logs: List[Log] = []
+        self.logs_by_book: Dict[int, List[Log]] = {}
+        # ログは変更しないため、保存用の dict 列を読み込み時のまま使い回す
+        self._log_dicts: List[Dict] = []
+        self.series = None # timeseries.ReadingSeries。作成済みなら変更に合わせて更新し、削除では破棄する
+
+        for d in data.get("books", []):
+            self._index_book(Book.from_dict(d), count=False)
+        for d in data.get("logs", []):
+            self._index_log(Log.from_dict(d), d, count=False)
+        # 集計値は保存済みのものを信頼し、無い場合（旧データ）だけ作り直す
+        if not isinstance(self.user.get(STATS_KEY), dict):
+            self.user[STATS_KEY] = rebuild_stats(data)
+
+    @property
+    def stats(self) -> Dict:
+        return self.user[STATS_KEY]
+
+    @property
+    def genre_read_counts(self) -> Dict[str, int]:
+        """1回以上読了した本の冊数（ジャンル別）"""
+        return self.stats["genre_reads"]
+
+    # --- 索引の管理 ---
+    def _index_book(self, book: Book, count: bool = True):
+        self.books[book.id] = book
+        self.books_by_status.setdefault(book.status, {})[book.id] = book
+        self.books_by_genre.setdefault(book.genre, {})[book.id] = book
+        self.max_book_id = max(self.max_book_id, book.id)
+        if count:
+            self._count_book(book, 1)
+
+    def _unindex_book(self, book: Book):
+        self.books.pop(book.id, None)
+        self.books_by_status.get(book.status, {}).pop(book.id, None)
+        self.books_by_genre.get(book.genre, {}).pop(book.id, None)
+        self._count_book(book, -1)
+
+    def _count_book(self, book: Book, delta: int):
+        if book.status == "completed":
+            self.stats["completed"] += delta
+        if book.read_count > 0:
+            add_count(self.genre_read_counts, book.genre, delta)
+
+    def _index_log(self, log: Log, d: Dict, count: bool = True):
+        self.logs.append(log)
+        self._log_dicts.append(d)
+        self.logs_by_book.setdefault(log.book_id, []).append(log)
+        if count:
+            self._count_log(log, 1)
+            if self.series is not None:
+                self.series.add_log(log)
+
+    def _count_log(self, log: Log, delta: int):
+        self.stats["total_pages"] += delta * (log.pages or 0)
+        self.stats["total_minutes"] += delta * (log.minutes or 0)
+
+    # --- 参照 ---
+    def book(self, book_id: int) -> Optional[Book]:
+        return self.books.get(book_id)
+
+    def books_with_status(self, *statuses: str) -> List[Book]:
+        result = []
+        for status in statuses:
+            result.extend(self.books_by_status.get(status, {}).values())
+        return result
+
+    def next_book_id(self) -> int:
+        return self.max_book_id + 1
+
+    # --- 変更 ---
+    def add_book(self, book: Book) -> Book:
+        self._index_book(book)
+        return book
+
+    def update_book(self, book: Book, **changes):
+        """フィールドを更新し、変化したステータス・ジャンル・読了回数の索引と集計値だけを付け替える"""
+        old_status, old_genre = book.status, book.genre
+        self._count_book(book, -1)
+        for key, value in changes.items():
+            setattr(book, key, value)
+        self._count_book(book, 1)
+
+        if book.status != old_status:
+            self.books_by_status[old_status].pop(book.id, None)
+            self.books_by_status.setdefault(book.status, {})[book.id] = book
+            if self.series is not None:
+                self.series.book_changed(book)
+        if book.genre != old_genre:
+            self.books_by_genre[old_genre].pop(book.id, None)
+            self.books_by_genre.setdefault(book.genre, {})[book.id] = book
+
+    def remove_book(self, book_id: int):
+        """本とその読書記録を削除する"""
+        book = self.books.get(book_id)
+        if book is None:
+            return
+        self._unindex_book(book)
+        self.series = None
+        removed_logs = self.logs_by_book.pop(book_id, None)
+        if removed_logs:
+            for log in removed_logs:
+                self._count_log(log, -1)
+            kept = [(log, d) for log, d in zip(self.logs, self._log_dicts) if log.book_id != book_id]
+            self.logs = [log for log, _ in kept]
+            self._log_dicts = [d for _, d in kept]
+
+    def add_log(self, log: Log):
+        self._index_log(log, log.to_dict())
+
+    # --- 保存用 ---
+    def to_dict(self) -> Dict:
+        data = dict(self.extra)
+        data["user"] = self.user
+        data["books"] = [b.to_dict() for b in self.books.values()]
+        data["logs"] = self._log_dicts # 追記のみなのでコピーせずに共有する
+        return data
+
+    def iter_logs_with_books(self) -> Iterable:
+        """(log, book) の組を返す。本が削除済みなら book は None"""
+        for log in self.logs:
+            yield log, self.books.get(log.book_id)
@@ -0,0 +1,133 @@
+import json
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+# --- 再描画の計測 ---
+# 読み込み・解析・集計・画像表示・保存などの処理を span("名前") で囲み、所要時間を処理ごとのリングバッファに残す。
+# 直近 CAPACITY 件から p50/p95/p99 を出す。1回の再描画だけ cProfile を取ることもできる。
+# Streamlit には依存しないため、storage など下位のモジュールからも get_profiler() で使う。
+
+CAPACITY = 500 # 処理ごとに残す件数
+PROFILE_LINES = 40 # cProfile の結果として残す行数
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """ソート済みの値の q 分位点（最近順位法）"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(q * len(sorted_values)) - 1)]
+
+
+class Profiler:
+    """処理ごとの所要時間（秒）と記録時刻のリングバッファ"""
+
+    def __init__(self, capacity: int = CAPACITY):
+        self.capacity = capacity
+        self._samples: Dict[str, Deque[Tuple[float, float]]] = {}
+        self._lock = threading.Lock()
+        self._capture_next = False
+        self._capturing = False
+        self.last_profile: Optional[str] = None # 直近の cProfile の結果（累積時間順）
+        self.last_profile_at: Optional[float] = None
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self.capacity)
+            samples.append((time.time(), seconds))
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        """with ブロックの所要時間を name として記録する（例外で抜けた場合も記録する）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def timed(self, name: str, fn: Callable, *args, **kwargs):
+        """fn(*args, **kwargs) を呼び、その所要時間を name として記録する"""
+        with self.span(name):
+            return fn(*args, **kwargs)
+
+    # --- cProfile ---
+    def capture_next(self):
+        """次の rerun() を cProfile で計測する"""
+        self._capture_next = True
+
+    @contextmanager
+    def rerun(self, name: str = "rerun") -> Iterator[None]:
+        """再描画全体を計測する。capture_next() の後なら cProfile も取る（同時に1つだけ）"""
+        profile = None
+        with self._lock:
+            if self._capture_next and not self._capturing:
+                self._capture_next, self._capturing = False, True
+                import cProfile # 起動を軽くするため、使うときだけ読み込む
+                profile = cProfile.Profile()
+        try:
+            with self.span(name):
+                if profile is None:
+                    yield
+                else:
+                    profile.enable()
+                    try:
+                        yield
+                    finally:
+                        profile.disable()
+        finally:
+            if profile is not None:
+                import io
+                import pstats
+                out = io.StringIO()
+                pstats.Stats(profile, stream=out).sort_stats("cumulative").print_stats(PROFILE_LINES)
+                with self._lock:
+                    self.last_profile, self.last_profile_at = out.getvalue(), time.time()
+                    self._capturing = False
+
+    # --- 参照 ---
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """処理ごとの {count, p50, p95, p99, max, last}（ミリ秒）"""
+        with self._lock:
+            snapshot = {name: [s for _, s in samples] for name, samples in self._samples.items()}
+        result = {}
+        for name, values in sorted(snapshot.items()):
+            ordered = sorted(values)
+            result[name] = {
+                "count": len(values),
+                "p50": percentile(ordered, 0.50) * 1000,
+                "p95": percentile(ordered, 0.95) * 1000,
+                "p99": percentile(ordered, 0.99) * 1000,
+                "max": ordered[-1] * 1000,
+                "last": values[-1] * 1000,
+            }
+        return result
+
+    def export_jsonl(self) -> str:
+        """全サンプルを1行1件の JSON（{"phase", "at", "ms"}）にする。時刻順"""
+        with self._lock:
+            rows = [(at, name, seconds) for name, samples in self._samples.items() for at, seconds in samples]
+        rows.sort()
+        return "".join(json.dumps({"phase": name, "at": round(at, 3), "ms": round(seconds * 1000, 3)}) + "\n"
+                       for at, name, seconds in rows)
+
+    def reset(self):
+        with self._lock:
+            self._samples = {}
+            self.last_profile = self.last_profile_at = None
+
+
+_profiler = Profiler()
+
+
+def get_profiler() -> Profiler:
+    """プロセスで共有する計測器"""
+    return _profiler
+
+
+def span(name: str):
+    return _profiler.span(name)
@@ -0,0 +1,166 @@
+import copy
+from typing import Dict, List, Optional, Tuple
+
+from game import INITIAL_DATA, acquire_weapon, calculate_combo, calculate_level_up, get_combo_multiplier, job_for_genres
+from model import GameState, Log
+from stats import STATS_KEY, add_count, rebuild_stats
+from storage import content_revision
+
+# --- 読書ログからの再計算（イベントソーシング） ---
+# user の level/exp/combo/total_hours/total_investment/weapons/job と、本の HP・読了回数を
+# ログだけから決定的に作り直す。ログを日付順（同じ日付は記録順）に1回走査するだけで O(n)。
+# 一定件数ごとにスナップショットを取り、ログが追記されただけなら最後のスナップショットから再開する。
+
+REPLAY_USER_FIELDS = ("level", "exp", "next_level_exp", "combo", "last_read_date", "job",
+                      "total_investment", "total_hours", "weapons")
+SNAPSHOT_EVERY = 1000
+MAX_SNAPSHOTS = 20
+
+
+class Snapshot:
+    """ログ先頭 count 件を再生し終えた時点の状態"""
+
+    __slots__ = ("count", "last_id", "max_date", "fingerprint", "user", "books", "genre_reads")
+
+    def __init__(self, count: int, last_id: Optional[str], max_date: str, fingerprint: str,
+                 user: Dict, books: Dict[int, Tuple[int, int, int]], genre_reads: Dict[str, int]):
+        self.count = count
+        self.last_id = last_id
+        self.max_date = max_date
+        self.fingerprint = fingerprint # 再生結果に影響する本の属性（総ページ数・価格・ジャンル）
+        self.user = user
+        self.books = books # book_id -> (HP, 読了回数, 評価)
+        self.genre_reads = genre_reads
+
+
+class _Fold:
+    """再生中の状態"""
+
+    __slots__ = ("user", "books", "genre_reads", "max_date")
+
+    def __init__(self, user: Dict, books: Dict[int, Tuple[int, int, int]], genre_reads: Dict[str, int], max_date: str = ""):
+        self.user = user
+        self.books = books
+        self.genre_reads = genre_reads
+        self.max_date = max_date
+
+    @classmethod
+    def empty(cls) -> "_Fold":
+        user = {k: copy.deepcopy(v) for k, v in INITIAL_DATA["user"].items() if k in REPLAY_USER_FIELDS}
+        return cls(user, {}, {})
+
+    @classmethod
+    def resume(cls, snapshot: Snapshot) -> "_Fold":
+        user = dict(snapshot.user, weapons=list(snapshot.user["weapons"]))
+        return cls(user, dict(snapshot.books), dict(snapshot.genre_reads), snapshot.max_date)
+
+    def snapshot(self, count: int, last_id: Optional[str], fingerprint: str) -> Snapshot:
+        user = dict(self.user, weapons=list(self.user["weapons"]))
+        # 本ごとの値はタプルで持つため、スナップショットは dict の浅いコピーで済む
+        return Snapshot(count, last_id, self.max_date, fingerprint, user, dict(self.books), dict(self.genre_reads))
+
+    def apply(self, state: GameState, log: Log):
+        """1件のログを record_reading と同じ規則で反映する"""
+        user = self.user
+        pages = log.pages or 0
+        user["combo"] = calculate_combo(user, log.date)
+        user["last_read_date"] = log.date
+        calculate_level_up(user, int(pages * get_combo_multiplier(user["combo"])))
+        if log.minutes and log.minutes > 0:
+            user["total_hours"] += log.minutes / 60.0
+        if log.date > self.max_date:
+            self.max_date = log.date
+
+        book = state.books.get(log.book_id)
+        if book is None:
+            return # 本が削除済みのログは EXP・時間だけ数える
+        hp, read_count, rating = self.books.get(book.id) or (book.max_hp, 0, 0)
+        if hp <= 0:
+            hp = book.max_hp # 読了済みの本への記録は再読
+        hp = max(0, hp - pages)
+        if log.rating and log.rating > 0:
+            rating = log.rating
+        if hp <= 0:
+            read_count += 1
+            if read_count == 1:
+                add_count(self.genre_reads, book.genre, 1)
+            user["total_investment"] += book.price
+            user["job"] = job_for_genres(self.genre_reads) or user["job"]
+            acquire_weapon(user, book.genre)
+        self.books[book.id] = (hp, read_count, rating)
+
+
+def books_fingerprint(state: GameState) -> str:
+    return content_revision(*(f"{b.id}:{b.max_hp}:{b.price}:{b.genre};" for b in state.books.values()))
+
+
+def _find_snapshot(state: GameState, snapshots: List[Snapshot], fingerprint: str) -> Optional[Snapshot]:
+    """ログの追記だけで済む最新のスナップショットを探す"""
+    logs = state.logs
+    suffix_min = None # 直前に調べたスナップショット以降のログの最小日付
+    scanned = len(logs)
+    for snapshot in reversed(snapshots):
+        if snapshot.count > len(logs) or snapshot.fingerprint != fingerprint:
+            continue
+        if snapshot.count and logs[snapshot.count - 1].id != snapshot.last_id:
+            continue # 途中のログが削除された
+        for log in logs[snapshot.count:scanned]:
+            if suffix_min is None or (log.date or "") < suffix_min:
+                suffix_min = log.date or ""
+        scanned = snapshot.count
+        if suffix_min is None or suffix_min >= snapshot.max_date:
+            return snapshot
+    return None
+
+
+def replay(state: GameState, snapshots: Optional[List[Snapshot]] = None,
+           snapshot_every: int = SNAPSHOT_EVERY) -> Tuple[_Fold, List[Snapshot]]:
+    """ログを再生した状態と、更新したスナップショット列を返す（state は変更しない）"""
+    fingerprint = books_fingerprint(state)
+    start = _find_snapshot(state, snapshots or [], fingerprint)
+    if start is None:
+        fold, kept, offset = _Fold.empty(), [], 0
+    else:
+        fold, offset = _Fold.resume(start), start.count
+        kept = [s for s in snapshots if s.count <= start.count and s.fingerprint == fingerprint]
+
+    # スナップショットはログの並びの先頭 k 件と再生順の先頭 k 件が一致する位置でだけ取る
+    ordered = sorted(range(offset, len(state.logs)), key=lambda i: state.logs[i].date or "")
+    highest = offset - 1
+    for done, i in enumerate(ordered, start=offset + 1):
+        log = state.logs[i]
+        fold.apply(state, log)
+        highest = max(highest, i)
+        if done % snapshot_every == 0 and highest == done - 1:
+            kept.append(fold.snapshot(done, log.id, fingerprint))
+    return fold, kept[-MAX_SNAPSHOTS:]
+
+
+def apply_replay(state: GameState, fold: _Fold) -> Dict:
+    """再生結果を state に書き戻し、変化した user の項目を {項目: (旧, 新)} で返す"""
+    user = state.user
+    changes = {}
+    for key in REPLAY_USER_FIELDS:
+        value = fold.user.get(key)
+        if key == "total_hours" and abs((user.get(key) or 0.0) - value) < 1e-6:
+            continue # 浮動小数の加算順による誤差は無視する
+        if user.get(key) != value:
+            changes[key] = (user.get(key), value)
+            user[key] = copy.copy(value)
+
+    # 記録のある本だけ HP・読了回数・ステータスを合わせる。記録の無い本は手動の設定を尊重する
+    for book_id, (hp, read_count, rating) in fold.books.items():
+        book = state.books[book_id]
+        if hp > 0:
+            updates = {"current_hp": hp, "status": "reread" if read_count else "active"}
+        elif book.status == "reread" and book.current_hp > 0:
+            updates = {} # 読了後に手動で再読を始めた本
+        else:
+            updates = {"current_hp": 0, "status": "completed"}
+        updates["read_count"] = read_count
+        if rating:
+            updates["rating"] = rating
+        if any(getattr(book, k) != v for k, v in updates.items()):
+            state.update_book(book, **updates)
+    user[STATS_KEY] = rebuild_stats(state.to_dict())
+    return changes
@@ -0,0 +1,183 @@
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from profiling import span
+
+# --- Google Sheets クライアントのラッパー ---
+# スプレッドシートとワークシートを開くのは最初の1回だけにし（open() は Drive 検索を伴う）、
+# API 呼び出しはトークンバケットで間引いてから送る。429（クォータ超過）は待って再試行する。
+# 呼び出し回数・所要時間・429 の回数をメソッドごとに数え、メンテナンス画面に出す。
+
+REQUESTS_PER_MINUTE = 60 # Sheets API のユーザーあたり既定クォータ（読み・書き別）に合わせる
+BURST = 10
+RATE_LIMIT_RETRIES = 5
+
+
+class TokenBucket:
+    """rate 個/秒で補充され、最大 capacity 個まで貯まるトークンバケット"""
+
+    def __init__(self, rate: float, capacity: int, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = float(capacity)
+        self.updated_at = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """トークンを1つ取り出す。足りなければ補充を待ち、待った秒数を返す"""
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait:
+            self.sleep(wait)
+        return wait
+
+
+def status_code(error: Exception) -> Optional[int]:
+    """gspread の APIError などから HTTP ステータスを取り出す"""
+    response = getattr(error, "response", None)
+    code = getattr(response, "status_code", None) or getattr(error, "code", None)
+    return code if isinstance(code, int) else None
+
+
+def is_worksheet_not_found(error: Exception) -> bool:
+    """ワークシートが無いことを表す例外か（gspread.WorksheetNotFound とテスト用の fake_gspread の同名の例外、404）"""
+    return any(cls.__name__ == "WorksheetNotFound" for cls in type(error).__mro__) or status_code(error) == 404
+
+
+class SheetsClient:
+    """開いたスプレッドシート・ワークシートをキャッシュし、レート制限と計測を行うクライアント"""
+
+    def __init__(self, client_factory: Callable, spreadsheet_name: str, spreadsheet_key: Optional[str] = None,
+                 requests_per_minute: int = REQUESTS_PER_MINUTE, burst: int = BURST,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        self.client_factory = client_factory
+        self.spreadsheet_name = spreadsheet_name
+        self.spreadsheet_key = spreadsheet_key # 指定すると名前検索（Drive API）を使わずに開く
+        self.clock = clock
+        self.sleep = sleep
+        self.bucket = TokenBucket(requests_per_minute / 60.0, burst, clock=clock, sleep=sleep)
+        self._spreadsheet = None
+        self._worksheets: Dict[str, object] = {}
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, Dict[str, float]] = {}
+
+    # --- 計測 ---
+    def _record(self, method: str, elapsed: float, waited: float, error: Optional[int] = None):
+        with self._lock:
+            m = self._metrics.setdefault(method, {"calls": 0, "errors": 0, "rate_limited": 0,
+                                                  "total_seconds": 0.0, "max_seconds": 0.0, "throttled_seconds": 0.0})
+            m["calls"] += 1
+            m["total_seconds"] += elapsed
+            m["max_seconds"] = max(m["max_seconds"], elapsed)
+            m["throttled_seconds"] += waited
+            if error == 429:
+                m["rate_limited"] += 1
+            elif error is not None:
+                m["errors"] += 1
+
+    def metrics(self) -> Dict[str, Dict[str, float]]:
+        """メソッドごとの {calls, errors, rate_limited, total_seconds, max_seconds, throttled_seconds}"""
+        with self._lock:
+            return {method: dict(m) for method, m in self._metrics.items()}
+
+    def call(self, method: str, fn: Callable, *args, **kwargs):
+        """API 呼び出しを1回行う。429 の場合は指数バックオフで再試行する"""
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            waited = self.bucket.acquire()
+            start = self.clock()
+            try:
+                with span(f"sheets.{method}"):
+                    result = fn(*args, **kwargs)
+            except Exception as e:
+                code = status_code(e)
+                self._record(method, self.clock() - start, waited, error=code if code is not None else -1)
+                if code != 429 or attempt == RATE_LIMIT_RETRIES:
+                    raise
+                self.sleep(min(2 ** attempt, 32))
+                continue
+            self._record(method, self.clock() - start, waited)
+            return result
+
+    # --- スプレッドシート・ワークシート ---
+    def spreadsheet(self):
+        if self._spreadsheet is None:
+            client = self.client_factory()
+            if not client:
+                raise ConnectionError("Google Cloud接続エラー")
+            if self.spreadsheet_key:
+                self._spreadsheet = self.call("open_by_key", client.open_by_key, self.spreadsheet_key)
+            else:
+                self._spreadsheet = self.call("open", client.open, self.spreadsheet_name)
+        return self._spreadsheet
+
+    def worksheet(self, title: Optional[str] = None, create: Optional[Callable] = None):
+        """タイトルでワークシートを取得する（None は先頭のシート）。無ければ create(spreadsheet) で作る"""
+        key = title or ""
+        if key not in self._worksheets:
+            spreadsheet = self.spreadsheet()
+            if title is None:
+                self._worksheets[key] = self.call("get_worksheet", spreadsheet.get_worksheet, 0)
+            else:
+                try:
+                    self._worksheets[key] = self.call("worksheet", spreadsheet.worksheet, title)
+                except Exception as e:
+                    # 429・権限エラーなどで新しいシートを作らないよう、無い場合だけ作る
+                    if create is None or not is_worksheet_not_found(e):
+                        raise
+                    self._worksheets[key] = create(self)
+        return self._worksheets[key]
+
+    def reset(self):
+        """開いたシートのキャッシュを捨てる（シートが削除された場合など）"""
+        self._spreadsheet = None
+        self._worksheets = {}
+
+    # --- まとめて読み書き ---
+    def batch_get(self, ranges: List[str], unformatted: bool = True) -> List[List[List]]:
+        """複数範囲を1回のリクエストで読み、範囲ごとの値の2次元配列を返す"""
+        params = {"valueRenderOption": "UNFORMATTED_VALUE"} if unformatted else None
+        response = self.call("values_batch_get", self.spreadsheet().values_batch_get, ranges, params=params)
+        value_ranges = response.get("valueRanges", [])
+        return [value_ranges[i].get("values", []) if i < len(value_ranges) else [] for i in range(len(ranges))]
+
+    def batch_update(self, requests: List[Dict]):
+        """spreadsheets.batchUpdate で複数シートへの書き込みを1回のリクエストにまとめる"""
+        if requests:
+            return self.call("batch_update", self.spreadsheet().batch_update, {"requests": requests})
+
+
+def cell_data(value) -> Dict:
+    """値を CellData にする（RAW と同じく文字列は文字列のまま書き込む）"""
+    if value is None or value == "":
+        return {}
+    if isinstance(value, bool):
+        return {"userEnteredValue": {"boolValue": value}}
+    if isinstance(value, (int, float)):
+        return {"userEnteredValue": {"numberValue": value}}
+    return {"userEnteredValue": {"stringValue": str(value)}}
+
+
+def update_cells(sheet_id: int, row: int, column: int, rows: List[List]) -> Dict:
+    """(row, column) を左上（0 始まり）として値を書き込むリクエスト。空文字のセルは消去する"""
+    return {"updateCells": {
+        "start": {"sheetId": sheet_id, "rowIndex": row, "columnIndex": column},
+        "rows": [{"values": [cell_data(v) for v in r]} for r in rows],
+        "fields": "userEnteredValue",
+    }}
+
+
+def append_cells(sheet_id: int, rows: List[List]) -> Dict:
+    """データのある最終行の後ろに追記するリクエスト（行が足りなければシートが広がる）"""
+    return {"appendCells": {
+        "sheetId": sheet_id,
+        "rows": [{"values": [cell_data(v) for v in r]} for r in rows],
+        "fields": "userEnteredValue",
+    }}
@@ -0,0 +1,106 @@
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional, Tuple
+
+from catalog import normalize_title
+from model import Book, GameState, Log
+
+# --- 本棚・読書ログ一覧の索引 ---
+# 表示するのは1ページ分だけにし、並べ替えと絞り込みは索引で行う。
+# 本棚は並べ替えキーごとのソート済み ID 配列、ログは日付順の配列と本ごとの位置リストを持ち、
+# 日付の範囲は二分探索で切り出す。索引はドキュメントのリビジョンごとに1回だけ作る。
+
+STATUS_ORDER = {"active": 0, "reread": 1, "unread": 2, "completed": 3}
+SORT_KEYS = ("title", "status", "genre", "progress", "last_read")
+
+
+def progress(book: Book) -> float:
+    """読んだ割合（0.0〜1.0）。読了済みは 1.0"""
+    if book.status == "completed" or not book.max_hp:
+        return 1.0
+    return max(0.0, min(1.0, (book.max_hp - book.current_hp) / book.max_hp))
+
+
+class ShelfIndex:
+    """本棚の並べ替え・絞り込み・ページ分割"""
+
+    def __init__(self, state: GameState):
+        self.state = state
+        self.last_read: Dict[int, str] = {}
+        for log in state.logs:
+            if log.date and log.date > self.last_read.get(log.book_id, ""):
+                self.last_read[log.book_id] = log.date
+        self._orders: Dict[str, List[int]] = {}
+
+    def _sort_key(self, sort: str):
+        last_read = self.last_read
+        if sort == "status":
+            return lambda b: (STATUS_ORDER.get(b.status, len(STATUS_ORDER)), normalize_title(b.title))
+        if sort == "genre":
+            return lambda b: (b.genre or "", normalize_title(b.title))
+        if sort == "progress":
+            return lambda b: (progress(b), normalize_title(b.title))
+        if sort == "last_read":
+            return lambda b: (last_read.get(b.id, ""), normalize_title(b.title))
+        return lambda b: (normalize_title(b.title), b.id)
+
+    def order(self, sort: str) -> List[int]:
+        """並べ替えキーの昇順に並べた書籍 ID（キーごとに1回だけソートする）"""
+        if sort not in self._orders:
+            books = sorted(self.state.books.values(), key=self._sort_key(sort))
+            self._orders[sort] = [b.id for b in books]
+        return self._orders[sort]
+
+    def page(self, status: Optional[str] = None, sort: str = "title", descending: bool = False,
+             offset: int = 0, limit: int = 20) -> Tuple[List[Book], int]:
+        """条件に合う本のうち offset から limit 件と、総件数を返す"""
+        ids = self.order(sort)
+        if status is not None:
+            in_status = self.state.books_by_status.get(status, {})
+            ids = [i for i in ids if i in in_status]
+        if descending:
+            ids = ids[::-1]
+        books = self.state.books
+        return [books[i] for i in ids[offset:offset + limit]], len(ids)
+
+
+class LogIndex:
+    """読書ログの日付・書籍での絞り込みとページ分割"""
+
+    def __init__(self, state: GameState):
+        self.state = state
+        # 日付順（同じ日付は記録順）。日付の無いログは先頭に置く
+        self.logs: List[Log] = sorted(state.logs, key=lambda l: l.date or "")
+        self.dates: List[str] = [l.date or "" for l in self.logs]
+        self._by_book: Dict[int, List[int]] = {}
+        for position, log in enumerate(self.logs):
+            self._by_book.setdefault(log.book_id, []).append(position)
+
+    def date_range(self) -> Tuple[Optional[str], Optional[str]]:
+        """日付のあるログの最初と最後の日付"""
+        first = bisect_right(self.dates, "")
+        if first == len(self.dates):
+            return None, None
+        return self.dates[first], self.dates[-1]
+
+    def book_ids(self) -> List[int]:
+        """ログのある書籍 ID"""
+        return list(self._by_book)
+
+    def query(self, start: Optional[str] = None, end: Optional[str] = None, book_id: Optional[int] = None,
+              offset: int = 0, limit: int = 50, newest_first: bool = True) -> Tuple[List[Tuple[Log, Optional[Book]]], int]:
+        """期間（YYYY-MM-DD、両端を含む）と書籍で絞ったログのうち offset から limit 件と、総件数を返す"""
+        lo = bisect_left(self.dates, start) if start else 0
+        hi = bisect_right(self.dates, end) if end else len(self.dates)
+        if book_id is not None:
+            positions = self._by_book.get(book_id, [])
+            # 本ごとの位置リストも日付順なので、同じ範囲を二分探索で切り出せる
+            positions = positions[bisect_left(positions, lo):bisect_left(positions, hi)]
+        else:
+            positions = range(lo, hi)
+        total = len(positions)
+        if newest_first:
+            window = positions[max(0, total - offset - limit):max(0, total - offset)][::-1]
+        else:
+            window = positions[offset:offset + limit]
+        books = self.state.books
+        return [(self.logs[p], books.get(self.logs[p].book_id)) for p in window], total
@@ -0,0 +1,45 @@
+import json
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+# --- ローカルのスナップショット ---
+# 起動直後の最初の描画を Google Sheets への接続を待たずに行うため、最後に確認したドキュメントを
+# リビジョンと一緒にローカルのファイルへ残しておく。表示に使うだけで、保存はストレージで
+# リビジョンを確認してから行う（DocumentCache.seed を参照）。
+
+SNAPSHOT_VERSION = 1
+
+
+class Snapshot:
+    """最後に確認したドキュメントとリビジョンを1ファイルに保存する"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.revision: Optional[str] = None # ファイルに書かれているリビジョン
+        self._lock = threading.Lock()
+
+    def load(self) -> Tuple[Optional[Dict], Optional[str]]:
+        """(ドキュメント, リビジョン)。ファイルが無い・読めない・版が違う場合は (None, None)"""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                payload = json.load(f)
+        except (OSError, ValueError):
+            return None, None
+        if not isinstance(payload, dict) or payload.get("v") != SNAPSHOT_VERSION:
+            return None, None
+        self.revision = payload.get("revision")
+        return payload.get("data"), self.revision
+
+    def save(self, data: Dict, revision: Optional[str]) -> bool:
+        """リビジョンが変わっていれば書き直す。一時ファイルを置き換えるので途中で落ちても壊れない"""
+        with self._lock:
+            if revision is None or revision == self.revision:
+                return False
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"v": SNAPSHOT_VERSION, "revision": revision, "data": data}, f,
+                          ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp, self.path)
+            self.revision = revision
+            return True
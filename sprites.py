@@ -0,0 +1,65 @@
+import io
+import os
+from typing import Dict, Optional, Tuple
+
+try:
+    from PIL import Image, features
+except ImportError: # Pillow が無い環境では元画像をそのまま使う
+    Image = None
+
+# --- アバター・敵画像のキャッシュ ---
+# assets/ の一覧を起動時に1回だけ読み、存在確認とフォールバック先の解決を済ませておく。
+# 画像は最初に表示するときに表示サイズ（高解像度画面向けに SCALE 倍）へ縮小してメモリに保持し、
+# rerun のたびにディスクを読んだり数MBの PNG を送ったりしないようにする。
+# 起動時にまとめて縮小はしない（最初の描画では表示する1〜2枚だけを縮小する）。
+
+SCALE = 2
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp")
+
+
+class SpriteCache:
+    """(パス, 表示幅) ごとの縮小画像のキャッシュ"""
+
+    def __init__(self, assets_dir: str, scale: int = SCALE):
+        self.assets_dir = assets_dir
+        self.scale = scale
+        try:
+            names = os.listdir(assets_dir)
+        except OSError:
+            names = []
+        self.paths = {os.path.join(assets_dir, name) for name in names if name.lower().endswith(IMAGE_EXTENSIONS)}
+        self._resolved: Dict[Tuple[str, ...], Optional[str]] = {}
+        self._thumbs: Dict[Tuple[str, int], bytes] = {}
+        self.format = "WEBP" if Image is not None and features.check("webp") else "PNG"
+
+    def resolve(self, *candidates: str) -> Optional[str]:
+        """候補のうち最初に存在するパス。結果は候補の組ごとに覚えておく"""
+        if candidates not in self._resolved:
+            self._resolved[candidates] = next((p for p in candidates if p in self.paths), None)
+        return self._resolved[candidates]
+
+    def _render(self, path: str, width: int) -> bytes:
+        with open(path, "rb") as f:
+            raw = f.read()
+        if Image is None:
+            return raw
+        with Image.open(io.BytesIO(raw)) as img:
+            target = width * self.scale
+            if img.width > target:
+                img = img.resize((target, max(1, round(img.height * target / img.width))), Image.LANCZOS)
+            out = io.BytesIO()
+            if self.format == "WEBP":
+                img.save(out, format="WEBP", quality=85, method=4)
+            else:
+                img.save(out, format="PNG", optimize=True)
+        # 元の方が小さければ元画像を使う
+        return out.getvalue() if out.tell() < len(raw) else raw
+
+    def get(self, path: str, width: int) -> bytes:
+        key = (path, width)
+        if key not in self._thumbs:
+            self._thumbs[key] = self._render(path, width)
+        return self._thumbs[key]
+
+    def memory_bytes(self) -> int:
+        return sum(len(data) for data in self._thumbs.values())
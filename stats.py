@@ -0,0 +1,86 @@
+import argparse
+import json
+from collections import Counter
+from typing import Dict
+
+# --- 集計値のマテリアライズ ---
+# user["stats"] に読了数・ジャンル別読了冊数・武器の所持数・総ページ数・総読書時間を保存し、
+# 読書記録や書籍の編集・削除のたびに差分で更新する。描画時には再計算しない。
+# 生データ（books/logs/weapons）から作り直して比較する検証コマンドも用意する。
+
+STATS_KEY = "stats"
+
+
+def empty_stats() -> Dict:
+    return {"completed": 0, "genre_reads": {}, "weapons": {}, "total_pages": 0, "total_minutes": 0}
+
+
+def rebuild_stats(data: Dict) -> Dict:
+    """ドキュメントの books/logs/weapons から集計値を作り直す"""
+    stats = empty_stats()
+    for book in data.get("books", []):
+        if book.get("status") == "completed":
+            stats["completed"] += 1
+        if book.get("read_count", 0) > 0:
+            genre = book.get("genre", "")
+            stats["genre_reads"][genre] = stats["genre_reads"].get(genre, 0) + 1
+    for log in data.get("logs", []):
+        stats["total_pages"] += log.get("pages") or 0
+        stats["total_minutes"] += log.get("minutes") or 0
+    stats["weapons"] = dict(Counter(data.get("user", {}).get("weapons", [])))
+    return stats
+
+
+def verify_stats(data: Dict) -> Dict:
+    """保存済みの集計値と作り直した値を比較し、ずれている項目を {項目: (保存値, 正しい値)} で返す"""
+    stored = data.get("user", {}).get(STATS_KEY) or empty_stats()
+    expected = rebuild_stats(data)
+    return {key: (stored.get(key), value) for key, value in expected.items() if stored.get(key) != value}
+
+
+def add_count(counts: Dict[str, int], key: str, delta: int):
+    """カウンタ dict を増減し、0 以下になったキーは取り除く"""
+    count = counts.get(key, 0) + delta
+    if count > 0:
+        counts[key] = count
+    else:
+        counts.pop(key, None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="user.stats の検証・再構築")
+    parser.add_argument("command", choices=["verify", "rebuild"])
+    parser.add_argument("--sqlite", help="SQLite バックエンドのファイル")
+    parser.add_argument("--json", help="ドキュメントの JSON エクスポート")
+    args = parser.parse_args()
+
+    if args.sqlite:
+        from storage import SQLiteBackend
+        backend = SQLiteBackend(args.sqlite)
+        data, revision = backend.load()
+    elif args.json:
+        with open(args.json, "r", encoding="utf-8") as f:
+            data, backend, revision = json.load(f), None, None
+    else:
+        parser.error("--sqlite か --json を指定してください")
+    if not data:
+        print("データがありません")
+        return
+
+    drift = verify_stats(data)
+    for key, (stored, expected) in drift.items():
+        print(f"{key}: 保存値={stored} 正しい値={expected}")
+    if not drift:
+        print("集計値は一致しています")
+    if args.command == "rebuild" and drift:
+        data["user"][STATS_KEY] = rebuild_stats(data)
+        if backend:
+            backend.save(data, expected_revision=revision)
+        else:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+        print("集計値を再構築しました")
+
+
+if __name__ == "__main__":
+    main()
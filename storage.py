@@ -0,0 +1,527 @@
+import copy
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from codec import STATE_ENCODING, is_packed_logs, pack_log_segments, pack_state, unpack_logs, unpack_state
+from profiling import span
+from sheets_client import REQUESTS_PER_MINUTE, SheetsClient, append_cells, update_cells
+
+# --- ストレージバックエンド層 ---
+# app.py からは load()/save() だけを使う。Streamlit には依存しない。
+# ログは追記専用で保存し、毎回書き直すのは小さな user/books の状態だけにする。
+
+LOG_COLUMNS = ["id", "date", "book_id", "pages", "minutes", "exp_gained", "rating", "memo"]
+LOG_INT_COLUMNS = {"book_id", "pages", "minutes", "exp_gained", "rating"}
+
+
+# save() で expected_revision を省略した場合はリビジョンを確認しない
+UNCHECKED = object()
+
+
+class StorageError(Exception):
+    """ストレージへ接続・保存できない場合の例外"""
+
+
+class ConflictError(StorageError):
+    """読み込み後に他のセッションが保存していた場合の例外"""
+
+
+class StorageBackend:
+    """永続化バックエンドの共通インターフェース"""
+
+    name = "base"
+
+    def __init__(self):
+        # 保存先に既に存在するログIDの集合（差分追記の判定に使う）
+        self._known_log_ids: Set[str] = set()
+
+    def load(self) -> Tuple[Optional[Dict], Optional[str]]:
+        """保存済みドキュメントとそのリビジョンを返す。未保存なら (None, None)"""
+        raise NotImplementedError
+
+    def save(self, data: Dict, expected_revision=UNCHECKED) -> Optional[str]:
+        """ドキュメントを保存し、新しいリビジョンを返す
+
+        expected_revision を指定した場合、現在のリビジョンと異なれば ConflictError を送出する。
+        """
+        raise NotImplementedError
+
+    def revision(self) -> Optional[str]:
+        """現在のリビジョンだけを安価に取得する（変更検知用）"""
+        raise NotImplementedError
+
+    def for_tenant(self, tenant: str) -> "StorageBackend":
+        """プレイヤーごとの区画を読み書きするバックエンド（接続などの資源は共有する）"""
+        raise NotImplementedError(f"{self.name} は複数プレイヤーモードに対応していません")
+
+    def _diff_logs(self, logs: List[Dict]) -> Tuple[List[Dict], Optional[Set[str]]]:
+        """未保存のログと、削除されたログIDの集合（削除が無ければ None）を返す
+
+        ログは末尾に追記されるので、末尾から既知のIDに当たるまで遡るだけで済む。
+        件数が合わない場合のみ全件を突き合わせる。
+        """
+        known = self._known_log_ids
+        new_logs = []
+        for log in reversed(logs):
+            if log.get("id") in known:
+                break
+            new_logs.append(log)
+        new_logs.reverse()
+        if len(logs) - len(new_logs) == len(known):
+            return new_logs, None
+
+        current_ids = {l.get("id") for l in logs}
+        new_logs = [l for l in logs if l.get("id") not in known]
+        return new_logs, known - current_ids
+
+    def _remember_logs(self, new_logs: List[Dict], removed_ids: Optional[Set[str]]):
+        """保存に成功したログ差分を既知IDの集合に反映する"""
+        if removed_ids:
+            self._known_log_ids -= removed_ids
+        self._known_log_ids.update(l.get("id") for l in new_logs)
+
+
+def content_revision(*parts: str) -> str:
+    """シリアライズ済みの内容からハッシュを作りリビジョンとして使う"""
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def split_document(data: Dict) -> Tuple[Dict, List[Dict]]:
+    """ドキュメントを可変の状態部分（user/books 等）と追記専用のログに分ける"""
+    state = {k: v for k, v in data.items() if k != "logs"}
+    return state, data.get("logs", [])
+
+
+# --- チャンク形式 ---
+# 1セル50,000文字の上限を避けるため、状態 JSON を複数行に分割して保存する。
+# 先頭セルにはチャンク数とチェックサムを持つマニフェストを置く。
+CHUNK_FORMAT = "chunked"
+CHUNK_SIZE = 40000
+
+
+def build_chunks(json_str: str, chunk_size: int = CHUNK_SIZE) -> Tuple[Dict, List[str]]:
+    """JSON 文字列をチャンクに分割し、マニフェストと共に返す"""
+    chunks = [json_str[i:i + chunk_size] for i in range(0, len(json_str), chunk_size)] or [""]
+    manifest = {
+        "format": CHUNK_FORMAT,
+        "chunks": len(chunks),
+        "length": len(json_str),
+        "sha256": hashlib.sha256(json_str.encode("utf-8")).hexdigest(),
+    }
+    return manifest, chunks
+
+
+def join_chunks(manifest: Dict, chunks: List[str]) -> str:
+    """マニフェストに従ってチャンクを連結し、チェックサムを検証する"""
+    json_str = "".join(chunks[:manifest["chunks"]])
+    if len(json_str) != manifest["length"] or hashlib.sha256(json_str.encode("utf-8")).hexdigest() != manifest["sha256"]:
+        raise StorageError("保存データのチェックサムが一致しません（チャンク欠損の可能性）")
+    return json_str
+
+
+def _split_extra(record: Dict, columns: List[str], skip=()) -> Optional[str]:
+    """既知カラム以外のキーを extra 列用の JSON にまとめる"""
+    extra = {k: v for k, v in record.items() if k not in columns and k not in skip}
+    return json.dumps(extra, ensure_ascii=False) if extra else None
+
+
+# --- Google Sheets ---
+LOG_FORMATS = ("packed", "rows")
+MAX_LOG_SEGMENTS = 50 # 追記でセグメント行がこれを超えたら1回書き直してまとめる
+
+
+class SheetsBackend(StorageBackend):
+    """sheet1 の A列に user/books の状態をチャンク保存し、ログは "logs" シートに追記する
+
+    A1: マニフェスト / B1: リビジョン / A2 以降: 状態のチャンク（codec で圧縮した文字列）
+    ログは log_format が "packed"（既定）なら保存1回分ずつ codec で列指向に圧縮して A 列の1セルに、
+    "rows" なら1件1行で書く。読み込みはどちらの行も（混在していても）扱える。
+    """
+
+    name = "sheets"
+    LOGS_SHEET = "logs"
+    LOG_WIDTH = len(LOG_COLUMNS) + 1 # A..I（extra 列を含む）
+
+    def __init__(self, sheets: SheetsClient, state_sheet: Optional[str] = None, logs_sheet: str = LOGS_SHEET,
+                 log_format: str = "packed"):
+        super().__init__()
+        if log_format not in LOG_FORMATS:
+            raise ValueError(f"未知のログ形式です: {log_format}")
+        self.sheets = sheets
+        self.state_sheet = state_sheet # None は先頭のシート（sheet1）
+        self.logs_sheet = logs_sheet
+        self.log_format = log_format
+        self._chunk_count = 0 # 前回読み書きしたチャンク数（不要になった行の消去に使う）
+        self._log_rows: Optional[int] = None # ログシートのデータ行数（前回の読み書き時点）
+        self._log_segments = 0 # そのうち圧縮セグメントの行数
+        self._migrate_logs = False # 読み込んだログに log_format と異なる形式の行があった
+
+    def for_tenant(self, tenant: str) -> "SheetsBackend":
+        """プレイヤーごとに state_<id> / logs_<id> のワークシートを使う（スプレッドシートと流量制限は共有）"""
+        return SheetsBackend(self.sheets, state_sheet=f"state_{tenant}", logs_sheet=f"logs_{tenant}",
+                             log_format=self.log_format)
+
+    def _create_logs_worksheet(self, sheets: SheetsClient):
+        spreadsheet = sheets.spreadsheet()
+        worksheet = sheets.call("add_worksheet", spreadsheet.add_worksheet, self.logs_sheet, rows=1000, cols=self.LOG_WIDTH)
+        sheets.call("update", worksheet.update, "A1", [LOG_COLUMNS + ["extra"]], value_input_option="RAW")
+        return worksheet
+
+    def _create_state_worksheet(self, sheets: SheetsClient):
+        spreadsheet = sheets.spreadsheet()
+        return sheets.call("add_worksheet", spreadsheet.add_worksheet, self.state_sheet, rows=1000, cols=2)
+
+    def _state_worksheet(self):
+        if self.state_sheet is None:
+            return self.sheets.worksheet()
+        return self.sheets.worksheet(self.state_sheet, create=self._create_state_worksheet)
+
+    def _logs_worksheet(self):
+        return self.sheets.worksheet(self.logs_sheet, create=self._create_logs_worksheet)
+
+    @staticmethod
+    def _log_to_row(log: Dict) -> List:
+        return [log.get(col, "") for col in LOG_COLUMNS] + [_split_extra(log, LOG_COLUMNS) or ""]
+
+    @staticmethod
+    def _row_to_log(row: List) -> Dict:
+        log = {}
+        for col, value in zip(LOG_COLUMNS, row):
+            if value == "" or value is None:
+                continue
+            log[col] = int(value) if col in LOG_INT_COLUMNS else value
+        if len(row) > len(LOG_COLUMNS) and row[len(LOG_COLUMNS)]:
+            log.update(json.loads(row[len(LOG_COLUMNS)]))
+        return log
+
+    def _logs_to_rows(self, logs: List[Dict]) -> List[List]:
+        if self.log_format == "packed":
+            return [[segment] for segment in pack_log_segments(logs, CHUNK_SIZE)]
+        return [self._log_to_row(l) for l in logs]
+
+    def _read_logs(self, rows: List[List]) -> List[Dict]:
+        logs = []
+        segments = plain = 0
+        for row in rows:
+            if not row:
+                continue
+            if is_packed_logs(row[0]):
+                logs.extend(unpack_logs(row[0]))
+                segments += 1
+            else:
+                logs.append(self._row_to_log(row))
+                plain += 1
+        self._log_segments = segments
+        self._migrate_logs = bool(plain if self.log_format == "packed" else segments)
+        return logs
+
+    def load(self) -> Tuple[Optional[Dict], Optional[str]]:
+        state_ws = self._state_worksheet()
+        self._logs_worksheet() # 旧形式のシートでは初回にログシートを作成する
+        # マニフェスト・全チャンク・ログシートを1回のリクエストで取得する
+        state_values, log_values = self.sheets.batch_get(
+            [f"'{state_ws.title}'!A:B", f"'{self.logs_sheet}'!A2:I"]
+        )
+
+        row = state_values[0] if state_values else []
+        head = row[0] if row else ""
+        revision = str(row[1]) if len(row) > 1 and row[1] != "" else None
+        with span("sheets.decode"):
+            state = self._read_state(head, [r[0] if r else "" for r in state_values[1:]])
+            logs = self._read_logs(log_values)
+        self._known_log_ids = {l.get("id") for l in logs}
+        self._log_rows = len(log_values)
+        if state is None and not logs:
+            return None, None
+
+        data = state or {}
+        # 旧形式（A1 にログも含む）は読み込み時に統合し、次回保存でログシートへ移す
+        legacy_logs = [l for l in data.pop("logs", []) if l.get("id") not in self._known_log_ids]
+        data["logs"] = legacy_logs + logs
+        return data, revision
+
+    def _read_state(self, head: str, chunks: List[str]) -> Optional[Dict]:
+        """A1 の内容から状態を復元する（旧形式の単一セル JSON・圧縮前のチャンク JSON にも対応）"""
+        if not head:
+            self._chunk_count = 0
+            return None
+        manifest = json.loads(head)
+        if manifest.get("format") != CHUNK_FORMAT:
+            self._chunk_count = 0
+            return manifest
+        self._chunk_count = manifest["chunks"]
+        text = join_chunks(manifest, chunks)
+        if manifest.get("encoding") == STATE_ENCODING:
+            return unpack_state(text)
+        if manifest.get("encoding"):
+            raise StorageError(f"未対応の保存形式です: {manifest['encoding']}")
+        return json.loads(text)
+
+    def save(self, data: Dict, expected_revision=UNCHECKED) -> Optional[str]:
+        state, logs = split_document(data)
+        with span("sheets.encode"):
+            packed = pack_state(state)
+            revision = content_revision(packed, str(len(logs)), str(logs[-1].get("id") if logs else ""))
+            new_logs, removed_ids = self._diff_logs(logs)
+            manifest, chunks = build_chunks(packed)
+            manifest["encoding"] = STATE_ENCODING
+
+        state_ws = self._state_worksheet()
+        logs_ws = self._logs_worksheet()
+        if expected_revision is not UNCHECKED:
+            # Sheets には条件付き書き込みが無いため、書き込み直前に B1 を確認する
+            (b1,) = self.sheets.batch_get([f"'{state_ws.title}'!B1"])
+            current = str(b1[0][0]) if b1 and b1[0] and b1[0][0] != "" else None
+            if current != expected_revision:
+                raise ConflictError(f"リビジョン不一致: {expected_revision} -> {current}")
+
+        # ログ・マニフェスト・リビジョン・チャンクを1回の batchUpdate で書き込む
+        requests = []
+        log_rows, log_segments = self._log_rows or 0, self._log_segments
+        if removed_ids or self._migrate_logs or log_segments >= MAX_LOG_SEGMENTS:
+            # 書籍削除などでログが消えた場合・旧形式の行がある場合・セグメントが増えすぎた場合は
+            # ログシートを書き直す（余った行は空にする）
+            rows = self._logs_to_rows(logs)
+            stale_logs = max(0, log_rows - len(rows))
+            if rows or stale_logs:
+                requests.append(update_cells(logs_ws.id, 1, 0, rows + [[""] * self.LOG_WIDTH] * stale_logs))
+            log_rows = len(rows)
+            log_segments = len(rows) if self.log_format == "packed" else 0
+        elif new_logs:
+            rows = self._logs_to_rows(new_logs)
+            requests.append(append_cells(logs_ws.id, rows))
+            log_rows += len(rows)
+            log_segments += len(rows) if self.log_format == "packed" else 0
+        stale = max(0, self._chunk_count - len(chunks))
+        requests.append(update_cells(state_ws.id, 0, 0, [[json.dumps(manifest), revision]]))
+        requests.append(update_cells(state_ws.id, 1, 0, [[c] for c in chunks] + [[""]] * stale))
+        self.sheets.batch_update(requests)
+
+        self._chunk_count = len(chunks)
+        self._log_rows, self._log_segments, self._migrate_logs = log_rows, log_segments, False
+        self._remember_logs(new_logs, removed_ids)
+        return revision
+
+    def revision(self) -> Optional[str]:
+        # 旧形式（B1 が空）の場合は None を返し、キャッシュ側は TTL のみで判断する
+        (b1,) = self.sheets.batch_get([f"'{self._state_worksheet().title}'!B1"])
+        return str(b1[0][0]) if b1 and b1[0] and b1[0][0] != "" else None
+
+
+# --- SQLite ---
+BOOK_COLUMNS = ["id", "title", "genre", "max_hp", "current_hp", "price", "status", "rating", "read_count"]
+
+# tenant は複数プレイヤーモードの区画（単一プレイヤーでは空文字）
+SQLITE_SCHEMA_VERSION = 2
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    tenant TEXT NOT NULL DEFAULT '',
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (tenant, key)
+);
+CREATE TABLE IF NOT EXISTS user (
+    tenant TEXT NOT NULL DEFAULT '',
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (tenant, key)
+);
+CREATE TABLE IF NOT EXISTS books (
+    tenant TEXT NOT NULL DEFAULT '',
+    id INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    genre TEXT,
+    max_hp INTEGER,
+    current_hp INTEGER,
+    price INTEGER,
+    status TEXT,
+    rating INTEGER,
+    read_count INTEGER,
+    review TEXT,
+    extra TEXT,
+    PRIMARY KEY (tenant, id)
+);
+CREATE TABLE IF NOT EXISTS logs (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    tenant TEXT NOT NULL DEFAULT '',
+    id TEXT NOT NULL,
+    date TEXT,
+    book_id INTEGER,
+    pages INTEGER,
+    minutes INTEGER,
+    exp_gained INTEGER,
+    rating INTEGER,
+    memo TEXT,
+    extra TEXT,
+    UNIQUE (tenant, id)
+);
+CREATE INDEX IF NOT EXISTS idx_logs_tenant_book_id ON logs(tenant, book_id);
+CREATE INDEX IF NOT EXISTS idx_logs_tenant_date ON logs(tenant, date);
+"""
+SQLITE_TABLES = ("meta", "user", "books", "logs")
+
+
+def _migrate_sqlite(conn: sqlite3.Connection):
+    """tenant 列の無い旧スキーマ（バージョン 0/1）を作り直し、既存の行は単一プレイヤーの区画に移す"""
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    legacy = "books" in tables and "tenant" not in {row[1] for row in conn.execute("PRAGMA table_info(books)")}
+    # バージョン 0 には meta テーブルが無いなど、旧スキーマにあるテーブルだけを移す
+    legacy_tables = [table for table in SQLITE_TABLES if table in tables] if legacy else []
+    # executescript は途中でコミットするため、1文ずつ実行して移行全体を1トランザクションにする
+    conn.execute("BEGIN IMMEDIATE")
+    if legacy:
+        conn.execute("DROP INDEX IF EXISTS idx_logs_book_id")
+        conn.execute("DROP INDEX IF EXISTS idx_logs_date")
+        for table in legacy_tables:
+            conn.execute(f"ALTER TABLE {table} RENAME TO {table}_v1")
+    for statement in SQLITE_SCHEMA.split(";"):
+        if statement.strip():
+            conn.execute(statement)
+    if legacy:
+        for table in legacy_tables:
+            columns = ", ".join(row[1] for row in conn.execute(f"PRAGMA table_info({table}_v1)"))
+            conn.execute(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {table}_v1")
+            conn.execute(f"DROP TABLE {table}_v1")
+    conn.execute(f"PRAGMA user_version = {SQLITE_SCHEMA_VERSION}")
+
+
+def _row_to_record(row: sqlite3.Row, columns: List[str]) -> Dict:
+    """NULL 列は省略し、extra 列を展開して dict に戻す"""
+    record = {col: row[col] for col in columns if row[col] is not None}
+    if row["extra"]:
+        record.update(json.loads(row["extra"]))
+    return record
+
+
+class SQLiteBackend(StorageBackend):
+    """ローカルの SQLite ファイルに user/books/logs をテーブルとして保存するバックエンド"""
+
+    name = "sqlite"
+
+    def __init__(self, path: str, tenant: str = ""):
+        super().__init__()
+        self.path = path
+        self.tenant = tenant
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        # Streamlit はセッションごとにスレッドが異なるため、接続を共有してロックで直列化する
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            if self._conn.execute("PRAGMA user_version").fetchone()[0] < SQLITE_SCHEMA_VERSION:
+                _migrate_sqlite(self._conn)
+
+    def for_tenant(self, tenant: str) -> "SQLiteBackend":
+        """同じ接続とロックを共有し、tenant 列で区切った行だけを読み書きする"""
+        view = copy.copy(self)
+        view.tenant = tenant
+        view._known_log_ids = set()
+        return view
+
+    def _revision(self) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM meta WHERE tenant = ? AND key = 'revision'", (self.tenant,)).fetchone()
+        return row["value"] if row else None
+
+    def revision(self) -> Optional[str]:
+        with self._lock:
+            return self._revision()
+
+    def load(self) -> Tuple[Optional[Dict], Optional[str]]:
+        with self._lock, span("sqlite.query"):
+            revision = self._revision()
+            user_rows = self._conn.execute("SELECT key, value FROM user WHERE tenant = ?", (self.tenant,)).fetchall()
+            book_rows = self._conn.execute("SELECT * FROM books WHERE tenant = ? ORDER BY id", (self.tenant,)).fetchall()
+            log_rows = self._conn.execute("SELECT * FROM logs WHERE tenant = ? ORDER BY seq", (self.tenant,)).fetchall()
+
+        logs = [_row_to_record(row, LOG_COLUMNS) for row in log_rows]
+        self._known_log_ids = {l["id"] for l in logs}
+        if not user_rows and not book_rows and not logs:
+            return None, revision
+
+        books = []
+        for row in book_rows:
+            book = _row_to_record(row, BOOK_COLUMNS)
+            if row["review"]:
+                book["review"] = json.loads(row["review"])
+            books.append(book)
+
+        data = {
+            "user": {row["key"]: json.loads(row["value"]) for row in user_rows},
+            "books": books,
+            "logs": logs,
+        }
+        return data, revision
+
+    def save(self, data: Dict, expected_revision=UNCHECKED) -> Optional[str]:
+        state, logs = split_document(data)
+        new_logs, removed_ids = self._diff_logs(logs)
+
+        tenant = self.tenant
+        user_rows = [(tenant, k, json.dumps(v, ensure_ascii=False)) for k, v in state.get("user", {}).items()]
+        book_rows = [
+            (tenant,) + tuple(b.get(col) for col in BOOK_COLUMNS)
+            + (json.dumps(b["review"], ensure_ascii=False) if "review" in b else None,
+               _split_extra(b, BOOK_COLUMNS, skip=("review",)))
+            for b in state.get("books", [])
+        ]
+        log_rows = [(tenant,) + tuple(l.get(col) for col in LOG_COLUMNS) + (_split_extra(l, LOG_COLUMNS),) for l in new_logs]
+
+        book_sql = f"INSERT INTO books (tenant, {', '.join(BOOK_COLUMNS)}, review, extra) VALUES ({', '.join('?' * (len(BOOK_COLUMNS) + 3))})"
+        log_sql = f"INSERT OR IGNORE INTO logs (tenant, {', '.join(LOG_COLUMNS)}, extra) VALUES ({', '.join('?' * (len(LOG_COLUMNS) + 2))})"
+
+        with self._lock, self._conn:
+            # 書き込みロックを先に取り、リビジョン確認から保存までを1トランザクションで行う
+            self._conn.execute("BEGIN IMMEDIATE")
+            current = self._revision()
+            if expected_revision is not UNCHECKED and current != expected_revision:
+                raise ConflictError(f"リビジョン不一致: {expected_revision} -> {current}")
+            # 可変の状態（user/books）だけを書き直し、ログは差分のみ追記する
+            self._conn.execute("DELETE FROM user WHERE tenant = ?", (tenant,))
+            self._conn.execute("DELETE FROM books WHERE tenant = ?", (tenant,))
+            self._conn.executemany("INSERT INTO user (tenant, key, value) VALUES (?, ?, ?)", user_rows)
+            self._conn.executemany(book_sql, book_rows)
+            if removed_ids:
+                self._conn.executemany("DELETE FROM logs WHERE tenant = ? AND id = ?", [(tenant, i) for i in removed_ids])
+            self._conn.executemany(log_sql, log_rows)
+            self._after_write()
+            revision = str(int(current or 0) + 1)
+            self._conn.execute("INSERT OR REPLACE INTO meta (tenant, key, value) VALUES (?, 'revision', ?)", (tenant, revision))
+
+        self._remember_logs(new_logs, removed_ids)
+        return revision
+
+    def _after_write(self):
+        """サブクラスが同じトランザクション内で追加の書き込みを行うためのフック"""
+
+
+# --- 設定からの生成 ---
+def create_backend(config: Dict, client_factory: Optional[Callable] = None) -> StorageBackend:
+    """設定 dict（backend キー）からバックエンドを生成する"""
+    backend = config.get("backend", "sheets")
+    if backend in ("sheets", "fake_sheets"):
+        if backend == "fake_sheets":
+            # Google に接続せずに動作確認する（プロセス内のメモリにだけ保存）
+            from fake_gspread import FakeClient
+            client_factory = FakeClient.shared
+        return SheetsBackend(SheetsClient(
+            client_factory, config["spreadsheet_name"], spreadsheet_key=config.get("spreadsheet_key"),
+            requests_per_minute=int(config.get("requests_per_minute", REQUESTS_PER_MINUTE)),
+        ), log_format=config.get("log_format", "packed"))
+    if backend == "sqlite":
+        return SQLiteBackend(config["sqlite_path"])
+    if backend == "journal":
+        # ローカルのレプリカで読み書きし、remote（既定は sheets）へはバックグラウンドで同期する
+        from journal import SYNC_INTERVAL, JournaledBackend, LocalReplica
+        remote = create_backend(dict(config, backend=config.get("remote", "sheets")), client_factory)
+        return JournaledBackend(LocalReplica(config["journal_path"]), remote,
+                                sync_interval=float(config.get("sync_interval", SYNC_INTERVAL)))
+    raise ValueError(f"未知のストレージバックエンドです: {backend}")
@@ -0,0 +1,171 @@
+import argparse
+import hashlib
+import hmac
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+from cache import DocumentCache
+from storage import StorageBackend
+
+# --- 複数プレイヤーモード ---
+# 1つのプロセスで多数のプレイヤーを扱うため、読み込んだドキュメントをプレイヤーごとの
+# DocumentCache として保持する。同じプレイヤーの複数セッションは同じキャッシュを共有し、
+# 件数とおおよそのメモリ量の上限を超えたら最近使っていないプレイヤーから捨てる。
+
+MAX_TENANTS = 200
+MAX_BYTES = 256 * 1024 * 1024
+TENANT_ID_LENGTH = 32
+
+# document_size の見積もりに使う1件あたりのバイト数（dict とキー・短い値の文字列を含む）
+BOOK_BYTES = 1500
+LOG_BYTES = 900
+
+_UNSAFE = re.compile(r"[^a-z0-9_-]+")
+
+# ログインを設定していない場合のプレイヤーの確認に使う署名の長さ（HMAC-SHA256 の16進表記の先頭）
+TOKEN_LENGTH = 32
+# 管理者用の合言葉の署名対象（":" はプレイヤーID に使えないので、どのプレイヤーの合言葉とも重ならない）
+ADMIN_SUBJECT = ":admin"
+
+
+def normalize_tenant(raw: str) -> str:
+    """メールアドレスなどをワークシート名・SQLite のキーに使える ID にする
+
+    英小文字・数字・_・- 以外を含む場合や長すぎる場合は、別人と衝突しないよう元の文字列のハッシュを付ける。
+    """
+    raw = (raw or "").strip()
+    if not raw:
+        raise ValueError("プレイヤーIDが空です")
+    tenant = _UNSAFE.sub("_", raw.lower()).strip("_")
+    if tenant != raw or len(tenant) > TENANT_ID_LENGTH:
+        digest = hashlib.sha1(raw.encode("utf-8")).hexdigest()[:8]
+        tenant = f"{tenant[:TENANT_ID_LENGTH - 9]}_{digest}".lstrip("_")
+    return tenant
+
+
+def player_token(secret: str, tenant: str) -> str:
+    """プレイヤーID に対する合言葉（サーバーの秘密鍵による署名）。管理者が発行してプレイヤーに渡す"""
+    if not secret:
+        raise ValueError("player_token_secret が設定されていません")
+    return hmac.new(secret.encode("utf-8"), tenant.encode("utf-8"), hashlib.sha256).hexdigest()[:TOKEN_LENGTH]
+
+
+def verify_player_token(secret: str, tenant: str, token: Optional[str]) -> bool:
+    """合言葉がプレイヤーID に対して発行したものか（秘密鍵が無い場合は常に False）"""
+    if not secret or not token:
+        return False
+    return hmac.compare_digest(player_token(secret, tenant), token.strip().lower())
+
+
+def admin_token(secret: str) -> str:
+    """計測パネルを開くための管理者用の合言葉"""
+    return player_token(secret, ADMIN_SUBJECT)
+
+
+def verify_admin_token(secret: str, token: Optional[str]) -> bool:
+    return verify_player_token(secret, ADMIN_SUBJECT, token)
+
+
+def _review_length(review) -> int:
+    """感想（good/learn/action の dict）の文字数の合計"""
+    if isinstance(review, dict):
+        return sum(len(v) for v in review.values() if isinstance(v, str))
+    return len(review) if isinstance(review, str) else 0
+
+
+def document_size(data: Optional[Dict]) -> int:
+    """ドキュメントがメモリ上で占めるおおよそのバイト数（件数とメモの長さから見積もる）"""
+    if not data:
+        return 0
+    logs = data.get("logs", [])
+    books = data.get("books", [])
+    text = sum(len(l.get("memo") or "") for l in logs) + sum(_review_length(b.get("review")) for b in books)
+    return len(logs) * LOG_BYTES + len(books) * BOOK_BYTES + text * 4
+
+
+class TenantPool:
+    """プレイヤーごとの DocumentCache の LRU。保存待ちの変更があるキャッシュは捨てない"""
+
+    def __init__(self, backend: StorageBackend, ttl: float = 30.0, max_tenants: int = MAX_TENANTS,
+                 max_bytes: int = MAX_BYTES, clock: Callable[[], float] = time.monotonic):
+        self.backend = backend
+        self.ttl = ttl
+        self.max_tenants = max_tenants
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self._caches: "OrderedDict[str, DocumentCache]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, tenant: str) -> DocumentCache:
+        """プレイヤーのキャッシュを返す（無ければ区画を読み書きするバックエンドで作る）"""
+        with self._lock:
+            cache = self._caches.get(tenant)
+            if cache is None:
+                cache = DocumentCache(self.backend.for_tenant(tenant), ttl=self.ttl, clock=self.clock)
+                self._caches[tenant] = cache
+                self._sizes[tenant] = 0
+                self._evict()
+            else:
+                self._caches.move_to_end(tenant)
+            return cache
+
+    def account(self, tenant: str):
+        """読み込み・保存でドキュメントが変わった後にサイズを数え直し、上限を超えていれば追い出す"""
+        with self._lock:
+            cache = self._caches.get(tenant)
+            if cache is not None:
+                self._sizes[tenant] = document_size(cache.data)
+                self._evict()
+
+    def total_bytes(self) -> int:
+        return sum(self._sizes.values())
+
+    def _evict(self):
+        # 最も古いものから調べ、保存待ちのキャッシュと直近に使ったプレイヤーは残す
+        total = self.total_bytes()
+        for tenant in list(self._caches)[:-1]:
+            if len(self._caches) <= self.max_tenants and total <= self.max_bytes:
+                break
+            if self._caches[tenant].dirty:
+                continue
+            del self._caches[tenant]
+            total -= self._sizes.pop(tenant)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "tenants": len(self._caches),
+                "bytes": self.total_bytes(),
+                "evictions": self.evictions,
+                "max_tenants": self.max_tenants,
+                "max_bytes": self.max_bytes,
+            }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="複数プレイヤーモードの合言葉を発行する")
+    parser.add_argument("player", nargs="?", help="プレイヤーID（名前やメールアドレス）")
+    parser.add_argument("--admin", action="store_true", help="計測パネル用の管理者の合言葉を発行する")
+    parser.add_argument("--secret", default=os.environ.get("READINGRPG_PLAYER_SECRET"),
+                        help="secrets の [storage] player_token_secret と同じ値（既定は環境変数 READINGRPG_PLAYER_SECRET）")
+    args = parser.parse_args()
+    if not args.secret:
+        parser.error("--secret か環境変数 READINGRPG_PLAYER_SECRET を指定してください")
+    if args.admin:
+        print(f"?admin={admin_token(args.secret)}")
+        return
+    if not args.player:
+        parser.error("プレイヤーIDか --admin を指定してください")
+    tenant = normalize_tenant(args.player)
+    print(f"?player={tenant}&token={player_token(args.secret, tenant)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+import copy
+
+import pytest
+
+from game import INITIAL_DATA
+from model import Book, GameState, Log
+
+pytest.importorskip("pandas")
+from analytics import compute_analytics # noqa: E402
+
+
+def test_analytics_match_plain_aggregation():
+    state = GameState(copy.deepcopy(INITIAL_DATA))
+    state.add_book(Book(id=1, title="本1", genre="business_basic", max_hp=300, status="active"))
+    state.add_book(Book(id=2, title="本2", genre="novel", max_hp=300, status="active"))
+    logs = [(1, 30, 20, 33), (1, 10, 0, 11), (2, 50, 25, 55), (9, 5, 10, 5)] # book 9 は削除済み
+    for i, (book_id, pages, minutes, exp) in enumerate(logs):
+        state.add_log(Log(id=f"log-{i}", date=f"2024-05-0{i + 1}", book_id=book_id, pages=pages,
+                          minutes=minutes, exp_gained=exp))
+
+    stats = compute_analytics(state)
+    assert stats["total_pages"] == 95
+    assert stats["speed"] == pytest.approx((30 + 50 + 5) / (20 + 25 + 10))
+    genres = stats["genres"]
+    assert list(genres.index) == ["novel", "business_basic", "不明"] # ページ数の多い順
+    assert genres["pages"].to_dict() == {"business_basic": 40, "novel": 50, "不明": 5}
+    assert genres["minutes"].to_dict() == {"business_basic": 20, "novel": 25, "不明": 10}
+    assert genres["exp_gained"].to_dict() == {"business_basic": 44, "novel": 55, "不明": 5}
+    assert genres.loc["business_basic", "speed"] == pytest.approx(40 / 20)
+
+
+def test_analytics_without_minutes():
+    state = GameState(copy.deepcopy(INITIAL_DATA))
+    state.add_book(Book(id=1, title="本", genre="novel", max_hp=100, status="active"))
+    state.add_log(Log(id="a", date="2024-05-01", book_id=1, pages=10))
+    stats = compute_analytics(state)
+    assert stats["speed"] is None
+    assert stats["total_pages"] == 10
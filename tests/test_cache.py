@@ -0,0 +1,56 @@
+import pytest
+
+from cache import DocumentCache
+from storage import StorageError
+
+
+class FlakyBackend:
+    """revision/load を失敗させられるバックエンド"""
+
+    def __init__(self):
+        self.data = {"user": {"level": 3}, "books": [], "logs": []}
+        self.rev = "1"
+        self.fail = False
+
+    def revision(self):
+        if self.fail:
+            raise StorageError("接続エラー")
+        return self.rev
+
+    def load(self):
+        if self.fail:
+            raise StorageError("接続エラー")
+        return self.data, self.rev
+
+
+def test_failed_probe_marks_cache_until_next_successful_load():
+    backend = FlakyBackend()
+    clock = [0.0]
+    cache = DocumentCache(backend, ttl=10.0, clock=lambda: clock[0])
+    assert cache.get() is backend.data
+    assert not cache.failed
+
+    # 一度読み込めたキャッシュでも、その後の確認に失敗したら保存できない状態にする
+    backend.fail = True
+    clock[0] = 20.0
+    with pytest.raises(StorageError):
+        cache.get()
+    assert cache.failed
+    assert cache.checked_at is not None
+
+    backend.fail = False
+    clock[0] = 40.0
+    cache.get()
+    assert not cache.failed
+
+
+def test_failed_reload_marks_cache():
+    backend = FlakyBackend()
+    cache = DocumentCache(backend)
+    cache.get()
+    backend.fail = True
+    with pytest.raises(StorageError):
+        cache.get(force=True)
+    assert cache.failed
+    cache.invalidate()
+    assert not cache.failed
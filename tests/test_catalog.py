@@ -0,0 +1,75 @@
+import json
+import random
+
+import pytest
+
+from catalog import INDEX_SUFFIX, CompiledCatalog, MasterCatalog, load_catalog, normalize_title
+
+WORDS = ["経営", "戦略", "マーケティング", "ファイナンス", "MBA", "ＭＢＡ", "入門", "の", "歴史", "世界", "日本",
+         "Python", "ｐｙｔｈｏｎ", "データ", "分析", " ", "2", "新版"]
+GENRES = ["business_basic", "liberal_history", "it_engineering", "novel"]
+
+
+def make_books(count: int = 400, seed: int = 7):
+    rng = random.Random(seed)
+    return [{"id": i, "title": "".join(rng.choice(WORDS) for _ in range(rng.randint(1, 5))), "genre": rng.choice(GENRES)}
+            for i in range(count)]
+
+
+def linear_search(books, query, genre=None):
+    """前方一致（正規化タイトル順）→ 部分一致（元の順）を全件の走査で求める"""
+    query = normalize_title(query)
+    titles = [normalize_title(b["title"]) for b in books]
+    candidates = [i for i in range(len(books)) if genre is None or books[i]["genre"] == genre]
+    if not query:
+        return candidates
+    prefix = sorted((i for i in candidates if titles[i].startswith(query)), key=lambda i: (titles[i], i))
+    return prefix + [i for i in candidates if query in titles[i] and not titles[i].startswith(query)]
+
+
+QUERIES = ["", "経", "経営", "営戦", "mba", "ＭＢＡ入門", "python", "データ分析", "の歴", "2新", "存在しない", "世界 の"]
+
+
+@pytest.mark.parametrize("genre", [None, "novel", "unknown"])
+def test_index_search_matches_linear_scan(genre):
+    books = make_books()
+    catalog = MasterCatalog(books)
+    for query in QUERIES:
+        expected = linear_search(books, query, genre)
+        assert catalog.search(query, genre=genre, limit=len(books)) == (expected, len(expected)), query
+
+
+def test_search_pages_through_results():
+    books = make_books()
+    catalog = MasterCatalog(books)
+    expected = linear_search(books, "営")
+    pages = [catalog.search("営", offset=offset, limit=25)[0] for offset in range(0, len(expected), 25)]
+    assert [i for page in pages for i in page] == expected
+
+
+def test_compiled_index_matches_in_memory_catalog(tmp_path):
+    books = make_books()
+    path = tmp_path / "master.json"
+    path.write_text(json.dumps(books, ensure_ascii=False), encoding="utf-8")
+    compiled = load_catalog(str(path))
+    assert isinstance(compiled, CompiledCatalog)
+    assert (tmp_path / ("master.json" + INDEX_SUFFIX)).exists()
+
+    catalog = MasterCatalog(books)
+    assert len(compiled) == len(catalog)
+    assert [compiled.books[i] for i in range(len(books))] == books
+    assert [compiled.label(i) for i in range(len(books))] == [catalog.label(i) for i in range(len(books))]
+    for genre in [None, "novel", "unknown"]:
+        for query in QUERIES:
+            assert compiled.search(query, genre=genre, limit=len(books)) == catalog.search(query, genre=genre, limit=len(books))
+
+
+def test_stale_index_is_rebuilt(tmp_path):
+    path = tmp_path / "master.json"
+    path.write_text(json.dumps(make_books(50), ensure_ascii=False), encoding="utf-8")
+    load_catalog(str(path))
+    books = make_books(60, seed=8)
+    path.write_text(json.dumps(books, ensure_ascii=False), encoding="utf-8")
+    compiled = load_catalog(str(path))
+    assert len(compiled) == 60
+    assert compiled.search("経営", limit=60)[0] == linear_search(books, "経営")
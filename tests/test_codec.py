@@ -0,0 +1,40 @@
+import uuid
+
+from codec import pack_log_segments, pack_logs, pack_state, unpack_logs, unpack_state
+
+
+def test_logs_round_trip_with_uuid_ids():
+    logs = [
+        {"id": str(uuid.uuid4()), "date": "2024-05-01", "book_id": 1, "pages": 10, "minutes": 15, "exp_gained": 11},
+        {"id": str(uuid.uuid4()), "date": "2024-05-03", "book_id": 2, "pages": 5, "memo": "メモ", "source": "import"},
+        {"id": str(uuid.uuid4()), "date": "2023-12-31", "book_id": 1, "pages": 1, "rating": 4},
+    ]
+    assert unpack_logs(pack_logs(logs)) == logs
+
+
+def test_logs_round_trip_with_irregular_values():
+    logs = [
+        {"id": "log-1", "date": "2024-1-5", "book_id": 1, "pages": 3},
+        {"id": "log-2", "book_id": 1, "pages": 4},
+        {"date": "2024-02-29", "pages": 0},
+    ]
+    assert unpack_logs(pack_logs(logs)) == logs
+    assert unpack_logs(pack_logs([])) == []
+
+
+def test_log_segments_fit_and_concatenate():
+    logs = [{"id": str(uuid.uuid4()), "date": f"2024-{m:02d}-{d:02d}", "book_id": d % 7, "pages": d * m,
+             "memo": "感想" * (d % 5)} for m in range(1, 13) for d in range(1, 29)]
+    segments = pack_log_segments(logs, max_length=2000, size=200)
+    assert len(segments) > 1
+    assert all(len(s) <= 2000 for s in segments)
+    assert [l for s in segments for l in unpack_logs(s)] == logs
+
+
+def test_state_round_trip():
+    state = {
+        "user": {"level": 3, "exp": 120, "weapons": ["剣"]},
+        "books": [{"id": 1, "title": "本", "genre": "business"}, {"id": 2, "title": "別の本", "genre": "novel"},
+                  {"id": 3, "title": "ジャンルなし"}, {"id": 4, "title": "同じジャンル", "genre": "business"}],
+    }
+    assert unpack_state(pack_state(state)) == state
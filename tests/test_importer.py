@@ -0,0 +1,74 @@
+import copy
+import io
+import json
+
+from game import INITIAL_DATA, record_reading
+from importer import run_import
+from model import Book, GameState
+
+
+def make_state() -> GameState:
+    state = GameState(copy.deepcopy(INITIAL_DATA))
+    state.add_book(Book(id=1, title="本", genre="liberal_history", max_hp=300, status="active"))
+    return state
+
+
+def jsonl(*records) -> io.BytesIO:
+    return io.BytesIO("\n".join(json.dumps(r, ensure_ascii=False) for r in records).encode("utf-8"))
+
+
+def test_importing_old_logs_keeps_the_streak():
+    state = make_state()
+    state.user.update(combo=3, last_read_date="2026-10-12")
+    state, report = run_import(state, jsonl({"date": "2019-01-01", "book_id": 1, "pages": 10},
+                                            {"date": "2019-01-02", "book_id": 1, "pages": 10}), "logs.jsonl", "logs")
+    assert report["imported"] == 2
+    assert (state.user["combo"], state.user["last_read_date"]) == (3, "2026-10-12")
+
+    record_reading(state, state.book(1), 10, read_date="2026-10-13")
+    assert state.user["combo"] == 4
+
+
+def csv_bytes(text: str) -> io.BytesIO:
+    return io.BytesIO(text.encode("utf-8-sig"))
+
+
+def test_imported_logs_match_recorded_logs():
+    logs = [("2024-05-01", 1, 40, 30), ("2024-05-02", 1, 80, 45), ("2024-05-02", 2, 20, 0),
+            ("2024-05-05", 1, 50, 20), ("2024-05-06", 2, 100, 60)]
+    state = make_state()
+    state, report = run_import(state, csv_bytes("title,genre,pages,price\n新しい本,business_basic,100,1500\n"),
+                               "books.csv", "books")
+    assert report["imported"] == 1
+    expected = GameState(copy.deepcopy(state.to_dict()))
+
+    lines = "date,book_id,pages,minutes,id\n" + "".join(f"{d},{b},{p},{m},log-{i}\n" for i, (d, b, p, m) in enumerate(logs))
+    state, report = run_import(state, csv_bytes(lines), "logs.csv", "logs")
+    assert (report["imported"], report["error_count"]) == (len(logs), 0)
+
+    for i, (d, b, p, m) in enumerate(logs):
+        book = expected.book(b)
+        if book.current_hp <= 0:
+            expected.update_book(book, status="reread", current_hp=book.max_hp)
+        record_reading(expected, book, min(p, book.current_hp), minutes=m, read_date=d, log_id=f"log-{i}")
+    assert state.to_dict() == expected.to_dict()
+    assert report["completed"] == 1
+
+
+def test_invalid_rows_dry_run_and_reimport():
+    state = make_state()
+    before = copy.deepcopy(state.to_dict())
+    records = jsonl({"date": "2024-05-01", "book_id": 1, "pages": 10, "id": "a"},
+                    {"date": "05/02/2024", "book_id": 1, "pages": 10},
+                    {"date": "2024-05-02", "book_id": 9, "pages": 10},
+                    {"date": "2024-05-03", "title": "本", "pages": 0})
+    preview, report = run_import(state, records, "logs.jsonl", "logs", dry_run=True)
+    assert report["imported"] == 1
+    assert [line for line, _ in report["errors"]] == [2, 3, 4]
+    assert state.to_dict() == before
+    assert len(preview.logs) == 1
+
+    state, _ = run_import(state, jsonl({"date": "2024-05-01", "book_id": 1, "pages": 10, "id": "a"}), "logs.jsonl", "logs")
+    state, report = run_import(state, jsonl({"date": "2024-05-01", "book_id": 1, "pages": 10, "id": "a"}), "logs.jsonl", "logs")
+    assert (report["imported"], report["skipped"]) == (0, 1)
+    assert len(state.logs) == 1
@@ -0,0 +1,118 @@
+import pytest
+
+from fake_gspread import FakeClient
+from journal import JournaledBackend, LocalReplica
+from sheets_client import SheetsClient
+from storage import SheetsBackend
+
+
+class FlakyRemote:
+    """fail が立っている間は通信エラーになるリモート"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.fail = False
+
+    def _check(self):
+        if self.fail:
+            raise ConnectionError("offline")
+
+    def load(self):
+        self._check()
+        return self.backend.load()
+
+    def revision(self):
+        self._check()
+        return self.backend.revision()
+
+    def save(self, data, expected_revision=None):
+        self._check()
+        return self.backend.save(data, expected_revision=expected_revision)
+
+
+def document():
+    return {
+        "user": {"level": 1, "exp": 0, "weapons": []},
+        "books": [{"id": 1, "title": "本", "genre": "liberal_history", "max_hp": 100, "current_hp": 100,
+                   "status": "active", "read_count": 0}],
+        "logs": [],
+    }
+
+
+@pytest.fixture
+def setup(tmp_path):
+    client = FakeClient()
+    sheets = SheetsBackend(SheetsClient(lambda: client, "ReadingRPG_Test", sleep=lambda seconds: None))
+    remote = FlakyRemote(sheets)
+    backend = JournaledBackend(LocalReplica(str(tmp_path / "local.sqlite3")), remote)
+    return backend, remote, sheets
+
+
+def test_pending_ops_are_replayed_after_failed_sync(setup):
+    backend, remote, sheets = setup
+    backend.save(document())
+    backend.sync()
+    assert backend.local.pending_count() == 0
+
+    data, revision = backend.load()
+    data["books"][0]["current_hp"] = 90
+    data["logs"].append({"id": "a", "date": "2024-05-01", "book_id": 1, "pages": 10})
+    revision = backend.save(data, expected_revision=revision)
+
+    remote.fail = True
+    with pytest.raises(ConnectionError):
+        backend.sync()
+    assert backend.local.pending_count() > 0
+
+    # 通信できない間の記録もジャーナルに溜まる
+    data, revision = backend.load()
+    data["logs"].append({"id": "b", "date": "2024-05-02", "book_id": 1, "pages": 5})
+    backend.save(data, expected_revision=revision)
+
+    remote.fail = False
+    backend.sync()
+    assert backend.local.pending_count() == 0
+    stored, _ = sheets.load()
+    assert {l["id"] for l in stored["logs"]} == {"a", "b"}
+    assert stored["books"][0]["current_hp"] == 90
+
+
+def test_ops_are_applied_on_top_of_remote_changes(setup):
+    backend, remote, sheets = setup
+    backend.save(document())
+    backend.sync()
+
+    # 別の端末がリモートに記録を追加する
+    theirs, theirs_revision = sheets.load()
+    theirs["logs"].append({"id": "remote", "date": "2024-05-01", "book_id": 1, "pages": 30})
+    sheets.save(theirs, expected_revision=theirs_revision)
+
+    data, revision = backend.load()
+    data["logs"].append({"id": "local", "date": "2024-05-01", "book_id": 1, "pages": 10})
+    backend.save(data, expected_revision=revision)
+    backend.sync()
+
+    stored, _ = sheets.load()
+    local, _ = backend.load()
+    assert {l["id"] for l in stored["logs"]} == {"remote", "local"}
+    assert {l["id"] for l in local["logs"]} == {"remote", "local"}
+
+
+def test_damage_from_two_devices_is_added(setup, tmp_path):
+    backend, remote, sheets = setup
+    backend.save(document())
+    backend.sync()
+    other = JournaledBackend(LocalReplica(str(tmp_path / "other.sqlite3")), FlakyRemote(sheets))
+    other.sync()
+
+    for device, log_id, pages in ((backend, "a", 10), (other, "b", 20)):
+        data, revision = device.load()
+        data["books"][0]["current_hp"] -= pages
+        data["logs"].append({"id": log_id, "date": "2024-05-01", "book_id": 1, "pages": pages})
+        device.save(data, expected_revision=revision)
+    backend.sync()
+    other.sync()
+
+    stored, _ = sheets.load()
+    assert {l["id"] for l in stored["logs"]} == {"a", "b"}
+    assert stored["books"][0]["current_hp"] == 70
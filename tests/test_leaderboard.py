@@ -0,0 +1,42 @@
+import copy
+from datetime import date
+
+from game import INITIAL_DATA, record_reading
+from leaderboard import Leaderboard
+from model import Book, GameState, Log
+
+
+def make_state() -> GameState:
+    state = GameState(copy.deepcopy(INITIAL_DATA))
+    state.add_book(Book(id=1, title="本", genre="liberal_history", max_hp=100, status="active"))
+    return state
+
+
+def test_record_reading_result_feeds_leaderboard():
+    state = make_state()
+    board = Leaderboard(today=lambda: date(2024, 5, 2))
+    book = state.book(1)
+
+    result = record_reading(state, book, 30, read_date="2024-05-02")
+    log = result["log"]
+    assert isinstance(log, Log)
+    board.record("alice", state, log.date, log.pages, result["exp_gained"], book.genre)
+
+    assert board.top("pages", "all") == [("alice", 30)]
+    assert board.top("exp", "day") == [("alice", result["exp_gained"])]
+    assert board.rank("alice", "pages", "all")[0] == 1
+
+
+def test_incremental_record_matches_rebuild():
+    state = make_state()
+    board = Leaderboard(today=lambda: date(2024, 5, 3))
+    book = state.book(1)
+    for day, pages in (("2024-05-01", 10), ("2024-05-02", 20), ("2024-05-03", 5)):
+        result = record_reading(state, book, pages, read_date=day)
+        board.record("alice", state, result["log"].date, result["log"].pages, result["exp_gained"], book.genre)
+
+    rebuilt = Leaderboard(today=lambda: date(2024, 5, 3))
+    rebuilt.sync("alice", state)
+    for metric in ("pages", "exp", "streak"):
+        for window in ("day", "week", "all"):
+            assert board.top(metric, window) == rebuilt.top(metric, window)
@@ -0,0 +1,50 @@
+import pytest
+
+from game import calculate_level_up
+from levels import FlatCurve, LinearCurve, PolynomialCurve, TableCurve, make_curve
+
+CURVES = [
+    FlatCurve(250),
+    FlatCurve(7),
+    LinearCurve(250, 10),
+    LinearCurve(100, 0),
+    LinearCurve(3, 7),
+    PolynomialCurve(250, 1.5, 2.0),
+    TableCurve([100, 150, 225, 300]),
+]
+
+
+def level_by_loop(curve, total_exp):
+    """1レベルずつ必要 EXP を引いていく従来の計算"""
+    level, exp = 1, total_exp
+    while exp >= curve.required(level):
+        exp -= curve.required(level)
+        level += 1
+    return level, exp
+
+
+@pytest.mark.parametrize("curve", CURVES, ids=lambda c: type(c).__name__)
+def test_level_for_matches_loop(curve):
+    for total_exp in list(range(0, 3000)) + [10 ** 5, 10 ** 6 + 17, 12_345_678]:
+        assert curve.level_for(total_exp) == level_by_loop(curve, total_exp), total_exp
+
+
+@pytest.mark.parametrize("curve", CURVES, ids=lambda c: type(c).__name__)
+def test_total_for_is_sum_of_required(curve):
+    total = 0
+    for level in range(1, 300):
+        assert curve.total_for(level) == total
+        assert curve.level_for(total) == (level, 0)
+        total += curve.required(level)
+
+
+def test_default_curve_matches_old_level_up():
+    """既定（毎レベル250）は、上がるたびに next_level_exp を 250 にしていた元の計算と同じ"""
+    for exp, gained in [(0, 0), (249, 1), (10, 1000), (120, 250 * 40 + 3)]:
+        user = {"level": 5, "exp": exp, "next_level_exp": 250}
+        calculate_level_up(user, gained, make_curve(None))
+        level, remainder = 5, exp + gained
+        while remainder >= 250:
+            remainder -= 250
+            level += 1
+        assert (user["level"], user["exp"], user["next_level_exp"]) == (level, remainder, 250)
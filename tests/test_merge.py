@@ -0,0 +1,102 @@
+import copy
+
+import pytest
+
+from fake_gspread import FakeClient
+from levels import get_curve
+from merge import make_base, merge_documents, save_with_retry
+from sheets_client import SheetsClient
+from storage import ConflictError, SheetsBackend
+
+
+def document(**book_changes):
+    book = {"id": 1, "title": "本", "genre": "liberal_history", "max_hp": 100, "current_hp": 100,
+            "status": "active", "read_count": 0}
+    book.update(book_changes)
+    return {"user": {"level": 1, "exp": 0, "total_hours": 0.0, "weapons": []}, "books": [book], "logs": []}
+
+
+def test_damage_from_both_sessions_is_added():
+    base_doc = document()
+    mine = document(current_hp=90)
+    theirs = document(current_hp=80)
+    merged = merge_documents(make_base(base_doc), mine, theirs)
+    assert merged["books"][0]["current_hp"] == 70
+
+
+def test_hp_is_clamped_and_read_count_adds():
+    base_doc = document(current_hp=30, read_count=1)
+    mine = document(current_hp=0, read_count=2, status="completed")
+    theirs = document(current_hp=0, read_count=2, status="completed")
+    merged = merge_documents(make_base(base_doc), mine, theirs)
+    book = merged["books"][0]
+    assert book["current_hp"] == 0
+    assert book["read_count"] == 3
+    assert book["status"] == "completed"
+
+
+def test_scalar_fields_keep_last_writer_wins():
+    base_doc = document()
+    mine = document(title="新しい題名")
+    theirs = document(status="reread")
+    merged = merge_documents(make_base(base_doc), mine, theirs)
+    book = merged["books"][0]
+    assert book["title"] == "新しい題名"
+    assert book["status"] == "reread"
+    assert book["current_hp"] == 100
+
+
+def test_user_exp_and_logs_from_both_sessions_are_kept():
+    base_doc = document()
+    mine, theirs = copy.deepcopy(base_doc), copy.deepcopy(base_doc)
+    mine["user"].update(exp=100, total_hours=0.5)
+    mine["logs"] = [{"id": "a", "book_id": 1, "pages": 10}]
+    theirs["user"].update(exp=get_curve().required(1) - 50, total_hours=1.0)
+    theirs["logs"] = [{"id": "b", "book_id": 1, "pages": 20}]
+    merged = merge_documents(make_base(base_doc), mine, theirs)
+    total = get_curve().total_for(merged["user"]["level"]) + merged["user"]["exp"]
+    assert total == 100 + get_curve().required(1) - 50
+    assert merged["user"]["total_hours"] == 1.5
+    assert {l["id"] for l in merged["logs"]} == {"a", "b"}
+
+
+def make_backend(client: FakeClient) -> SheetsBackend:
+    return SheetsBackend(SheetsClient(lambda: client, "ReadingRPG_Test", sleep=lambda seconds: None))
+
+
+def damage(data, log_id, pages):
+    data["books"][0]["current_hp"] -= pages
+    data["logs"].append({"id": log_id, "date": "2024-05-01", "book_id": 1, "pages": pages})
+
+
+def test_stale_revision_is_rejected():
+    client = FakeClient()
+    first, second = make_backend(client), make_backend(client)
+    first.save(document())
+    data, revision = first.load()
+    other, other_revision = second.load()
+
+    damage(data, "a", 10)
+    first.save(data, expected_revision=revision)
+    damage(other, "b", 20)
+    with pytest.raises(ConflictError):
+        second.save(other, expected_revision=other_revision)
+
+
+def test_save_with_retry_merges_concurrent_edits():
+    client = FakeClient()
+    first, second = make_backend(client), make_backend(client)
+    first.save(document())
+    mine, revision = first.load()
+    base = make_base(copy.deepcopy(mine))
+    theirs, theirs_revision = second.load()
+
+    damage(theirs, "theirs", 20)
+    second.save(theirs, expected_revision=theirs_revision)
+    damage(mine, "mine", 10)
+    saved, _ = save_with_retry(first, mine, base, revision, sleep=lambda seconds: None)
+
+    stored, _ = make_backend(client).load()
+    assert saved["books"][0]["current_hp"] == 70
+    assert stored["books"][0]["current_hp"] == 70
+    assert {l["id"] for l in stored["logs"]} == {"mine", "theirs"}
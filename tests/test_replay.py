@@ -0,0 +1,56 @@
+import copy
+from datetime import date, timedelta
+
+from game import INITIAL_DATA, record_reading
+from model import Book, GameState
+from replay import apply_replay, replay
+
+
+def make_state() -> GameState:
+    state = GameState(copy.deepcopy(INITIAL_DATA))
+    for book_id, genre in ((1, "liberal_history"), (2, "business"), (3, "novel")):
+        state.add_book(Book(id=book_id, title=f"本{book_id}", genre=genre, max_hp=120, price=1000, status="active"))
+    return state
+
+
+def read_days(state: GameState, first: date, days: int):
+    """1日おき・連日を混ぜて3冊を順に読む"""
+    for i in range(days):
+        day = (first + timedelta(days=i + i // 5)).isoformat()
+        book = state.book(i % 3 + 1)
+        if book.current_hp <= 0:
+            state.update_book(book, status="reread", current_hp=book.max_hp)
+        record_reading(state, book, 15 + i % 20, minutes=10, read_date=day)
+
+
+def test_replay_matches_recorded_state():
+    state = make_state()
+    read_days(state, date(2024, 1, 1), 60)
+    fold, _ = replay(state)
+    assert apply_replay(state, fold) == {}
+
+
+def test_replay_from_snapshot_matches_full_replay():
+    state = make_state()
+    read_days(state, date(2024, 1, 1), 45)
+    _, snapshots = replay(state, snapshot_every=10)
+    assert [s.count for s in snapshots] == [10, 20, 30, 40]
+
+    read_days(state, date(2024, 4, 1), 12)
+    resumed, kept = replay(state, snapshots, snapshot_every=10)
+    full, _ = replay(state, snapshot_every=10)
+    assert resumed.user == full.user
+    assert resumed.books == full.books
+    assert resumed.genre_reads == full.genre_reads
+    assert [s.count for s in kept] == [10, 20, 30, 40, 50]
+
+
+def test_backdated_log_replays_from_scratch():
+    state = make_state()
+    read_days(state, date(2024, 3, 1), 30)
+    _, snapshots = replay(state, snapshot_every=10)
+    record_reading(state, state.book(2), 5, read_date="2024-01-15") # 最後のスナップショットより前の日付
+    resumed, _ = replay(state, snapshots, snapshot_every=10)
+    full, _ = replay(state, snapshot_every=10)
+    assert resumed.user == full.user
+    assert resumed.books == full.books
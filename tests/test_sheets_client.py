@@ -0,0 +1,71 @@
+import pytest
+
+from fake_gspread import FakeAPIError, FakeClient
+from sheets_client import RATE_LIMIT_RETRIES, SheetsClient
+
+
+def test_rate_limited_call_is_retried():
+    sleeps = []
+    sheets = SheetsClient(FakeClient, "ReadingRPG_Test", sleep=sleeps.append)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise FakeAPIError(429, "quota")
+        return "ok"
+
+    assert sheets.call("values_get", flaky) == "ok"
+    assert len(attempts) == 3
+    assert sheets.metrics()["values_get"]["rate_limited"] == 2
+    assert sleeps[-2:] == [1, 2] # 指数バックオフ
+
+
+def test_rate_limited_call_raises_after_retries():
+    sheets = SheetsClient(FakeClient, "ReadingRPG_Test", sleep=lambda seconds: None)
+    attempts = []
+
+    def always_limited():
+        attempts.append(1)
+        raise FakeAPIError(429, "quota")
+
+    with pytest.raises(FakeAPIError):
+        sheets.call("values_get", always_limited)
+    assert len(attempts) == RATE_LIMIT_RETRIES + 1
+
+
+def test_other_errors_are_not_retried():
+    sheets = SheetsClient(FakeClient, "ReadingRPG_Test", sleep=lambda seconds: None)
+    attempts = []
+
+    def forbidden():
+        attempts.append(1)
+        raise FakeAPIError(403, "forbidden")
+
+    with pytest.raises(FakeAPIError):
+        sheets.call("values_get", forbidden)
+    assert len(attempts) == 1
+    assert sheets.metrics()["values_get"]["errors"] == 1
+
+
+def test_missing_worksheet_is_created():
+    sheets = SheetsClient(FakeClient, "ReadingRPG_Test", sleep=lambda seconds: None)
+    created = []
+    worksheet = sheets.worksheet("logs", create=lambda s: created.append(1) or s.spreadsheet().add_worksheet("logs", 1, 1))
+    assert created == [1]
+    assert worksheet.title == "logs"
+
+
+@pytest.mark.parametrize("status", [429, 403, 500])
+def test_worksheet_errors_do_not_create_a_sheet(status):
+    sheets = SheetsClient(FakeClient, "ReadingRPG_Test", sleep=lambda seconds: None)
+    spreadsheet = sheets.spreadsheet()
+
+    def failing(title):
+        raise FakeAPIError(status, "error")
+
+    spreadsheet.worksheet = failing
+    created = []
+    with pytest.raises(FakeAPIError):
+        sheets.worksheet("logs", create=lambda s: created.append(1))
+    assert created == []
@@ -0,0 +1,77 @@
+import copy
+import random
+
+import pytest
+
+from catalog import normalize_title
+from game import INITIAL_DATA
+from model import Book, GameState, Log
+from shelf import SORT_KEYS, STATUS_ORDER, LogIndex, ShelfIndex, progress
+
+
+def make_state(seed: int = 3) -> GameState:
+    rng = random.Random(seed)
+    state = GameState(copy.deepcopy(INITIAL_DATA))
+    for book_id in range(1, 41):
+        max_hp = rng.randint(50, 300)
+        state.add_book(Book(id=book_id, title=f"{rng.choice('あいうえおABC')}本{rng.randint(1, 9)}",
+                            genre=rng.choice(["business_basic", "novel", "liberal_history"]), max_hp=max_hp,
+                            current_hp=rng.randint(0, max_hp), status=rng.choice(list(STATUS_ORDER))))
+    for i in range(300):
+        date = None if i % 50 == 0 else f"2024-{rng.randint(1, 6):02d}-{rng.randint(1, 28):02d}"
+        state.add_log(Log(id=f"log-{i}", date=date, book_id=rng.randint(1, 42), pages=rng.randint(1, 30)))
+    return state
+
+
+def sort_key(state: GameState, sort: str):
+    last_read = {}
+    for log in state.logs:
+        if log.date and log.date > last_read.get(log.book_id, ""):
+            last_read[log.book_id] = log.date
+    return {
+        "title": lambda b: (normalize_title(b.title), b.id),
+        "status": lambda b: (STATUS_ORDER[b.status], normalize_title(b.title)),
+        "genre": lambda b: (b.genre, normalize_title(b.title)),
+        "progress": lambda b: (progress(b), normalize_title(b.title)),
+        "last_read": lambda b: (last_read.get(b.id, ""), normalize_title(b.title)),
+    }[sort]
+
+
+@pytest.mark.parametrize("sort", SORT_KEYS)
+@pytest.mark.parametrize("status", [None, "active", "completed"])
+def test_shelf_pages_match_sorting_everything(sort, status):
+    state = make_state()
+    expected = sorted((b for b in state.books.values() if status is None or b.status == status), key=sort_key(state, sort))
+    index = ShelfIndex(state)
+    for descending in (False, True):
+        ordered = expected[::-1] if descending else expected
+        pages = [index.page(status, sort, descending, offset, 7) for offset in range(0, len(ordered) + 7, 7)]
+        assert all(total == len(ordered) for _, total in pages)
+        assert [b.id for books, _ in pages for b in books] == [b.id for b in ordered]
+
+
+@pytest.mark.parametrize("start,end,book_id", [(None, None, None), ("2024-02-01", "2024-03-15", None),
+                                               ("2024-03-01", None, 5), (None, "2024-01-31", 41), (None, None, 99)])
+def test_log_query_matches_filtering_everything(start, end, book_id):
+    state = make_state()
+    ordered = sorted(state.logs, key=lambda l: l.date or "")
+    expected = [l for l in ordered if (not start or (l.date or "") >= start) and (not end or (l.date or "") <= end)
+                and (book_id is None or l.book_id == book_id)]
+    index = LogIndex(state)
+    for newest_first in (True, False):
+        rows = []
+        offset = 0
+        while True:
+            page, total = index.query(start, end, book_id, offset=offset, limit=11, newest_first=newest_first)
+            assert total == len(expected)
+            if not page:
+                break
+            rows.extend(log for log, _ in page)
+            offset += 11
+        assert [l.id for l in rows] == [l.id for l in (expected[::-1] if newest_first else expected)]
+
+
+def test_log_index_date_range_skips_undated_logs():
+    state = make_state()
+    dates = sorted(l.date for l in state.logs if l.date)
+    assert LogIndex(state).date_range() == (dates[0], dates[-1])
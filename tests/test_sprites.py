@@ -0,0 +1,26 @@
+import struct
+import zlib
+
+from sprites import SpriteCache
+
+
+def tiny_png() -> bytes:
+    """1x1 の PNG（Pillow が無くても作れるように手で組み立てる）"""
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    header = struct.pack(">IIBBBBB", 1, 1, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(b"\x00\xff\x00\x00")) + chunk(b"IEND", b"")
+
+
+def test_sprites_are_rendered_on_first_get(tmp_path):
+    hero = tmp_path / "hero.png"
+    hero.write_bytes(tiny_png())
+    sprites = SpriteCache(str(tmp_path))
+    assert sprites.memory_bytes() == 0 # 起動時には縮小しない
+
+    path = sprites.resolve(str(tmp_path / "missing.png"), str(hero))
+    assert path == str(hero)
+    first = sprites.get(path, 100)
+    assert sprites.memory_bytes() == len(first)
+    hero.write_bytes(b"")
+    assert sprites.get(path, 100) is first
@@ -0,0 +1,32 @@
+import copy
+
+from game import INITIAL_DATA, record_reading
+from model import Book, GameState
+from stats import STATS_KEY, rebuild_stats, verify_stats
+
+
+def test_counters_updated_on_write_match_rebuild():
+    state = GameState(copy.deepcopy(INITIAL_DATA))
+    for book_id, genre in ((1, "business_basic"), (2, "liberal_history"), (3, "business_basic")):
+        state.add_book(Book(id=book_id, title=f"本{book_id}", genre=genre, max_hp=50, price=800, status="active"))
+    for day, book_id, pages in (("2024-05-01", 1, 30), ("2024-05-02", 1, 30), ("2024-05-02", 2, 50),
+                                ("2024-05-03", 3, 10)):
+        record_reading(state, state.book(book_id), pages, minutes=20, read_date=day)
+    assert state.stats["completed"] == 2
+    assert verify_stats(state.to_dict()) == {}
+
+    # 再読・ジャンル変更・削除でも差分の更新が作り直した値と一致する
+    state.update_book(state.book(1), status="reread", current_hp=50)
+    state.update_book(state.book(2), genre="novel")
+    state.remove_book(3)
+    assert verify_stats(state.to_dict()) == {}
+    assert state.stats == rebuild_stats(state.to_dict())
+
+
+def test_missing_stats_are_rebuilt_on_load():
+    state = GameState(copy.deepcopy(INITIAL_DATA))
+    state.add_book(Book(id=1, title="本", genre="business_basic", max_hp=20, status="active"))
+    record_reading(state, state.book(1), 20, read_date="2024-05-01")
+    data = copy.deepcopy(state.to_dict())
+    expected = data["user"].pop(STATS_KEY)
+    assert GameState(data).stats == expected
@@ -0,0 +1,39 @@
+import json
+import sqlite3
+
+from storage import SQLITE_SCHEMA_VERSION, SQLiteBackend
+
+# user-001 の時点のスキーマ（tenant 列も meta テーブルも無い）
+V1_SCHEMA = """
+CREATE TABLE user (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE books (id INTEGER PRIMARY KEY, title TEXT NOT NULL, genre TEXT, max_hp INTEGER, current_hp INTEGER,
+                    price INTEGER, status TEXT, rating INTEGER, read_count INTEGER, review TEXT, extra TEXT);
+CREATE TABLE logs (seq INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT NOT NULL UNIQUE, date TEXT, book_id INTEGER,
+                   pages INTEGER, minutes INTEGER, exp_gained INTEGER, rating INTEGER, memo TEXT, extra TEXT);
+CREATE INDEX idx_logs_book_id ON logs(book_id);
+CREATE INDEX idx_logs_date ON logs(date);
+"""
+
+
+def test_migrate_from_v1_schema_without_meta(tmp_path):
+    path = str(tmp_path / "v1.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(V1_SCHEMA)
+    conn.execute("INSERT INTO user VALUES ('level', ?)", (json.dumps(3),))
+    conn.execute("INSERT INTO books (id, title, genre, max_hp, current_hp, status) VALUES (1, '本', 'ビジネス', 100, 40, 'reading')")
+    conn.execute("INSERT INTO logs (id, date, book_id, pages) VALUES ('log-1', '2024-01-01', 1, 60)")
+    conn.commit()
+    conn.close()
+
+    backend = SQLiteBackend(path)
+    data, revision = backend.load()
+    assert data["user"]["level"] == 3
+    assert [(b["id"], b["current_hp"]) for b in data["books"]] == [(1, 40)]
+    assert [(l["id"], l["pages"]) for l in data["logs"]] == [("log-1", 60)]
+
+    data["books"][0]["current_hp"] = 10
+    backend.save(data, expected_revision=revision)
+    assert backend.load()[0]["books"][0]["current_hp"] == 10
+    assert backend._conn.execute("PRAGMA user_version").fetchone()[0] == SQLITE_SCHEMA_VERSION
+    tables = {row[0] for row in backend._conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert not any(t.endswith("_v1") for t in tables)
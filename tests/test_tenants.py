@@ -0,0 +1,26 @@
+from tenants import (BOOK_BYTES, admin_token, document_size, normalize_tenant, player_token, verify_admin_token,
+                     verify_player_token)
+
+
+def test_document_size_counts_review_text():
+    review = {"good": "あ" * 100, "learn": "い" * 50, "action": ""}
+    data = {"books": [{"id": 1, "review": review}], "logs": []}
+    assert document_size(data) == BOOK_BYTES + 150 * 4
+
+
+def test_player_token_is_bound_to_player_and_secret():
+    tenant = normalize_tenant("alice@example.com")
+    token = player_token("s3cret", tenant)
+    assert verify_player_token("s3cret", tenant, token)
+    assert not verify_player_token("s3cret", normalize_tenant("bob@example.com"), token)
+    assert not verify_player_token("other", tenant, token)
+    assert not verify_player_token("s3cret", tenant, None)
+    assert not verify_player_token("", tenant, token)
+
+
+def test_admin_token_differs_from_every_player_token():
+    token = admin_token("s3cret")
+    assert verify_admin_token("s3cret", token)
+    assert not verify_admin_token("s3cret", player_token("s3cret", normalize_tenant("admin")))
+    assert not verify_admin_token("s3cret", "1")
+    assert not verify_admin_token(None, token)
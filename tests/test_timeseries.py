@@ -0,0 +1,25 @@
+import copy
+
+from game import INITIAL_DATA
+from model import Book, GameState, Log
+from timeseries import ReadingSeries, series_for
+
+
+def make_state() -> GameState:
+    state = GameState(copy.deepcopy(INITIAL_DATA))
+    state.add_book(Book(id=1, title="本", genre="liberal_history", max_hp=100, status="active"))
+    return state
+
+
+def test_log_on_completed_book_moves_completion():
+    state = make_state()
+    state.add_log(Log(id="a", date="2024-05-01", book_id=1, pages=100))
+    state.update_book(state.book(1), status="completed", current_hp=0)
+    series = series_for(state)
+    assert series.window("daily")[1]["completed"] == [1]
+
+    state.add_log(Log(id="b", date="2024-05-03", book_id=1, pages=10))
+    fresh = ReadingSeries(state)
+    assert series.window("daily") == fresh.window("daily")
+    assert series.window("daily")[1]["completed"] == [0, 1]
+    assert series.window("monthly")[1]["completed"] == [1]
@@ -0,0 +1,197 @@
+from bisect import bisect_left, bisect_right
+from datetime import date, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from game import parse_date
+from model import Book, GameState, Log
+
+# --- 読書量の時系列 ---
+# 日・週（月曜始まり）・月ごとにページ数・読書時間・EXP・読了冊数・記録件数を集計して持つ。
+# 期間は開始日の序数（date.toordinal）のソート済み配列、値は指標ごとの同じ長さの配列で、
+# 記録のある期間だけを持つ。グラフや連続記録は O(期間数) で作れ、ログを走査・日付解析しなくてよい。
+#
+# 作成済みの系列は GameState.series に置き、読書記録の追記と読了状態の変化は差分で反映する。
+# 本の削除では作り直す（次に参照したときに全ログから集計する）。
+# 読了冊数は、現在 completed の本をその本の最後の記録日に数える（再読中の本は数えない）。
+# 読了済みの本に記録が増えたときも、最後の記録日が変われば数える日を付け替える。
+
+METRICS = ("pages", "minutes", "exp", "completed", "logs")
+PERIODS = ("daily", "weekly", "monthly")
+
+
+def _day(ordinal: int) -> int:
+    return ordinal
+
+
+def _week(ordinal: int) -> int:
+    return ordinal - date.fromordinal(ordinal).weekday()
+
+
+def _month(ordinal: int) -> int:
+    return date.fromordinal(ordinal).replace(day=1).toordinal()
+
+
+def _next_month(ordinal: int) -> int:
+    d = date.fromordinal(ordinal)
+    return (date(d.year + 1, 1, 1) if d.month == 12 else date(d.year, d.month + 1, 1)).toordinal()
+
+
+def date_ordinal(date_str: Optional[str]) -> Optional[int]:
+    """YYYY-MM-DD の序数。日付が無い・解析できない場合は None"""
+    if not date_str:
+        return None
+    try:
+        if len(date_str) == 10 and date_str[4] == date_str[7] == "-":
+            return date.fromisoformat(date_str).toordinal() # 通常の表記は strptime より速い
+        return parse_date(date_str).toordinal()
+    except (TypeError, ValueError):
+        return None
+
+
+class Rollup:
+    """1つの粒度の集計"""
+
+    def __init__(self, bucket: Callable[[int], int], step: Callable[[int], int]):
+        self.bucket = bucket # 日の序数 → その期間の開始日の序数
+        self.step = step # 期間の開始日 → 次の期間の開始日
+        self.starts: List[int] = []
+        self.values: Dict[str, List[int]] = {m: [] for m in METRICS}
+
+    def add(self, ordinal: int, deltas: Dict[str, int]):
+        """日の序数が属する期間に加算する。末尾（最新の期間）への追加は O(1)"""
+        start = self.bucket(ordinal)
+        if self.starts and self.starts[-1] == start:
+            i = len(self.starts) - 1
+        else:
+            i = bisect_left(self.starts, start)
+            if i == len(self.starts) or self.starts[i] != start:
+                self.starts.insert(i, start)
+                for values in self.values.values():
+                    values.insert(i, 0)
+        for metric, delta in deltas.items():
+            self.values[metric][i] += delta
+
+    def window(self, start: Optional[date] = None, end: Optional[date] = None,
+               fill: bool = False) -> Tuple[List[date], Dict[str, List[int]]]:
+        """期間の開始日と指標ごとの値。start/end（両端を含む）で絞り、fill なら記録の無い期間を 0 で埋める"""
+        lo = bisect_left(self.starts, self.bucket(start.toordinal())) if start else 0
+        hi = bisect_right(self.starts, end.toordinal()) if end else len(self.starts)
+        if not fill:
+            return ([date.fromordinal(o) for o in self.starts[lo:hi]],
+                    {m: values[lo:hi] for m, values in self.values.items()})
+        if lo == hi and not (start and end):
+            return [], {m: [] for m in METRICS}
+        first = self.bucket(start.toordinal()) if start else self.starts[lo]
+        last = end.toordinal() if end else self.starts[hi - 1]
+        dates, filled = [], {m: [] for m in METRICS}
+        i, current = lo, first
+        while current <= last:
+            dates.append(date.fromordinal(current))
+            present = i < hi and self.starts[i] == current
+            for metric, values in self.values.items():
+                filled[metric].append(values[i] if present else 0)
+            if present:
+                i += 1
+            current = self.step(current)
+        return dates, filled
+
+
+class ReadingSeries:
+    """日・週・月の集計（GameState ごとに1つ）"""
+
+    def __init__(self, state: GameState):
+        self.state = state
+        self.rollups = {
+            "daily": Rollup(_day, lambda o: o + 1),
+            "weekly": Rollup(_week, lambda o: o + 7),
+            "monthly": Rollup(_month, _next_month),
+        }
+        self._completed_on: Dict[int, int] = {} # 読了として数えた本 → 数えた日の序数
+        # 日ごとにまとめてから古い順に加算する（日付の解析も期間への加算も日数分で済む）
+        days: Dict[Optional[str], List[int]] = {}
+        for log in state.logs:
+            totals = days.get(log.date)
+            if totals is None:
+                totals = days[log.date] = [0, 0, 0, 0]
+            totals[0] += log.pages or 0
+            totals[1] += log.minutes or 0
+            totals[2] += log.exp_gained or 0
+            totals[3] += 1
+        ordinals = ((date_ordinal(d), totals) for d, totals in days.items())
+        for ordinal, (pages, minutes, exp, count) in sorted((o, t) for o, t in ordinals if o is not None):
+            self._add(ordinal, {"pages": pages, "minutes": minutes, "exp": exp, "logs": count})
+        for book in state.books_by_status.get("completed", {}).values():
+            self._count_completion(book)
+
+    def _add(self, ordinal: int, deltas: Dict[str, int]):
+        for rollup in self.rollups.values():
+            rollup.add(ordinal, deltas)
+
+    def add_log(self, log: Log):
+        ordinal = date_ordinal(log.date)
+        if ordinal is not None:
+            self._add(ordinal, {"pages": log.pages or 0, "minutes": log.minutes or 0,
+                                "exp": log.exp_gained or 0, "logs": 1})
+            # 読了済みの本への記録（再読せずに追記した場合など）は、読了の日を最後の記録日へ移す
+            book = self.state.book(log.book_id)
+            if book is not None and book.status == "completed":
+                previous = self._completed_on.get(book.id)
+                if previous is None or ordinal > previous:
+                    self.book_changed(book)
+
+    def _last_read(self, book: Book) -> Optional[int]:
+        ordinals = [date_ordinal(l.date) for l in self.state.logs_by_book.get(book.id, [])]
+        return max((o for o in ordinals if o is not None), default=None)
+
+    def _count_completion(self, book: Book):
+        ordinal = self._last_read(book)
+        if ordinal is not None:
+            self._completed_on[book.id] = ordinal
+            self._add(ordinal, {"completed": 1})
+
+    def book_changed(self, book: Book):
+        """本のステータスが変わったときに読了冊数を付け替える"""
+        previous = self._completed_on.pop(book.id, None)
+        if previous is not None:
+            self._add(previous, {"completed": -1})
+        if book.status == "completed":
+            self._count_completion(book)
+
+    # --- 参照 ---
+    def window(self, period: str, start: Optional[date] = None, end: Optional[date] = None,
+               fill: bool = False) -> Tuple[List[date], Dict[str, List[int]]]:
+        return self.rollups[period].window(start, end, fill)
+
+    def date_range(self) -> Tuple[Optional[date], Optional[date]]:
+        starts = self.rollups["daily"].starts
+        if not starts:
+            return None, None
+        return date.fromordinal(starts[0]), date.fromordinal(starts[-1])
+
+    def streaks(self) -> List[Tuple[date, date, int]]:
+        """連続して記録した日の区間 (開始日, 終了日, 日数)"""
+        result = []
+        starts = self.rollups["daily"].starts
+        begin = 0
+        for i in range(1, len(starts) + 1):
+            if i == len(starts) or starts[i] != starts[i - 1] + 1:
+                result.append((date.fromordinal(starts[begin]), date.fromordinal(starts[i - 1]), i - begin))
+                begin = i
+        return result
+
+    def longest_streak(self) -> int:
+        return max((days for _, _, days in self.streaks()), default=0)
+
+    def heatmap(self, end: date, weeks: int = 53, metric: str = "pages") -> List[Dict]:
+        """end を含む直近 weeks 週のカレンダー（週の開始日・曜日・値）。記録の無い日は 0"""
+        first = date.fromordinal(_week(end.toordinal())) - timedelta(weeks=weeks - 1)
+        dates, values = self.window("daily", first, end, fill=True)
+        return [{"week": (d - timedelta(days=d.weekday())).isoformat(), "weekday": d.weekday(), "date": d.isoformat(),
+                 "value": v} for d, v in zip(dates, values[metric])]
+
+
+def series_for(state: GameState) -> ReadingSeries:
+    """state の時系列。未作成か、削除などで破棄されていれば全ログから作る"""
+    if state.series is None:
+        state.series = ReadingSeries(state)
+    return state.series
@@ -0,0 +1,189 @@
+import atexit
+import copy
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from cache import DocumentCache
+from merge import make_base, merge_documents, save_with_retry
+from profiling import span
+from storage import ConflictError
+
+# --- バックグラウンド保存 ---
+# フォームの送信ではローカルの状態だけを更新してすぐ再描画し、保存は別スレッドで行う。
+# 同じセッションの保存は1件にまとめ（後の内容が前の内容を含むため最新だけ保存すればよい）、
+# 短時間の連続した変更は debounce 秒待ってから保存する。通信エラーは指数バックオフで再試行する。
+# 保存先はジョブのキャッシュが持つバックエンドなので、複数プレイヤーの区画を1つのキューで扱える。
+
+
+def snapshot_document(data: Dict) -> Dict:
+    """保存スレッドに渡すコピー。ログは変更しないためリストだけ複製する"""
+    snapshot = dict(data)
+    snapshot["user"] = copy.deepcopy(data.get("user", {}))
+    snapshot["books"] = copy.deepcopy(data.get("books", []))
+    snapshot["logs"] = list(data.get("logs", []))
+    return snapshot
+
+
+class SaveJob:
+    """保存待ちのドキュメント1件"""
+
+    __slots__ = ("key", "data", "cache", "created_at", "updated_at", "not_before", "attempts", "error")
+
+    def __init__(self, key: str, data: Dict, cache: DocumentCache, now: float):
+        self.key = key
+        self.data = data
+        self.cache = cache
+        self.created_at = now
+        self.updated_at = now
+        self.not_before = 0.0 # 再試行の待ち時間
+        self.attempts = 0
+        self.error: Optional[str] = None
+
+
+class SaveQueue:
+    """セッションごとに最新のドキュメントだけを保存するキュー。保存先は各キャッシュのバックエンド"""
+
+    def __init__(self, debounce: float = 0.5, max_delay: float = 5.0,
+                 retries: int = 4, backoff: float = 1.0, clock: Callable[[], float] = time.monotonic):
+        self.debounce = debounce # 最後の変更からこの秒数待ってから保存する
+        self.max_delay = max_delay # 変更が続いても最初の変更からこの秒数で保存する
+        self.retries = retries
+        self.backoff = backoff
+        self.clock = clock
+        self._cond = threading.Condition()
+        self._pending: Dict[str, SaveJob] = {}
+        self._saving: Dict[str, SaveJob] = {}
+        self._failed: Dict[str, SaveJob] = {}
+        self._last_saved: Dict[str, float] = {}
+        self._thread: Optional[threading.Thread] = None
+        atexit.register(self.flush, 10.0)
+
+    # --- 呼び出し側（Streamlit のスクリプト） ---
+    def submit(self, key: str, data: Dict, cache: DocumentCache):
+        """ローカルで変更したドキュメントを保存待ちにする"""
+        cache.put_local(data)
+        snapshot = snapshot_document(data)
+        with self._cond:
+            now = self.clock()
+            job = self._pending.get(key)
+            if job is None:
+                self._pending[key] = SaveJob(key, snapshot, cache, now)
+            else:
+                job.data, job.cache, job.updated_at = snapshot, cache, now
+            self._failed.pop(key, None)
+            self._start()
+            self._cond.notify_all()
+
+    def retry(self, key: str):
+        with self._cond:
+            job = self._failed.pop(key, None)
+            if job is not None and key not in self._pending:
+                job.attempts, job.not_before, job.error = 0, 0.0, None
+                self._pending[key] = job
+                self._start()
+                self._cond.notify_all()
+
+    def discard(self, key: str):
+        """保存待ち・失敗したドキュメントを捨てる（呼び出し側でキャッシュを破棄して再読込する）"""
+        with self._cond:
+            self._pending.pop(key, None)
+            self._failed.pop(key, None)
+
+    def status(self, key: str) -> Dict:
+        with self._cond:
+            failed = self._failed.get(key)
+            return {
+                "pending": key in self._pending,
+                "saving": key in self._saving,
+                "error": failed.error if failed else None,
+                "last_saved": self._last_saved.get(key),
+            }
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """保存待ちが無くなるまで待つ（debounce は無視する）。時間内に終われば True"""
+        deadline = self.clock() + timeout
+        with self._cond:
+            for job in self._pending.values():
+                job.created_at = job.updated_at = -self.max_delay
+            self._cond.notify_all()
+            while self._pending or self._saving:
+                remaining = deadline - self.clock()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    # --- 保存スレッド ---
+    def _start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="readingrpg-save-queue", daemon=True)
+            self._thread.start()
+
+    def _next_job(self) -> Tuple[Optional[SaveJob], Optional[float]]:
+        now = self.clock()
+        wait = None
+        for key, job in self._pending.items():
+            if key in self._saving:
+                continue # 同じセッションの保存は順番に行う
+            ready_at = max(job.not_before, min(job.updated_at + self.debounce, job.created_at + self.max_delay))
+            if ready_at <= now:
+                return job, None
+            wait = ready_at - now if wait is None else min(wait, ready_at - now)
+        return None, wait
+
+    def _run(self):
+        while True:
+            with self._cond:
+                job, wait = self._next_job()
+                while job is None:
+                    self._cond.wait(wait)
+                    job, wait = self._next_job()
+                del self._pending[job.key]
+                self._saving[job.key] = job
+            self._save(job)
+
+    def _save(self, job: SaveJob):
+        cache = job.cache
+        try:
+            # 基準リビジョンは保存する時点のものを使う（直前の保存完了で更新されている）
+            with span("save.background"):
+                saved, revision = save_with_retry(cache.backend, job.data, cache.base, cache.revision)
+        except ConflictError:
+            self._fail(job, "他の画面での更新と競合したため保存できませんでした")
+            return
+        except Exception as e:
+            job.attempts += 1
+            if job.attempts > self.retries:
+                self._fail(job, f"保存に失敗しました: {e}")
+                return
+            with self._cond:
+                del self._saving[job.key]
+                if job.key not in self._pending:
+                    job.not_before = self.clock() + self.backoff * (2 ** (job.attempts - 1))
+                    self._pending[job.key] = job
+                self._cond.notify_all()
+            return
+
+        with self._cond:
+            del self._saving[job.key]
+            newer = self._pending.get(job.key)
+            latest = None
+            if saved is not job.data:
+                # 他のセッションとマージされた。後続の変更も同じ内容に載せ直す
+                if newer is not None:
+                    newer.data = merge_documents(make_base(job.data), newer.data, saved)
+                    latest = snapshot_document(newer.data)
+                else:
+                    latest = saved
+            cache.mark_saved(saved, revision, latest=latest, dirty=newer is not None)
+            self._last_saved[job.key] = time.time()
+            self._cond.notify_all()
+
+    def _fail(self, job: SaveJob, message: str):
+        with self._cond:
+            del self._saving[job.key]
+            job.error = message
+            if job.key not in self._pending:
+                self._failed[job.key] = job # 後続の変更があればそちらを保存する
+            self._cond.notify_all()